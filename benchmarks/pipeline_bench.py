@@ -0,0 +1,331 @@
+# benchmarks/pipeline_bench.py
+"""
+端到端流水线基准：解析 → 分块 → 抽取 → 合并 → 合成
+
+- 语料：按固定种子生成的 PDF / DOCX / PPTX 课件（含重复页，覆盖去重路径），缓存在 benchmarks/.corpus/
+- LLM 后端：自动启动 scripts/fake_llm_server.py（不消耗真实 token、不依赖外网）
+- 输出：各阶段耗时、LLM 调用数（含重试）、发送的 token 数、峰值 RSS、吞吐（文档 / 分钟），
+  写入 JSON，便于跨版本对比（--compare 上一次的结果文件）
+
+用法：
+    python benchmarks/pipeline_bench.py
+    python benchmarks/pipeline_bench.py --jobs 8 --files-per-job 3 --pages 30 --latency-ms 400 --tpm 400000
+    python benchmarks/pipeline_bench.py --output benchmarks/results/after.json --compare benchmarks/results/before.json
+"""
+
+import sys
+import os
+import argparse
+import json
+import random
+import resource
+import socket
+import subprocess
+import time
+import urllib.request
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)  # ✅ 修正路径问题
+
+CORPUS_DIR = os.path.join(ROOT, "benchmarks", ".corpus")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+_TOPICS = [
+    ("Thermodynamics", ["entropy", "enthalpy", "heat engine", "Carnot cycle", "free energy", "equilibrium"]),
+    ("Cell Biology", ["mitochondria", "membrane transport", "ATP synthesis", "signal transduction", "cytoskeleton"]),
+    ("Microeconomics", ["elasticity", "marginal cost", "consumer surplus", "market equilibrium", "monopoly pricing"]),
+    ("Linear Algebra", ["eigenvalue", "vector space", "orthogonal projection", "rank", "determinant", "basis"]),
+    ("Contract Law", ["offer and acceptance", "consideration", "breach", "remedies", "misrepresentation"]),
+]
+_TEMPLATES = [
+    "The {t} is defined formally in terms of {u}, and students should memorise the standard statement.",
+    "A common exam question asks how {t} relates to {u}; answer with a worked example.",
+    "Lecture note: {t} explains why {u} behaves differently under changing conditions.",
+    "Key formula: the value of {t} depends linearly on {u} for small perturbations.",
+    "Case study: applying {t} to a real-world problem involving {u} and its limitations.",
+    "Definition review: {t} versus {u}, including typical mistakes made in assignments.",
+]
+
+
+# ================== 语料 ==================
+def _page_text(rng, terms, idx):
+    lines = [f"Section {idx}: {rng.choice(terms).title()}"]
+    for _ in range(rng.randint(8, 16)):
+        t, u = rng.sample(terms, 2)
+        lines.append(rng.choice(_TEMPLATES).format(t=t, u=u))
+    return lines
+
+
+def _doc_pages(seed, pages):
+    rng = random.Random(seed)
+    title, terms = _TOPICS[seed % len(_TOPICS)]
+    body = [[f"{title} — Week {seed % 12 + 1}", "Course overview and learning outcomes"]]
+    body += [_page_text(rng, terms, i) for i in range(1, pages)]
+    # 课件常见的重复页：目录 / 复习页 / 结束页
+    body.insert(len(body) // 2, list(body[1]))
+    body.append(["Thank you", "Questions?"])
+    return body
+
+
+def _write_pdf(path, pages):
+    import fitz
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), "\n".join(lines), fontsize=10)
+    doc.save(path)
+    doc.close()
+
+
+def _write_docx(path, pages):
+    from docx import Document
+    doc = Document()
+    for lines in pages:
+        doc.add_heading(lines[0], level=2)
+        for line in lines[1:]:
+            doc.add_paragraph(line)
+    doc.save(path)
+
+
+def _write_pptx(path, pages):
+    from pptx import Presentation
+    prs = Presentation()
+    for lines in pages:
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = lines[0]
+        slide.placeholders[1].text = "\n".join(lines[1:])
+    prs.save(path)
+
+
+def build_corpus(jobs, files_per_job, pages, seed):
+    """生成（或复用）固定语料，返回 [[文件路径, ...], ...]，每个内层列表是一次生成任务"""
+    corpus = os.path.join(CORPUS_DIR, f"s{seed}_p{pages}")
+    os.makedirs(corpus, exist_ok=True)
+    writers = [(".pdf", _write_pdf), (".docx", _write_docx), (".pptx", _write_pptx)]
+
+    job_files = []
+    for j in range(jobs):
+        files = []
+        for f in range(files_per_job):
+            doc_seed = seed * 1000 + j * files_per_job + f
+            ext, writer = writers[doc_seed % len(writers)]
+            path = os.path.join(corpus, f"doc_{doc_seed}{ext}")
+            if not os.path.exists(path):
+                writer(path, _doc_pages(doc_seed, pages))
+            files.append(path)
+        job_files.append(files)
+    return job_files
+
+
+# ================== 假服务 ==================
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_server(args):
+    port = _free_port()
+    cmd = [
+        sys.executable, os.path.join(ROOT, "scripts", "fake_llm_server.py"),
+        "--port", str(port),
+        "--latency-dist", args.latency_dist,
+        "--latency-ms", str(args.latency_ms),
+        "--tokens-per-second", str(args.tokens_per_second),
+        "--tpm", str(args.tpm),
+        "--error-429", str(args.error_429),
+        "--error-500", str(args.error_500),
+        "--seed", str(args.seed),
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"{base}/stats", timeout=0.5).read()
+            return proc, base
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("假 LLM 服务启动失败")
+
+
+def server_stats(base):
+    return json.loads(urllib.request.urlopen(f"{base}/stats", timeout=5).read())
+
+
+def peak_rss_mb():
+    # Linux 下 ru_maxrss 单位为 KB
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+# ================== 基准 ==================
+def run_benchmark(args):
+    job_files = build_corpus(args.jobs, args.files_per_job, args.pages, args.seed)
+
+    proc, base = start_fake_server(args)
+    try:
+        # 必须在导入 config 之前设置，让整个应用指向假服务
+        os.environ["OPENAI_BASE_URL"] = f"{base}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+        os.environ["EXTRACT_CONCURRENCY"] = str(args.concurrency)
+
+        import config
+        from modules.file_parser import extract_text_from_file
+        from modules.extractor import extract_summary_stream
+        from modules.llm_client import connection_stats
+
+        stages = {"parse": 0.0, "prepare": 0.0, "chunk": 0.0, "reduce": 0.0, "synthesis": 0.0}
+        totals = {"pipeline_llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                  "segments": 0, "duplicate_units": 0, "chunks_failed": 0}
+        ttfts, durations, failed_jobs = [], [], 0
+        server_before = server_stats(base)
+        wall_start = time.perf_counter()
+
+        for files in job_files:
+            t0 = time.perf_counter()
+            texts, sources = None, None
+            if args.stream_parse:
+                # 边解析边抽取：解析耗时由 extractor 记入 stage_seconds["parse"]（与分块阶段重叠）
+                sources = []
+                for path in files:
+                    with open(path, "rb") as f:
+                        sources.append((os.path.basename(path), f.read()))
+            else:
+                texts = []
+                for path in files:
+                    with open(path, "rb") as f:
+                        texts.append(extract_text_from_file(f, os.path.basename(path)))
+                stages["parse"] += time.perf_counter() - t0
+
+            result = {}
+            t1 = time.perf_counter()
+            try:
+                for _ in extract_summary_stream(
+                    texts, mode=args.mode, use_cache=False, result=result, prefilter=args.prefilter,
+                    generate_mock=args.mock, files=sources,
+                ):
+                    pass
+            except Exception as e:
+                failed_jobs += 1
+                print(f"❌ job failed: {e}")
+                continue
+            durations.append(time.perf_counter() - t0)
+
+            stats = result.get("stats", {})
+            for name, seconds in stats.get("stage_seconds", {}).items():
+                stages[name] = stages.get(name, 0.0) + seconds
+            totals["pipeline_llm_calls"] += stats.get("llm_calls", 0)
+            totals["prompt_tokens"] += stats.get("prompt_tokens", 0)
+            totals["completion_tokens"] += stats.get("completion_tokens", 0)
+            totals["segments"] += stats.get("segments", 0)
+            totals["duplicate_units"] += stats.get("duplicate_units", 0)
+            totals["chunks_failed"] += stats.get("chunks_failed", 0)
+            if stats.get("ttft") is not None:
+                ttfts.append(stats["ttft"])
+            print(f"✅ job {len(durations)}/{len(job_files)}: {time.perf_counter() - t1:.2f}s")
+
+        wall = time.perf_counter() - wall_start
+        server_after = server_stats(base)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=5)
+
+    documents = sum(len(files) for files in job_files)
+    http_requests = server_after["requests"] - server_before["requests"]
+    durations.sort()
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "config": {
+            "CHUNK_TOKEN_BUDGET": config.CHUNK_TOKEN_BUDGET,
+            "REDUCE_INPUT_TOKEN_BUDGET": config.REDUCE_INPUT_TOKEN_BUDGET,
+            "EXTRACT_CONCURRENCY": config.EXTRACT_CONCURRENCY,
+            "LLM_PROCESS_CONCURRENCY": config.LLM_PROCESS_CONCURRENCY,
+        },
+        "documents": documents,
+        "jobs": len(job_files),
+        "failed_jobs": failed_jobs,
+        "wall_seconds": round(wall, 3),
+        "docs_per_minute": round(documents / wall * 60, 2) if wall else None,
+        "stage_seconds": {k: round(v, 3) for k, v in stages.items()},
+        "job_seconds_p50": round(durations[len(durations) // 2], 3) if durations else None,
+        "job_seconds_max": round(durations[-1], 3) if durations else None,
+        "ttft_avg": round(sum(ttfts) / len(ttfts), 3) if ttfts else None,
+        "llm_calls": totals["pipeline_llm_calls"],
+        "http_requests": http_requests,
+        "retries": max(0, http_requests - totals["pipeline_llm_calls"]),
+        "rate_limited": server_after["rate_limited"] - server_before["rate_limited"],
+        "prompt_tokens": totals["prompt_tokens"],
+        "completion_tokens": totals["completion_tokens"],
+        "segments": totals["segments"],
+        "duplicate_units": totals["duplicate_units"],
+        "chunks_failed": totals["chunks_failed"],
+        "peak_rss_mb": peak_rss_mb(),
+        "connections": connection_stats(),
+    }
+
+
+def compare(current, baseline):
+    """打印与基线的差异（数值字段）"""
+    keys = ["wall_seconds", "docs_per_minute", "llm_calls", "http_requests", "prompt_tokens", "peak_rss_mb"]
+    print(f"\n📊 对比基线 {baseline.get('commit')} ({baseline.get('timestamp')})")
+    for key in keys:
+        old, new = baseline.get(key), current.get(key)
+        if isinstance(old, (int, float)) and isinstance(new, (int, float)) and old:
+            print(f"  {key:<18} {old:>12} → {new:<12} ({(new - old) / old:+.1%})")
+    for stage, new in current["stage_seconds"].items():
+        old = baseline.get("stage_seconds", {}).get(stage)
+        if old:
+            print(f"  stage.{stage:<12} {old:>12} → {new:<12} ({(new - old) / old:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端流水线基准")
+    parser.add_argument("--jobs", type=int, default=4, help="生成任务数（每个任务一次 extract_summary）")
+    parser.add_argument("--files-per-job", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=20, help="每个文档的页数 / 幻灯片数")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--mode", default="detailed", choices=["detailed", "exam", "custom"])
+    parser.add_argument("--mock", action="store_true", help="同时生成模拟考题（与合成并发）")
+    parser.add_argument("--prefilter", action="store_true", help="启用抽取式预筛选")
+    parser.add_argument("--stream-parse", action="store_true", help="边解析边抽取（extract_summary_stream 的 files 参数）")
+    parser.add_argument("--concurrency", type=int, default=6, help="EXTRACT_CONCURRENCY")
+    parser.add_argument("--latency-dist", default="lognormal", choices=["fixed", "uniform", "lognormal"])
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    parser.add_argument("--tpm", type=float, default=0)
+    parser.add_argument("--error-429", type=float, default=0.0)
+    parser.add_argument("--error-500", type=float, default=0.0)
+    parser.add_argument("--output", default=None, help="结果 JSON 路径（默认 benchmarks/results/<时间>.json）")
+    parser.add_argument("--compare", default=None, help="与之前的结果 JSON 对比")
+    args = parser.parse_args()
+
+    result = run_benchmark(args)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print(f"\n📄 {result['documents']} docs in {result['wall_seconds']}s "
+          f"→ {result['docs_per_minute']} docs/min, peak RSS {result['peak_rss_mb']} MB")
+    print(f"   stages: {result['stage_seconds']}")
+    print(f"   calls: {result['llm_calls']} (+{result['retries']} retries), prompt tokens: {result['prompt_tokens']}")
+    print(f"   saved → {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 # config.py
 import os
+import json
 from dotenv import load_dotenv
 
 # 尝试加载本地 .env（仅本地调试时有用）
@@ -37,3 +38,91 @@ print(f"前 5 位：{OPENAI_API_KEY[:5]}...")
 
 # 默认模型
 DEFAULT_MODEL = "gpt-4o-mini"
+
+# ===== 模型路由 =====
+# 各阶段按顺序尝试的模型（级联）：先用便宜 / 快的模型，输出没通过该阶段的检查时才升级到下一个。
+# MODEL_ROUTES 为 JSON，如 {"chunk": ["gpt-4o-mini"], "synthesis": ["gpt-4o-mini", "gpt-4o"]}；
+# 阶段：chunk / reduce / synthesis / mock_exam / translation / edit，未配置的阶段为 [DEFAULT_MODEL, ESCALATION_MODEL]；
+# 流式输出到页面的阶段（synthesis / edit）未配置时只用 DEFAULT_MODEL：有后备模型时前面模型的输出要先缓冲、判断后才能显示，会失去流式效果
+ESCALATION_MODEL = os.getenv("ESCALATION_MODEL", "gpt-4o")
+MODEL_ROUTES = json.loads(os.getenv("MODEL_ROUTES") or "{}")
+
+# OpenAI 兼容端点（留空为官方；压测时可指向 scripts/fake_llm_server.py，如 http://127.0.0.1:8808/v1）
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# ===== 并发设置 =====
+# 单次 extract_summary 内同时进行的分块请求数
+EXTRACT_CONCURRENCY = int(os.getenv("EXTRACT_CONCURRENCY", "6"))
+# 整个进程内同时进行的 LLM 请求上限（所有用户会话共享，也是 AIMD 自适应并发的上限）
+LLM_PROCESS_CONCURRENCY = int(os.getenv("LLM_PROCESS_CONCURRENCY", "16"))
+
+# ===== LLM 响应缓存 =====
+# LLM_CACHE_ENABLED=0 可整体关闭缓存（调试 / 对比效果时使用）
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "200"))
+
+# ===== 分块设置 =====
+# 每个分块请求的输入 token 预算（本地估算），小文件 / 幻灯片会被装箱到同一请求
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "1500"))
+
+# ===== 多级合并 (map-reduce) =====
+# 最终合成允许的输入 token 上限；超出时先分批并行压缩，再递归
+REDUCE_INPUT_TOKEN_BUDGET = int(os.getenv("REDUCE_INPUT_TOKEN_BUDGET", "6000"))
+REDUCE_MAX_DEPTH = int(os.getenv("REDUCE_MAX_DEPTH", "4"))
+
+# ===== LLM 调用重试 / 熔断 =====
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))     # 秒
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))        # 秒
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", "30"))
+
+# ===== HTTP 连接池（所有 LLM 客户端共享） =====
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", str(LLM_PROCESS_CONCURRENCY * 2)))
+LLM_HTTP_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_HTTP_KEEPALIVE_CONNECTIONS", str(LLM_PROCESS_CONCURRENCY)))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "120"))   # 秒
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "120"))                     # 秒（读超时）
+LLM_HTTP2_ENABLED = os.getenv("LLM_HTTP2_ENABLED", "1") != "0"
+
+# ===== 学科识别 =====
+# 可选 JSON 文件 {学科: [关键词, ...]} 或 {学科: {关键词: 权重}}，与内置关键词合并
+SUBJECT_KEYWORDS_FILE = os.getenv("SUBJECT_KEYWORDS_FILE") or None
+
+# ===== 抽取式预筛选 =====
+# 分块抽取前按 TF-IDF 句子得分去掉低信息量的句子（参考文献、版权声明、答案页等），默认关闭
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "0") == "1"
+PREFILTER_KEEP_RATIO = float(os.getenv("PREFILTER_KEEP_RATIO", "0.6"))    # 每节保留的 token 比例
+PREFILTER_TOKEN_BUDGET = int(os.getenv("PREFILTER_TOKEN_BUDGET", "0"))    # 全部资料的 token 上限，0 为不限
+
+# ===== 文本规整 =====
+# 分块前去掉页标签、跨页重复的页眉页脚、页码，合并断词连字符并压缩空白
+TEXT_NORMALIZE_ENABLED = os.getenv("TEXT_NORMALIZE_ENABLED", "1") != "0"
+
+# ===== 断点续跑 =====
+# 提取流程各阶段的中间结果保留时长（超过后自动清理）
+RUN_CHECKPOINT_TTL_SECONDS = int(os.getenv("RUN_CHECKPOINT_TTL_SECONDS", str(3 * 24 * 3600)))
+
+# ===== 后台任务队列 =====
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))          # 租约时长，worker 每 1/3 时长心跳一次
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "10"))
+JOB_WORKER_PROCESSES = int(os.getenv("JOB_WORKER_PROCESSES", "2"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))   # 已结束任务（及其输入 / 结果文件）保留时长
+
+# ===== 双语翻译 =====
+# 双语模式下笔记合成后按小节并行翻译；句子级翻译记忆跨用户复用（TTL 沿用 LLM_CACHE_TTL_SECONDS）
+TRANSLATION_BATCH_TOKENS = int(os.getenv("TRANSLATION_BATCH_TOKENS", "1200"))   # 每个翻译请求的原文 token 上限
+
+# ===== 请求级结果复用 =====
+# 相同资料（按文件内容哈希）+ 相同设置的提取请求跨用户直接复用已生成的笔记；同时到达的相同请求只计算一次。
+# 用户可在设置页关闭共享，关闭后既不读取也不写入整篇笔记结果（片段级缓存不受影响）
+REQUEST_MEMO_ENABLED = os.getenv("REQUEST_MEMO_ENABLED", "1") != "0"
+REQUEST_MEMO_TTL_SECONDS = int(os.getenv("REQUEST_MEMO_TTL_SECONDS", str(7 * 24 * 3600)))
+REQUEST_MEMO_LEASE_SECONDS = float(os.getenv("REQUEST_MEMO_LEASE_SECONDS", "300"))   # 计算中的占位租约，由后台心跳线程定期续租
+REQUEST_MEMO_WAIT_SECONDS = float(os.getenv("REQUEST_MEMO_WAIT_SECONDS", "900"))     # 跟随者最多等待多久
+
+# ===== 文件解析 =====
+# 解析在进程池中进行（PyMuPDF / python-pptx 受 GIL 限制，线程几乎无加速）；PARSE_WORKERS<=1 时在当前进程串行解析
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+PARSE_PDF_PAGES_PER_TASK = int(os.getenv("PARSE_PDF_PAGES_PER_TASK", "40"))   # 大 PDF 按页区间拆分，每个子任务的页数
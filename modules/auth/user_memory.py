@@ -84,7 +84,7 @@ def save_user_note(user_id: int, title: str, content: str, metadata: dict = None
             user_id=user_id,
             note_title=title,
             note_content=content,
-            metadata=json.dumps(metadata or {}),
+            note_metadata=json.dumps(metadata or {}, ensure_ascii=False),
         )
         db.add(new_note)
         db.commit()
@@ -0,0 +1,468 @@
+# modules/batch_runner.py
+# 离线批处理模式：把大量文档的分块 / 合并 / 合成请求写成 Batch API 格式的 JSONL，
+# 交给可替换的执行器（OpenAI Batch API 或本地重放），轮询完成后把结果写回 UserNote
+
+import json
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from config import (
+    CHUNK_TOKEN_BUDGET,
+    REDUCE_INPUT_TOKEN_BUDGET,
+    REDUCE_MAX_DEPTH,
+    TEXT_NORMALIZE_ENABLED,
+    TRANSLATION_BATCH_TOKENS,
+)
+from modules import translation_memory
+from modules.chunk_engine import run_ordered
+from modules.chunker import split_units, build_segments, pack_segments, split_pack_output
+from modules.dedup import dedup_units
+from modules.normalizer import normalize_units
+from modules.extractor import (
+    detect_language,
+    detect_subject,
+    build_chunk_messages,
+    chunk_max_tokens,
+    build_reduce_messages,
+    build_synthesis_messages,
+    build_translation_messages,
+    translation_max_tokens,
+    translation_output_ok,
+    clean_final_text,
+    REDUCE_MAX_TOKENS,
+    SYNTHESIS_MAX_TOKENS,
+    TRANSLATION_HEADING,
+)
+from modules.llm_call import create_completion
+from modules.logger import log_event, log_token_usage
+from modules.reducer import needs_reduce, plan_reduce_batches
+from modules.model_router import models_for, route_signature
+from modules.auth.user_memory import save_user_note
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+
+# ================== 执行器 ==================
+class BatchExecutor(ABC):
+    """批处理执行器接口：submit → poll → fetch_results"""
+
+    @abstractmethod
+    def submit(self, input_path: str) -> str:
+        """提交 JSONL 输入文件，返回 batch_id"""
+
+    @abstractmethod
+    def poll(self, batch_id: str) -> str:
+        """返回 in_progress / completed / failed"""
+
+    @abstractmethod
+    def fetch_results(self, batch_id: str, output_path: str) -> str:
+        """把结果 JSONL 写到 output_path 并返回该路径"""
+
+
+class OpenAIBatchExecutor(BatchExecutor):
+    """使用 OpenAI Batch API（24 小时窗口，价格约为同步调用的一半）"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window="24h",
+        )
+        return batch.id
+
+    def poll(self, batch_id: str) -> str:
+        status = self.client.batches.retrieve(batch_id).status
+        if status == "completed":
+            return "completed"
+        if status in ("failed", "expired", "cancelled", "cancelling"):
+            return "failed"
+        return "in_progress"
+
+    def fetch_results(self, batch_id: str, output_path: str) -> str:
+        batch = self.client.batches.retrieve(batch_id)
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                lines.append(self.client.files.content(file_id).text.strip())
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(line for line in lines if line) + "\n")
+        return output_path
+
+
+class LocalBatchExecutor(BatchExecutor):
+    """
+    本地替身：在后台线程里把请求文件逐条重放到任意 OpenAI 兼容端点
+    （client 可指向本地假服务），输出格式与官方 Batch API 一致，便于离线测试整个流程。
+    """
+
+    def __init__(self, client, work_dir: str, max_workers=None):
+        self.client = client
+        self.work_dir = work_dir
+        self.max_workers = max_workers
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, input_path: str) -> str:
+        batch_id = f"local_batch_{uuid.uuid4().hex[:12]}"
+        output_path = os.path.join(self.work_dir, f"{batch_id}_output.jsonl")
+        with self._lock:
+            self._jobs[batch_id] = {"status": "in_progress", "output": output_path}
+        threading.Thread(
+            target=self._replay, args=(batch_id, input_path, output_path), daemon=True
+        ).start()
+        return batch_id
+
+    def _replay(self, batch_id, input_path, output_path):
+        try:
+            with open(input_path, encoding="utf-8") as f:
+                requests = [json.loads(line) for line in f if line.strip()]
+
+            results = run_ordered(
+                lambda req: create_completion(self.client, **req["body"]),
+                requests,
+                max_workers=self.max_workers,
+            )
+            with open(output_path, "w", encoding="utf-8") as out:
+                for req, (ok, value) in zip(requests, results):
+                    record = {"id": f"{batch_id}_{req['custom_id']}", "custom_id": req["custom_id"]}
+                    if ok:
+                        record["response"] = {"status_code": 200, "body": value.model_dump()}
+                        record["error"] = None
+                    else:
+                        record["response"] = None
+                        record["error"] = {"message": str(value)}
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            status = "completed"
+        except Exception as e:
+            log_event("batch_runner", "ERROR", "down", "本地批处理重放失败", remark=str(e))
+            status = "failed"
+
+        with self._lock:
+            self._jobs[batch_id]["status"] = status
+
+    def poll(self, batch_id: str) -> str:
+        with self._lock:
+            return self._jobs[batch_id]["status"]
+
+    def fetch_results(self, batch_id: str, output_path: str) -> str:
+        with self._lock:
+            src = self._jobs[batch_id]["output"]
+        if os.path.abspath(src) != os.path.abspath(output_path):
+            with open(src, encoding="utf-8") as f_in, open(output_path, "w", encoding="utf-8") as f_out:
+                f_out.write(f_in.read())
+        return output_path
+
+
+# ================== 请求文件 ==================
+def write_batch_file(requests, path: str):
+    """requests: [{"custom_id", "body"}] → Batch API 格式 JSONL"""
+    with open(path, "w", encoding="utf-8") as f:
+        for req in requests:
+            f.write(json.dumps({
+                "custom_id": req["custom_id"],
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": req["body"],
+            }, ensure_ascii=False) + "\n")
+    return path
+
+
+def read_batch_results(path: str) -> dict:
+    """结果 JSONL → {custom_id: {"content", "usage", "error"}}"""
+    results = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            body = response.get("body") or {}
+            choices = body.get("choices") or []
+            content = ""
+            if choices:
+                content = (choices[0].get("message") or {}).get("content") or ""
+            usage = body.get("usage")
+            error = record.get("error")
+            if not error and response.get("status_code") != 200:
+                # 非 200 一律算失败；响应体里不一定带 error 字段
+                error = body.get("error") or {"message": f"HTTP {response.get('status_code')}"}
+            results[record["custom_id"]] = {
+                "content": content,
+                "usage": _usage_dict(usage),
+                "error": error,
+            }
+    return results
+
+
+def _usage_dict(usage):
+    """结果文件里的 usage 是 JSON，统一成与 usage_of 相同的 dict"""
+    if not usage:
+        return None
+    p = int(usage.get("prompt_tokens") or 0)
+    c = int(usage.get("completion_tokens") or 0)
+    return {"prompt_tokens": p, "completion_tokens": c, "total_tokens": int(usage.get("total_tokens") or (p + c))}
+
+
+def run_batch_stage(executor, requests, work_dir: str, stage: str, poll_interval: float = 30):
+    """写文件 → 提交 → 轮询 → 取回结果"""
+    if not requests:
+        return {}
+    input_path = write_batch_file(requests, os.path.join(work_dir, f"{stage}_input.jsonl"))
+    batch_id = executor.submit(input_path)
+    log_event("batch_runner", "INFO", "work", f"批处理阶段已提交: {stage}",
+              meta={"batch_id": batch_id, "requests": len(requests)})
+
+    while True:
+        status = executor.poll(batch_id)
+        if status == "completed":
+            break
+        if status == "failed":
+            raise RuntimeError(f"批处理阶段 {stage} 失败 (batch_id={batch_id})")
+        time.sleep(poll_interval)
+
+    output_path = executor.fetch_results(batch_id, os.path.join(work_dir, f"{stage}_output.jsonl"))
+    results = read_batch_results(output_path)
+    failed = sum(1 for r in results.values() if r["error"])
+    log_event("batch_runner", "INFO" if not failed else "WARNING", "work" if not failed else "warning",
+              f"批处理阶段完成: {stage}", meta={"batch_id": batch_id, "results": len(results), "failed": failed})
+    return results
+
+
+# ================== 翻译阶段 ==================
+def _translate_stage(docs, texts, executor, work_dir, target_lang, target_lang_name, poll_interval, record):
+    """
+    与在线流程的翻译阶段相同（translation_memory.translate_markdown）：句子切分、翻译记忆、批次划分都复用。
+    第一遍只收集翻译记忆里没有的句子批次并提交批处理；第二遍用批处理结果回填并写入翻译记忆。
+    返回 {d: 附加了译文的笔记}
+    """
+    model = route_signature("translation")
+    pending = {}   # d → [句子批次]
+
+    def _collect(d):
+        def _translate_batch(sentences):
+            pending.setdefault(d, []).append(sentences)
+            return [None] * len(sentences), None
+        return _translate_batch
+
+    targets = {}
+    for d, text in texts.items():
+        src_lang = "en" if docs[d]["lang"] == "English" else "zh"
+        if src_lang == target_lang:
+            continue
+        targets[d] = src_lang
+        # 第一遍不写翻译记忆（没有译文），第二遍的批次划分与这里一致
+        translation_memory.translate_markdown(
+            text, _collect(d), src_lang, target_lang, model, TRANSLATION_BATCH_TOKENS, max_workers=1
+        )
+
+    requests = []
+    for d, batches in pending.items():
+        for b, sentences in enumerate(batches):
+            requests.append({
+                "custom_id": f"{d}:translation:{b}",
+                "body": {
+                    "model": models_for("translation")[0],
+                    "messages": build_translation_messages(sentences, docs[d]["lang"], target_lang_name),
+                    "max_tokens": translation_max_tokens(sentences),
+                    "temperature": 0.0,
+                },
+            })
+    results = run_batch_stage(executor, requests, work_dir, "translation", poll_interval)
+
+    def _fill(d):
+        by_sentences = {tuple(s): f"{d}:translation:{b}" for b, s in enumerate(pending.get(d, []))}
+
+        def _translate_batch(sentences):
+            custom_id = by_sentences.get(tuple(sentences))
+            result = results.get(custom_id)
+            if not result or result["error"] or not translation_output_ok(result["content"], len(sentences)):
+                raise RuntimeError(f"翻译请求失败: {custom_id}")
+            return translation_memory.parse_numbered_output(result["content"], len(sentences)), result, custom_id
+        return _translate_batch
+
+    translated_texts = dict(texts)
+    for d, src_lang in targets.items():
+        translated, stats = translation_memory.translate_markdown(
+            texts[d], _fill(d), src_lang, target_lang, model, TRANSLATION_BATCH_TOKENS, max_workers=1,
+            on_result=lambda result, custom_id: record(result, custom_id, "translation"),
+        )
+        if stats["failed_calls"]:
+            log_event("batch_runner", "WARNING", "warning", f"部分翻译请求失败: {docs[d]['name']}",
+                      meta={"failed_calls": stats["failed_calls"], "calls": stats["calls"]})
+        translated_texts[d] = f"{texts[d]}\n\n---\n\n{TRANSLATION_HEADING.format(lang=target_lang_name)}\n\n{translated}"
+    return translated_texts
+
+
+# ================== 主流程 ==================
+def generate_notes_batch(
+    documents,
+    executor: BatchExecutor,
+    work_dir: str,
+    user_id=None,
+    mode="detailed",
+    bilingual=False,
+    target_lang="zh",
+    custom_instruction=None,
+    poll_interval: float = 30,
+):
+    """
+    documents: [{"name": str, "text": str}]，每个文档生成一条笔记。
+    返回 [{"name", "note_id", "text"}]（失败的文档 text 为 None）
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    run_id = f"batch_{int(time.time())}"
+    target_lang_name = "Chinese" if target_lang == "zh" else "English"
+
+    # 批处理没有逐请求的级联：每个阶段用路由表里的第一个（最便宜的）模型
+    def _record(result, custom_id, stage):
+        if result and result["usage"] and user_id:
+            log_token_usage(
+                user_id=user_id,
+                model=models_for(stage)[0],
+                prompt_tokens=result["usage"]["prompt_tokens"],
+                completion_tokens=result["usage"]["completion_tokens"],
+                total_tokens=result["usage"]["total_tokens"],
+                request_id=f"{run_id}:{custom_id}",
+                stage=stage,
+            )
+
+    # ---------- 阶段 1：分块抽取 ----------
+    docs = []
+    chunk_requests = []
+    for d, doc in enumerate(documents):
+        lang = "English" if detect_language(doc["text"]) == "en" else "Chinese"
+        units = split_units(doc["text"])
+        if TEXT_NORMALIZE_ENABLED:
+            units, _ = normalize_units(units)
+        units, _ = dedup_units([units])
+        segments = build_segments(d, units[0], CHUNK_TOKEN_BUDGET)
+        packs = pack_segments(segments, CHUNK_TOKEN_BUDGET)
+        docs.append({
+            "name": doc["name"],
+            "lang": lang,
+            "subject": detect_subject(doc["text"]),
+            "packs": packs,
+            "blocks": [],
+        })
+        for p, pack in enumerate(packs):
+            chunk_requests.append({
+                "custom_id": f"{d}:chunk:{p}",
+                "body": {
+                    "model": models_for("chunk")[0],
+                    "messages": build_chunk_messages(pack, lang),
+                    "max_tokens": chunk_max_tokens(pack),
+                    "temperature": 0.0,
+                },
+            })
+
+    results = run_batch_stage(executor, chunk_requests, work_dir, "chunk", poll_interval)
+    for d, info in enumerate(docs):
+        outputs = []
+        for p, pack in enumerate(info["packs"]):
+            custom_id = f"{d}:chunk:{p}"
+            result = results.get(custom_id)
+            _record(result, custom_id, "chunk")
+            if result and not result["error"] and result["content"].strip():
+                outputs.extend(o for o in split_pack_output(result["content"], pack) if o)
+        if outputs:
+            info["blocks"] = [f"## FILE: {info['name']}\n" + "\n\n".join(outputs)]
+
+    # ---------- 阶段 2..n：多级合并（只处理超出预算的文档） ----------
+    for level in range(1, REDUCE_MAX_DEPTH + 1):
+        reduce_requests, plans = [], {}
+        for d, info in enumerate(docs):
+            if not needs_reduce(info["blocks"], REDUCE_INPUT_TOKEN_BUDGET):
+                continue
+            plans[d] = plan_reduce_batches(info["blocks"], REDUCE_INPUT_TOKEN_BUDGET)
+            for b, batch in enumerate(plans[d]):
+                reduce_requests.append({
+                    "custom_id": f"{d}:reduce{level}:{b}",
+                    "body": {
+                        "model": models_for("reduce")[0],
+                        "messages": build_reduce_messages("\n\n".join(batch), level, info["lang"]),
+                        "max_tokens": REDUCE_MAX_TOKENS,
+                        "temperature": 0.0,
+                    },
+                })
+        if not reduce_requests:
+            break
+
+        results = run_batch_stage(executor, reduce_requests, work_dir, f"reduce{level}", poll_interval)
+        for d, batches in plans.items():
+            reduced = []
+            for b, batch in enumerate(batches):
+                custom_id = f"{d}:reduce{level}:{b}"
+                result = results.get(custom_id)
+                _record(result, custom_id, "reduce")
+                ok = result and not result["error"] and result["content"].strip()
+                reduced.append(result["content"].strip() if ok else "\n\n".join(batch))
+            docs[d]["blocks"] = reduced
+
+    # ---------- 最终合成（与在线流程相同：合成只输出主语言，双语在之后单独翻译） ----------
+    synthesis_requests = []
+    for d, info in enumerate(docs):
+        if not info["blocks"]:
+            continue
+        files_block = "".join(f"{block}\n\n" for block in info["blocks"])
+        synthesis_requests.append({
+            "custom_id": f"{d}:synthesis",
+            "body": {
+                "model": models_for("synthesis")[0],
+                "messages": build_synthesis_messages(
+                    mode, custom_instruction, info["lang"], False, target_lang_name, info["subject"], files_block
+                ),
+                "max_tokens": SYNTHESIS_MAX_TOKENS,
+                "temperature": 0.0,
+            },
+        })
+    results = run_batch_stage(executor, synthesis_requests, work_dir, "synthesis", poll_interval)
+
+    texts = {}
+    for d, info in enumerate(docs):
+        custom_id = f"{d}:synthesis"
+        result = results.get(custom_id)
+        _record(result, custom_id, "synthesis")
+        text = clean_final_text(result["content"]) if result and not result["error"] else ""
+        if len(text) < 30:
+            log_event("batch_runner", "WARNING", "warning", f"文档生成失败: {info['name']}",
+                      meta={"run_id": run_id, "error": result["error"] if result else "missing"})
+            continue
+        texts[d] = text
+
+    # ---------- 双语：翻译阶段，与在线流程共用翻译记忆 ----------
+    if bilingual:
+        texts = _translate_stage(
+            docs, texts, executor, work_dir, target_lang, target_lang_name, poll_interval, _record
+        )
+
+    # ---------- 写回 UserNote ----------
+    outputs = []
+    for d, info in enumerate(docs):
+        text = texts.get(d)
+        if text is None:
+            outputs.append({"name": info["name"], "note_id": None, "text": None})
+            continue
+
+        note_id = None
+        if user_id:
+            note_id = save_user_note(
+                user_id,
+                f"Batch Extracted ({mode}) - {info['name']}",
+                text,
+                {"mode": mode, "bilingual": bilingual, "subject": info["subject"], "request_id": run_id, "batch": True},
+            )
+        outputs.append({"name": info["name"], "note_id": note_id, "text": text})
+
+    log_event(
+        "batch_runner", "INFO", "done", "批处理生成完成",
+        meta={"run_id": run_id, "documents": len(documents),
+              "succeeded": sum(1 for o in outputs if o["text"])},
+    )
+    return outputs
@@ -0,0 +1,47 @@
+# modules/chunk_engine.py
+# 分块并发抽取引擎（线程池，结果保持输入顺序）
+# 进程级并发上限由 llm_call 的 AIMD 限流器按实际 LLM 请求控制
+
+from concurrent.futures import ThreadPoolExecutor
+from config import EXTRACT_CONCURRENCY
+
+
+def run_ordered(fn, items, max_workers=None):
+    """
+    并发执行 fn(item)，按输入顺序返回结果列表。
+    - 每个结果为 (ok, value)：成功时 value 为返回值，失败时为异常对象
+    - max_workers: 单次请求的并发上限，默认 EXTRACT_CONCURRENCY
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    workers = max(1, min(max_workers or EXTRACT_CONCURRENCY, len(items)))
+    results = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chunk") as executor:
+        futures = [executor.submit(fn, item) for item in items]
+        for fut in futures:
+            try:
+                results.append((True, fut.result()))
+            except Exception as e:
+                results.append((False, e))
+    return results
+
+
+def run_streaming(fn, items, max_workers=None):
+    """
+    与 run_ordered 相同，但 items 可以是边生成边产出的迭代器：每产出一个就立即提交，不必等全部生成完
+    （例如文件还在解析时就开始第一批分块请求）。返回 (items 列表, 结果列表)
+    """
+    submitted, futures = [], []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers or EXTRACT_CONCURRENCY), thread_name_prefix="chunk") as executor:
+        for item in items:
+            submitted.append(item)
+            futures.append(executor.submit(fn, item))
+        results = []
+        for fut in futures:
+            try:
+                results.append((True, fut.result()))
+            except Exception as e:
+                results.append((False, e))
+    return submitted, results
@@ -0,0 +1,117 @@
+# modules/chunk_store.py
+# 分块抽取结果的持久化（按片段内容哈希 + 抽取 prompt 版本存储）
+# 用户追加文件或重新上传改动过的课件时，只有新增 / 改动的片段需要重新调用模型
+
+import hashlib
+import threading
+import time
+from config import LLM_CACHE_TTL_SECONDS
+from modules.logger import connect_with_retry
+from modules.utils.path_helper import CACHE_DB
+
+# 每写入多少条触发一次过期清理（长期运行的进程不能只靠启动时清理）
+PURGE_EVERY_N_SAVES = 200
+
+_lock = threading.Lock()
+_saves = 0
+
+
+def init_chunk_table():
+    """确保 chunk_results 表存在"""
+    conn = connect_with_retry(CACHE_DB)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chunk_results (
+            chunk_key TEXT PRIMARY KEY,
+            prompt_version TEXT,
+            content TEXT,
+            created_at REAL,
+            last_access REAL
+        )
+    """)
+    conn.close()
+
+
+def segment_key(text: str, prompt_version: str, model: str, lang: str) -> str:
+    """片段原文 + prompt 版本 + 模型 + 输出语言 → sha256"""
+    h = hashlib.sha256()
+    for part in (prompt_version, model, lang, text):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def load_many(keys):
+    """批量读取，返回 {chunk_key: content}（超过 TTL 未被使用的条目视为不存在）"""
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+
+    now = time.time()
+    found = {}
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        # SQLite 单条语句的参数个数有上限，分批查询
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT chunk_key, content, last_access FROM chunk_results WHERE chunk_key IN ({placeholders})",
+                batch,
+            ).fetchall()
+            for key, content, last_access in rows:
+                if LLM_CACHE_TTL_SECONDS and now - last_access > LLM_CACHE_TTL_SECONDS:
+                    continue
+                found[key] = content
+
+        if found:
+            conn.executemany(
+                "UPDATE chunk_results SET last_access = ? WHERE chunk_key = ?",
+                [(now, key) for key in found],
+            )
+    finally:
+        conn.close()
+    return found
+
+
+def save_many(items, prompt_version: str):
+    """批量写入 [(chunk_key, content)]"""
+    items = [(k, c) for k, c in items if c and c.strip()]
+    if not items:
+        return
+
+    now = time.time()
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        conn.executemany("""
+            INSERT OR REPLACE INTO chunk_results (chunk_key, prompt_version, content, created_at, last_access)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(k, prompt_version, c, now, now) for k, c in items])
+    finally:
+        conn.close()
+
+    global _saves
+    with _lock:
+        before, _saves = _saves, _saves + len(items)
+        should_purge = before // PURGE_EVERY_N_SAVES != _saves // PURGE_EVERY_N_SAVES
+    if should_purge:
+        purge_expired()
+
+
+def purge_expired():
+    """删除超过 TTL 的片段结果，返回删除条数"""
+    if not LLM_CACHE_TTL_SECONDS:
+        return 0
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        cur = conn.execute(
+            "DELETE FROM chunk_results WHERE last_access < ?",
+            (time.time() - LLM_CACHE_TTL_SECONDS,),
+        )
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+# ✅ 启动时初始化并清理过期结果
+init_chunk_table()
+purge_expired()
@@ -0,0 +1,196 @@
+# modules/chunker.py
+# 按 token 预算切分文本 + 跨文件装箱（替代按字符数切分的 _chunk_text）
+# 本地估算 token，不依赖网络；中英文混排时比按字符数切分稳定得多
+
+import hashlib
+import math
+import re
+
+# 解析器生成的页 / 幻灯片标签，如 【第 3 页 - a.pdf】、【Slide 2 - b.pptx】
+UNIT_LABEL_RE = re.compile(r"^【(?:第\s*\d+\s*页|Slide\s*\d+)[^】]*】\s*$", re.MULTILINE)
+
+# 近似 BPE 的预切分：CJK 单字 / 连续字母 / 连续数字 / 单个符号
+_TOKEN_RE = re.compile(
+    r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]"
+    r"|[A-Za-z]+"
+    r"|\d+"
+    r"|[^\sA-Za-z\d]"
+)
+
+# 内容定义切分：约每 ANCHOR_DIVISOR 个单元出现一个锚点；片段至少填到预算的 ANCHOR_MIN_FILL 才会在锚点处切开
+ANCHOR_DIVISOR = 4
+ANCHOR_MIN_FILL = 0.3
+
+# 分段输出的分隔符（打包多个片段到同一请求时使用）
+SEGMENT_OPEN = "<<<SEGMENT {sid}>>>"
+SEGMENT_CLOSE = "<<<END SEGMENT {sid}>>>"
+_SEGMENT_HEADER_RE = re.compile(r"^\s*(?:#{1,4}|<<<)\s*SEGMENT\s+(\d+)\s*(?:>>>|#*)\s*$", re.MULTILINE | re.IGNORECASE)
+_SEGMENT_CLOSE_RE = re.compile(r"^\s*<<<\s*END SEGMENT\s+\d+\s*>>>\s*$", re.MULTILINE | re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    本地估算 token 数：
+    - CJK 字符约 1 token / 字
+    - 英文单词约 4 字符 1 token
+    - 数字约 3 位 1 token，标点各 1 token
+    """
+    if not text:
+        return 0
+    total = 0
+    for piece in _TOKEN_RE.findall(text):
+        first = piece[0]
+        if first.isascii() and first.isalpha():
+            total += math.ceil(len(piece) / 4)
+        elif first.isdigit():
+            total += math.ceil(len(piece) / 3)
+        else:
+            total += 1
+    return total
+
+
+def split_units(text: str):
+    """
+    把单个文件的文本切成最小单元：
+    - 有页 / 幻灯片标签时，一页或一张幻灯片为一个单元
+    - 否则按空行分段
+    """
+    if not text or not text.strip():
+        return []
+
+    starts = [m.start() for m in UNIT_LABEL_RE.finditer(text)]
+    if starts:
+        if starts[0] > 0:
+            starts.insert(0, 0)
+        bounds = starts + [len(text)]
+        units = [text[a:b].strip() for a, b in zip(bounds, bounds[1:])]
+    else:
+        units = [p.strip() for p in re.split(r"\n\s*\n", text)]
+    return [u for u in units if u]
+
+
+def _split_oversized(unit: str, budget: int):
+    """单元本身超出预算时，先按行、再按字符硬切"""
+    pieces, buf, buf_tokens = [], [], 0
+    for line in unit.splitlines():
+        line_tokens = estimate_tokens(line)
+        if line_tokens > budget:
+            # 极长的一行（例如无换行的 TXT）：按估算比例切字符，
+            # 前面积累的短行（通常是标题 / 页标签）并入第一块
+            step = max(1, int(len(line) * (budget - buf_tokens) / line_tokens))
+            first, rest = line[:step], line[step:]
+            pieces.append("\n".join(buf + [first]))
+            buf, buf_tokens = [], 0
+            step = max(1, int(len(line) * budget / line_tokens))
+            pieces.extend(rest[i:i + step] for i in range(0, len(rest), step))
+            continue
+        if buf and buf_tokens + line_tokens > budget:
+            pieces.append("\n".join(buf))
+            buf, buf_tokens = [], 0
+        buf.append(line)
+        buf_tokens += line_tokens
+    if buf:
+        pieces.append("\n".join(buf))
+    return [p.strip() for p in pieces if p.strip()]
+
+
+def _is_anchor(unit: str) -> bool:
+    """内容定义的切分点：由单元自身内容决定，与前后内容无关"""
+    digest = hashlib.blake2b(unit.encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(digest, "big") % ANCHOR_DIVISOR == 0
+
+
+def iter_segments(doc_idx: int, units, budget: int):
+    """
+    把同一文件的单元按顺序累积成 ≤ budget token 的片段（units 可以是边解析边产出的迭代器，片段一满就产出）。
+    除了预算上限，还会在"锚点单元"之后切开（内容定义切分）：
+    课件改了几页时，只有附近的片段边界会变化，其余片段原文不变，可以复用已有抽取结果。
+    产出 {"doc": doc_idx, "seg": n, "text": str, "tokens": int}
+    """
+    seg_no, buf, buf_tokens = 0, [], 0
+
+    def flush():
+        nonlocal seg_no, buf, buf_tokens
+        seg_no += 1
+        segment = {"doc": doc_idx, "seg": seg_no, "text": "\n\n".join(buf), "tokens": buf_tokens}
+        buf, buf_tokens = [], 0
+        return segment
+
+    for unit in units:
+        unit_tokens = estimate_tokens(unit)
+        if unit_tokens > budget:
+            if buf:
+                yield flush()
+            for piece in _split_oversized(unit, budget):
+                buf, buf_tokens = [piece], estimate_tokens(piece)
+                yield flush()
+            continue
+        if buf and buf_tokens + unit_tokens > budget:
+            yield flush()
+        buf.append(unit)
+        buf_tokens += unit_tokens
+        if buf_tokens >= budget * ANCHOR_MIN_FILL and _is_anchor(unit):
+            yield flush()
+    if buf:
+        yield flush()
+
+
+def build_segments(doc_idx: int, units, budget: int):
+    """iter_segments 的列表版本：返回 [{"doc": doc_idx, "seg": n, "text": str, "tokens": int}]"""
+    return list(iter_segments(doc_idx, units, budget))
+
+
+def iter_packs(segments, budget: int):
+    """
+    跨文件装箱：按原顺序把小片段合并进同一请求，直到达到 token 预算。
+    保持顺序（next-fit），这样每个请求里的内容仍然是连续的上下文；下一个片段放不下时当前请求即可发出。
+    """
+    current, current_tokens = [], 0
+    for seg in segments:
+        if current and current_tokens + seg["tokens"] > budget:
+            yield current
+            current, current_tokens = [], 0
+        current.append(seg)
+        current_tokens += seg["tokens"]
+    if current:
+        yield current
+
+
+def pack_segments(segments, budget: int):
+    """iter_packs 的列表版本：返回 list[list[segment]]"""
+    return list(iter_packs(segments, budget))
+
+
+def render_pack(pack) -> str:
+    """单片段直接返回原文；多片段用分隔符包起来，要求模型按片段分别输出"""
+    if len(pack) == 1:
+        return pack[0]["text"]
+    blocks = []
+    for sid, seg in enumerate(pack, start=1):
+        blocks.append(
+            f"{SEGMENT_OPEN.format(sid=sid)}\n{seg['text']}\n{SEGMENT_CLOSE.format(sid=sid)}"
+        )
+    return "\n\n".join(blocks)
+
+
+def split_pack_output(output: str, pack):
+    """
+    把打包请求的输出拆回各片段（按 `### SEGMENT n` 标题）。
+    模型没有按格式输出时，整体归到第一个片段，避免内容丢失。
+    """
+    if len(pack) == 1:
+        return [output.strip()]
+
+    results = [""] * len(pack)
+    matches = list(_SEGMENT_HEADER_RE.finditer(output or ""))
+    if not matches:
+        results[0] = (output or "").strip()
+        return results
+
+    for i, m in enumerate(matches):
+        sid = int(m.group(1))
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(output)
+        body = _SEGMENT_CLOSE_RE.sub("", output[m.end():end]).strip()
+        if 1 <= sid <= len(pack) and body:
+            results[sid - 1] = (results[sid - 1] + "\n\n" + body).strip()
+    return results
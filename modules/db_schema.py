@@ -61,6 +61,7 @@ SYSTEM_TABLES = {
             cost REAL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             day_key TEXT,  -- e.g. "2025-10-08"
+            stage TEXT,    -- 流水线阶段：chunk / reduce / synthesis / mock_exam ...
             FOREIGN KEY (user_id) REFERENCES users(id)
         );
     """,
@@ -85,14 +86,22 @@ SYSTEM_TABLES = {
         CREATE TABLE IF NOT EXISTS jobs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            task_name TEXT,              -- e.g., "parse_file", "generate_notes", "export_pdf"
-            status TEXT,                 -- pending / running / success / failed
+            task_name TEXT,              -- e.g., "parse_files", "generate_notes", "export_pdf"
+            status TEXT,                 -- pending / running / success / failed / cancelled
             user_id INTEGER,
             request_id TEXT,
             progress INTEGER DEFAULT 0,  -- 0-100
             result_path TEXT,            -- 存储结果地址（S3 或本地）
             error_message TEXT,
-            meta TEXT                    -- JSON 字符串，存额外信息
+            meta TEXT,                   -- JSON 字符串，存额外信息
+            payload TEXT,                -- JSON：任务参数
+            attempts INTEGER DEFAULT 0,  -- 已领取次数
+            max_attempts INTEGER DEFAULT 3,
+            available_at REAL,           -- 重试退避：此时间之后才可被领取
+            lease_owner TEXT,            -- 持有租约的 worker
+            lease_expires REAL,          -- 租约到期时间（worker 崩溃后由其他 worker 接管）
+            heartbeat_at REAL,
+            updated_at REAL
         );
     """,
 
@@ -0,0 +1,103 @@
+# modules/dedup.py
+# 抽取前的近似重复检测（MinHash + LSH）
+# 课件导出的 PDF 经常重复标题页、目录、页眉和 "Thank you" 页，学生也常同时上传周讲义和整学期合集；
+# 重复的页 / 幻灯片只保留第一次出现的那一份送去模型
+
+import re
+import zlib
+import numpy as np
+from modules.chunker import UNIT_LABEL_RE, estimate_tokens
+
+NUM_PERM = 64          # MinHash 签名长度
+BANDS = 16             # LSH 分带数（每带 NUM_PERM // BANDS 行）
+SHINGLE_SIZE = 5       # 字符 shingle 长度（对中文同样有效）
+SIMILARITY_THRESHOLD = 0.85
+MIN_SHINGLES = 8       # 太短的单元只做精确去重，避免误判
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERM).astype(np.uint64)
+
+
+def _normalize(unit: str) -> str:
+    """去掉解析器的页标签、统一大小写与空白，只比较正文"""
+    body = UNIT_LABEL_RE.sub("", unit)
+    return re.sub(r"\s+", " ", body).strip().lower()
+
+
+def _signature(text: str):
+    """字符 shingle → 32 位哈希 → 向量化计算 MinHash 签名"""
+    shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    # (a * h + b) mod p，h < 2^32、a < 2^31，乘积不会溢出 uint64
+    values = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME
+    return values.min(axis=0)
+
+
+class Deduper:
+    """
+    有状态的去重器：按顺序逐个判断单元，只保留第一次出现的那一份（跨文件共享状态）。
+    stats = {"units", "duplicates", "tokens_saved"}
+    """
+
+    def __init__(self):
+        self.rows = NUM_PERM // BANDS
+        self.exact_seen = set()
+        self.buckets = {}        # (band, band_hash) -> [签名]
+        self.stats = {"units": 0, "duplicates": 0, "tokens_saved": 0}
+
+    def keep(self, unit: str) -> bool:
+        self.stats["units"] += 1
+        norm = _normalize(unit)
+        if not norm:
+            return False
+
+        rows = self.rows
+        duplicate = norm in self.exact_seen
+        sig = None
+        if not duplicate:
+            sig = _signature(norm)
+            if sig is not None:
+                for b in range(BANDS):
+                    band_key = (b, sig[b * rows:(b + 1) * rows].tobytes())
+                    for other in self.buckets.get(band_key, ()):
+                        if np.mean(other == sig) >= SIMILARITY_THRESHOLD:
+                            duplicate = True
+                            break
+                    if duplicate:
+                        break
+
+        if duplicate:
+            self.stats["duplicates"] += 1
+            self.stats["tokens_saved"] += estimate_tokens(unit)
+            return False
+
+        self.exact_seen.add(norm)
+        if sig is not None:
+            for b in range(BANDS):
+                band_key = (b, sig[b * rows:(b + 1) * rows].tobytes())
+                self.buckets.setdefault(band_key, []).append(sig)
+        return True
+
+    def filter(self, units):
+        """流式：逐个产出保留的单元"""
+        for unit in units:
+            if self.keep(unit):
+                yield unit
+
+
+def dedup_units(doc_units):
+    """
+    doc_units: 每个文件的单元列表 list[list[str]]（split_units 的输出）
+    返回 (过滤后的 doc_units, stats)，stats = {"units", "duplicates", "tokens_saved"}
+    """
+    deduper = Deduper()
+    kept_docs = [list(deduper.filter(units)) for units in doc_units]
+    return kept_docs, deduper.stats
@@ -1,18 +1,47 @@
 # modules/extractor.py
 # AI 提取重点 (支持语言检测 & 三大模式 + 学科类型识别 + 分块处理 + 日志记录 + Token 记录 + 模块健康检测)
 
-from openai import OpenAI
-from config import DEFAULT_MODEL, OPENAI_API_KEY
+from config import (
+    OPENAI_API_KEY,
+    CHUNK_TOKEN_BUDGET,
+    REDUCE_INPUT_TOKEN_BUDGET,
+    REDUCE_MAX_DEPTH,
+    PREFILTER_ENABLED,
+    PREFILTER_KEEP_RATIO,
+    PREFILTER_TOKEN_BUDGET,
+    TEXT_NORMALIZE_ENABLED,
+    TRANSLATION_BATCH_TOKENS,
+    REQUEST_MEMO_ENABLED,
+)
 from modules.utils.system_status import update_module_status 
-from langdetect import detect
-import re, time, traceback
+from modules.chunk_engine import run_ordered, run_streaming
+from modules.llm_cache import log_cache_stats
+from modules.llm_client import get_client
+from modules.chunker import (
+    split_units, build_segments, iter_segments, pack_segments, iter_packs, render_pack, split_pack_output, estimate_tokens,
+)
+from modules.reducer import hierarchical_reduce
+from modules import chunk_store
+from modules.dedup import dedup_units, Deduper
+from modules.prefilter import prefilter_units
+from modules.normalizer import normalize_units
+from modules import normalizer
+from modules import parse_engine
+from modules import run_checkpoint
+from modules import translation_memory
+from modules import model_router
+from modules import request_memo
+from modules.auth.user_memory import save_user_note, load_user_memory
+from modules import subject_classifier
+from modules.lang_detect import detect_language_code, detect_languages
+import itertools, re, time, traceback, uuid
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
 
 # === 引入模块 ===
 from modules.logger import (
     log_event,
     log_token_usage,
-    calculate_cost,
     #init_module_health,
 )
 
@@ -22,6 +51,11 @@ from modules.logger import (
 # except Exception:
 #     pass
 
+# 分块抽取 prompt 的版本号：修改 _extract_chunk 的 prompt 后需要递增，
+# 否则会复用旧 prompt 产生的片段结果
+EXTRACT_PROMPT_VERSION = "extract-v2"
+
+
 def get_current_user_id():
     """安全地从 session_state 获取当前登录用户"""
     try:
@@ -32,48 +66,183 @@ def get_current_user_id():
 
 # ================== 辅助函数 ==================
 def detect_language(text: str) -> str:
-    try:
-        lang = detect(text)
-        return "zh" if lang and lang.startswith("zh") else "en"
-    except Exception:
-        return "en"
-
-
-def detect_subject(text: str) -> str:
-    keywords = {
-        "code": ["def ", "class ", "import ", "{", "}", "function", "程序", "代码", "编程"],
-        "math": ["公式", "定理", "证明", "方程", "函数", "微积分", "matrix", "theorem"],
-        "physics": ["力学", "电磁", "量子", "热力学", "波动", "Newton", "Einstein"],
-        "chemistry": ["化学式", "分子", "反应", "酸碱", "化合物", "reaction"],
-        "engineering": ["电路", "结构", "控制系统", "机械", "材料力学"],
-        "theory": ["概念", "定义", "章节", "理论", "原理", "模型"],
-    }
-    text_lower = (text or "").lower()
-    for subject, kws in keywords.items():
-        if any(kw.lower() in text_lower for kw in kws):
-            return subject
-    return "general"
-
-
-def _chunk_text(text: str, max_chars: int = 3500):
-    if not text:
-        return []
-    chunks, start, L = [], 0, len(text)
-    while start < L:
-        end = min(start + max_chars, L)
-        if end < L:
-            nl = text.rfind("\n", start, end)
-            if nl > start + 40:
-                end = nl
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-        start = end
-    return chunks
+    # 抽样窗口投票 + 按文档哈希缓存（见 lang_detect）
+    return "zh" if detect_language_code(text) == "zh" else "en"
+
+
+def detect_subject(text: str, extra_keywords=None) -> str:
+    # 单次扫描的多关键词匹配，按加权得分选学科（见 subject_classifier）
+    return subject_classifier.detect_subject(text, extra_keywords)
+
+
+# ================== Prompt 构造 ==================
+# 在线流程（extract_summary）与离线批处理（batch_runner）共用同一套 prompt；
+# 两边的双语都是合成后单独的翻译阶段，译文通过翻译记忆共享
+
+REDUCE_MAX_TOKENS = 1500
+SYNTHESIS_MAX_TOKENS = 3000
+MOCK_EXAM_MAX_TOKENS = 2000
+MOCK_EXAM_HEADING = "## 📝 模拟考题"
+TRANSLATION_HEADING = "## 🌐 {lang} Version"
+
+
+def build_chunk_messages(pack, main_lang):
+    multi_rule = ""
+    if len(pack) > 1:
+        multi_rule = (
+            "6) The input contains several segments wrapped in <<<SEGMENT n>>> ... <<<END SEGMENT n>>>.\n"
+            "   For EVERY segment, start its output with a line `### SEGMENT n` and only use content from that segment.\n"
+        )
+    chunk_prompt = f"""
+You are an extractor whose job is to find explicit headings/terms and important sentences inside the given text chunk.
+
+Rules:
+1) Only extract items that explicitly appear in the text.
+2) Use original headings if present.
+3) Each item: heading + 1-3 sentence paraphrase + example if present.
+4) Markdown bullets only.
+5) Output language: {main_lang}.
+{multi_rule}
+Here is the chunk:
+{render_pack(pack)}
+"""
+    return [
+        {"role": "system", "content": "You are a careful extractor that only extracts content that appears in the input text."},
+        {"role": "user", "content": chunk_prompt},
+    ]
+
+
+def chunk_max_tokens(pack) -> int:
+    return 800 * min(len(pack), 3)
+
+
+def build_reduce_messages(batch_text, level, main_lang):
+    reduce_prompt = f"""
+You are merging partial study-note extracts (reduce level {level}).
+
+Rules:
+1) Keep every distinct heading/term and its key explanation; drop exact repetitions.
+2) Keep the `## FILE: ...` headings so the origin of each item stays visible.
+3) Do not add content that is not in the extracts.
+4) Markdown bullets only.
+5) Output language: {main_lang}.
+
+Extracts:
+{batch_text}
+"""
+    return [
+        {"role": "system", "content": "You are a careful editor that condenses notes without inventing content."},
+        {"role": "user", "content": reduce_prompt},
+    ]
+
+
+def build_synthesis_messages(mode, custom_instruction, main_lang, bilingual, target_lang_name, subject, files_block):
+    # ---------- 模式指令 ----------
+    if mode == "detailed":
+        mode_instruction = (
+            "MODE: DETAILED\n"
+            "For each FILE and each heading/term, produce detailed explanations and examples.\n"
+        )
+    elif mode == "exam":
+        mode_instruction = (
+            "MODE: EXAM\n"
+            "Provide short Q&A style notes.\n"
+        )
+    else:
+        custom_text = custom_instruction.strip() if custom_instruction else "No custom instruction."
+        mode_instruction = f"MODE: CUSTOM\nUser instruction: {custom_text}\n"
+
+    final_prompt = f"""
+You are a disciplined note synthesizer.
+{mode_instruction}
+Output language: {main_lang}{' and ' + target_lang_name + ' translation' if bilingual else ''}.
+Input extracts:
+Subject detected: {subject}
+
+{files_block}
+"""
+    return [
+        {"role": "system", "content": "You are a disciplined note synthesizer."},
+        {"role": "user", "content": final_prompt},
+    ]
+
+
+def build_mock_exam_messages(main_lang, subject, files_block):
+    mock_prompt = f"""
+You are an exam writer. Write a mock exam based ONLY on the study-note extracts below.
+
+Rules:
+1) 8-12 questions covering the most important headings/terms; mix multiple-choice, short-answer and one open question.
+2) Do not ask about content that is not in the extracts.
+3) Number the questions; put all answers with one-line explanations in a separate "Answers" list at the end.
+4) Markdown only, no preamble.
+5) Output language: {main_lang}.
+Subject detected: {subject}
+
+{files_block}
+"""
+    return [
+        {"role": "system", "content": "You are a careful exam writer who only tests content present in the input."},
+        {"role": "user", "content": mock_prompt},
+    ]
+
+
+def build_translation_messages(sentences, main_lang, target_lang_name):
+    numbered = "\n".join(f"[{i}] {sentence}" for i, sentence in enumerate(sentences, start=1))
+    translate_prompt = f"""
+Translate each numbered line of study notes from {main_lang} to {target_lang_name}.
+
+Rules:
+1) Output exactly one line per input line, keeping its number: `[n] translation`.
+2) Keep technical terms, formulas, code and proper nouns accurate; do not add explanations.
+3) Keep inline Markdown (bold, code, links) as in the source.
+
+{numbered}
+"""
+    return [
+        {"role": "system", "content": "You are a precise translator for study notes."},
+        {"role": "user", "content": translate_prompt},
+    ]
+
+
+def translation_max_tokens(sentences) -> int:
+    return 2 * sum(estimate_tokens(s) for s in sentences) + 20 * len(sentences) + 100
+
+
+def needs_translation(bilingual, source_lang, target_lang) -> bool:
+    """双语且目标语言与原文主语言不同时才有翻译阶段（zh → zh 没有可翻译的内容）"""
+    return bool(bilingual) and source_lang != target_lang
+
+
+# ================== 级联的输出检查 ==================
+# 便宜模型的输出没通过检查时，model_router 会升级到路由表中的下一个模型
+
+def chunk_output_ok(content, pack) -> bool:
+    """至少一半的片段拆出了非空结果（多片段请求没按 SEGMENT 格式输出时通常只有第一个有内容）"""
+    outputs = split_pack_output(content or "", pack)
+    return sum(1 for out in outputs if out) * 2 >= len(pack)
+
+
+def translation_output_ok(content, n) -> bool:
+    parsed = translation_memory.parse_numbered_output(content, n)
+    return sum(1 for out in parsed if out) >= 0.8 * n
+
+
+def clean_final_text(text: str) -> str:
+    """去掉模型复述的"文件格式不支持"之类的噪声行"""
+    return re.sub(r"(?im)^\s*(file format|unsupported|无法读取).*$", "", text or "").strip()
 
 
 # ================== 主函数 ==================
-def extract_summary(
+def extract_summary(texts, **kwargs):
+    """阻塞版本：跑完整个流程后返回最终笔记全文"""
+    result = {}
+    for _ in extract_summary_stream(texts, result=result, **kwargs):
+        pass
+    return result["text"]
+
+
+def extract_summary_stream(
     texts,
     api_key=None,
     mode="detailed",
@@ -82,7 +251,32 @@ def extract_summary(
     generate_mock=False,
     custom_instruction=None,
     user_id=None,
+    max_concurrency=None,
+    use_cache=True,
+    result=None,
+    subject_keywords=None,
+    prefilter=None,
+    run_id=None,
+    resume=None,
+    on_progress=None,
+    share_results=None,
+    files=None,
+    source_ids=None,
 ):
+    """
+    流式版本：分块 / 合并阶段照常执行，最终合成阶段逐段 yield 文本（可直接交给 st.write_stream）。
+    结束后 result["text"] 为清理后的最终笔记（流式输出的是未清理的原始文本）。
+    每个阶段完成后写入断点（run_checkpoint），resume 默认随 use_cache：同一 run_id 重新提交时从断点继续。
+    on_progress(stage, percent)：阶段完成时回调（后台任务用来上报进度）。
+    generate_mock=True 时额外生成模拟考题（与合成并发），追加在笔记末尾，token 在 usage_records 中记为 mock_exam 阶段。
+    share_results：是否参与跨用户的整篇笔记复用（request_memo），None 时读取用户设置（访客默认开启）；
+    False 时既不读取也不写入整篇结果。片段级缓存（llm_cache / chunk_store / 翻译记忆）按内容哈希存取，不受影响。
+    files=[(filename, bytes)] 且 texts 为 None 时边解析边抽取：片段一凑满一个请求就提交，后面的页继续解析
+    （从断点恢复或启用预筛选时先完整解析）。
+    source_ids：texts 由上传文件解析而来时传 run_checkpoint.file_source_ids(files)，
+    request_memo / run_id 与 files= 路径一样按文件内容哈希计算；不传时按 texts 计算。
+    """
+    result = result if result is not None else {}
     start_time = time.time()
     request_id = f"req_{int(start_time)}"
     source_module = "extractor"
@@ -92,6 +286,20 @@ def extract_summary(
     completion_tokens_total = 0
     total_tokens_total = 0
 
+    # 缓存命中计数
+    cache_hits = 0
+    cache_misses = 0
+
+    # 各阶段耗时（秒），写入 extract_success 日志与 result["stats"]
+    stage_seconds = {}
+
+    # 请求级复用：本请求为领头计算者时持有 memo_owner（后台线程定时续租），完成后写入结果，失败 / 中断时释放占位
+    memo_key = memo_owner = memo_heartbeat = None
+
+    def _progress(stage, percent):
+        if on_progress:
+            on_progress(stage, percent)
+
     try:
         log_event(
             source_module=source_module,
@@ -109,233 +317,651 @@ def extract_summary(
         if not key_to_use:
             raise RuntimeError("❌ 没有可用的 OpenAI API Key，请检查 config.py 或传入参数。")
 
-        client = OpenAI(api_key=key_to_use)
-
-        if not texts or not isinstance(texts, list):
-            raise ValueError("extract_summary 需要传入解析后的文本列表 (list[str])")
+        # 进程级共享客户端（长连接复用）；重试由 llm_call 统一处理
+        client = get_client(key_to_use)
 
-        combined_text = "\n".join(texts)
-        if not combined_text.strip():
-            raise ValueError("没有可用的学习资料，请确认上传文件能被解析。")
+        def _analyze(texts):
+            if not "".join(texts).strip():
+                raise ValueError("没有可用的学习资料，请确认上传文件能被解析。")
+            # 每个文件只抽样若干窗口检测，再按长度加权得到主语言
+            detected_code, file_languages = detect_languages(texts)
+            detected_lang = "zh" if detected_code == "zh" else "en"
+            main_lang = "English" if detected_lang == "en" else "Chinese"
+            # 按文件打分后汇总；subject_keywords 为用户自定义的额外学科关键词
+            subject, subject_scores, file_subjects = subject_classifier.classify_texts(texts, subject_keywords)
+            return detected_lang, file_languages, main_lang, subject, subject_scores, file_subjects
 
-        detected_lang = detect_language(combined_text)
-        main_lang = "English" if detected_lang == "en" else "Chinese"
         target_lang_name = "Chinese" if target_lang == "zh" else "English"
-        subject = detect_subject(combined_text)
+        streaming = texts is None and bool(files)
+        if streaming:
+            # 边解析边抽取：语言 / 学科在分块阶段结束后按全文统计；memo / run_id 按文件内容哈希
+            files = [(name, data) for name, data in files]
+            source_ids = run_checkpoint.file_source_ids(files)
+            detected_lang = file_languages = main_lang = subject = subject_scores = file_subjects = None
+        else:
+            if not texts or not isinstance(texts, list):
+                raise ValueError("extract_summary 需要传入解析后的文本列表 (list[str])")
+            source_ids = source_ids or texts
+            detected_lang, file_languages, main_lang, subject, subject_scores, file_subjects = _analyze(texts)
+
+        # 在主线程解析 user_id：工作线程里拿不到 Streamlit 的 session_state
+        user_id = user_id or get_current_user_id()
+        if share_results is None and user_id and user_id != "guest":
+            # 调用方没传时按用户设置（后台任务 / 页面都不需要自己读取偏好）；访客默认参与
+            share_results = load_user_memory(user_id).get("share_results", True)
+
+        # 各阶段 token 小计（chunk / reduce / synthesis / mock_exam / translation）
+        stage_tokens = {}
+        # 各路由（阶段:模型）的调用次数、升级、耗时与费用
+        route_stats = model_router.RouteStats()
+
+        def _record_calls(stage, calls):
+            """记录一次路由调用（可能含升级）的 token、缓存命中与路由统计（只在主线程调用）"""
+            nonlocal prompt_tokens_total, completion_tokens_total, total_tokens_total
+            nonlocal cache_hits, cache_misses
+            route_stats.add(stage, calls)
+            for call in calls:
+                usage = call["usage"]
+                if call["hit"]:
+                    cache_hits += 1
+                elif use_cache:
+                    cache_misses += 1
+
+                # 缓存命中时没有新消耗
+                if not usage:
+                    continue
+                log_token_usage(
+                    user_id=user_id,
+                    model=call["model"],
+                    prompt_tokens=usage["prompt_tokens"],
+                    completion_tokens=usage["completion_tokens"],
+                    total_tokens=usage["total_tokens"],
+                    request_id=request_id,
+                    stage=stage,
+                )
+                stage_tokens[stage] = stage_tokens.get(stage, 0) + usage["total_tokens"]
 
-        # ---------- 分块抽取 ----------
-        file_level_outputs = []
-        for idx, text in enumerate(texts, start=1):
-            fname = f"Document_{idx}"
-            chunks = _chunk_text(text, max_chars=3000)
-            chunk_summaries = []
+                # ====== 累加计数器 ======
+                prompt_tokens_total += usage["prompt_tokens"]
+                completion_tokens_total += usage["completion_tokens"]
+                total_tokens_total += usage["total_tokens"]
 
-            for c_idx, chunk in enumerate(chunks, start=1):
-                try:
-                    chunk_prompt = f"""
-You are an extractor whose job is to find explicit headings/terms and important sentences inside the given text chunk.
+        route_signatures = [model_router.route_signature(s) for s in model_router.STAGES]
 
-Rules:
-1) Only extract items that explicitly appear in the text.
-2) Use original headings if present.
-3) Each item: heading + 1-3 sentence paraphrase + example if present.
-4) Markdown bullets only.
-5) Output language: {main_lang}.
+        # ---------- 请求级复用：相同资料 + 相同设置跨用户直接返回，同时到达的相同请求只计算一次 ----------
+        if REQUEST_MEMO_ENABLED and use_cache and share_results is not False:
+            memo_key = request_memo.make_key(
+                source_ids, EXTRACT_PROMPT_VERSION, route_signatures, mode, bilingual, target_lang,
+                custom_instruction, subject_keywords, PREFILTER_ENABLED if prefilter is None else bool(prefilter),
+                generate_mock,
+            )
+            owner = f"{request_id}:{uuid.uuid4().hex[:8]}"
+            flight, memo = request_memo.single_flight(memo_key, owner)
+            if flight == "leader":
+                memo_owner = owner
+                memo_heartbeat = request_memo.start_heartbeat(memo_key, memo_owner)
+            elif flight == "timeout":
+                log_event(
+                    source_module=source_module,
+                    level="WARNING",
+                    status="warning",
+                    things="extract_memo_timeout",
+                    remark="等待相同请求的结果超时，改为独立计算",
+                    meta={"request_id": request_id, "memo_key": memo_key},
+                )
+            else:
+                memo_stats = memo["meta"]
+                memo_subject = memo_stats.get("subject", subject)
+                note_id = None
+                if user_id:
+                    note_id = save_user_note(
+                        user_id,
+                        f"Auto Extracted ({mode}) - {memo_subject}",
+                        memo["text"],
+                        {"mode": mode, "bilingual": bilingual, "subject": memo_subject,
+                         "request_id": request_id, "memo_key": memo_key, "memo_hit": True},
+                    )
+                duration = round(time.time() - start_time, 2)
+                log_event(
+                    source_module=source_module,
+                    level="INFO",
+                    status="work",
+                    things="extract_memo_hit",
+                    remark=f"Reused result of an identical request in {duration}s",
+                    meta={"request_id": request_id, "memo_key": memo_key, "duration": duration},
+                )
+                update_module_status("extractor", "running")
+                result.update(
+                    text=memo["text"], note_id=note_id, run_id=memo_stats.get("run_id"), resumed_from=None,
+                    memo_hit=True, stats={**memo_stats, "memo_hit": True, "duration": duration},
+                )
+                yield memo["text"]
+                return
+
+        # ---------- 断点续跑 ----------
+        # 同一份资料 + 同一组设置得到同一个 run_id；重试 / 刷新页面后重新提交时从最后完成的阶段继续
+        run_id = run_id or run_checkpoint.make_run_id(
+            source_ids, EXTRACT_PROMPT_VERSION, route_signatures, mode, bilingual, target_lang,
+            custom_instruction, subject_keywords, prefilter, generate_mock, user_id,
+        )
+        result["run_id"] = run_id
+        resume = use_cache if resume is None else resume
+        checkpoint = run_checkpoint.load(run_id) if resume else None
+        resumed_from = checkpoint["stage"] if checkpoint else None
+        result["resumed_from"] = resumed_from
+        if resumed_from:
+            log_event(
+                source_module=source_module,
+                level="INFO",
+                status="info",
+                things="extract_resumed",
+                remark=f"Resuming run {run_id} after stage {resumed_from}",
+                meta={"request_id": request_id, "run_id": run_id, "stage": resumed_from},
+            )
+        if resumed_from == "done":
+            # 已完整完成（笔记也已保存）：直接返回上次的结果，不重复保存
+            result["text"] = checkpoint["payload"]["text"]
+            result["note_id"] = checkpoint["payload"].get("note_id")
+            result["stats"] = {**(checkpoint["payload"].get("stats") or {}), "request_id": request_id,
+                               "run_id": run_id, "resumed_from": "done",
+                               "duration": round(time.time() - start_time, 2)}
+            yield result["text"]
+            return
+
+        if streaming and (resumed_from or (PREFILTER_ENABLED if prefilter is None else prefilter)):
+            # 从断点恢复（分块阶段已跳过）/ 预筛选（需要全部资料打分）时没有可重叠的工作：先完整解析
+            texts, _ = parse_engine.parse_files(files)
+            streaming = False
+            detected_lang, file_languages, main_lang, subject, subject_scores, file_subjects = _analyze(texts)
+
+        # 从断点恢复时跳过的阶段没有这些统计
+        segments, pending, chunk_jobs, chunks_failed = [], [], [], 0
+        dedup_stats = {"duplicates": 0, "tokens_saved": 0}
+        prefilter_stats = None
+        reduce_stats = {"depth": 0, "fanout": [], "failed": 0, "over_budget": None}
+        stage_start = time.time()
+
+        if resumed_from is None:
+            # ---------- 分块抽取（并发） ----------
+            def _extract_chunk(pack):
+                content, calls = model_router.complete(
+                    client,
+                    "chunk",
+                    build_chunk_messages(pack, main_lang),
+                    max_tokens=chunk_max_tokens(pack),
+                    accept=lambda out: chunk_output_ok(out, pack),
+                    use_cache=use_cache,
+                )
+                return split_pack_output(content, pack), calls
 
-Here is the chunk:
-{chunk}
-"""
-                    resp = client.chat.completions.create(
-                        model=DEFAULT_MODEL,
-                        messages=[
-                            {"role": "system", "content": "You are a careful extractor that only extracts content that appears in the input text."},
-                            {"role": "user", "content": chunk_prompt},
+            def _log_normalized(normalize_stats):
+                log_event(
+                    source_module=source_module,
+                    level="INFO",
+                    status="info",
+                    things="text_normalized",
+                    remark=(
+                        f"saved {sum(s['bytes_before'] - s['bytes_after'] for s in normalize_stats)} bytes, "
+                        f"~{sum(s['tokens_before'] - s['tokens_after'] for s in normalize_stats)} tokens"
+                    ),
+                    meta={
+                        "request_id": request_id,
+                        "documents": [
+                            {
+                                "doc": idx,
+                                "bytes_saved": s["bytes_before"] - s["bytes_after"],
+                                "tokens_saved": s["tokens_before"] - s["tokens_after"],
+                                "headers_removed": s["headers_removed"],
+                                "page_numbers_removed": s["page_numbers_removed"],
+                            }
+                            for idx, s in enumerate(normalize_stats, start=1)
                         ],
-                        max_tokens=800,
-                        temperature=0.0,
-                    )
+                    },
+                )
 
-                    chunk_result = resp.choices[0].message.content.strip()
-                    if chunk_result:
-                        chunk_summaries.append(chunk_result)
-
-                    # ✅ 记录 token 使用（已有）
-                    if hasattr(resp, "usage") and resp.usage:
-                        user_id = user_id or get_current_user_id()
-                        p = getattr(resp.usage, "prompt_tokens", 0) or 0
-                        c = getattr(resp.usage, "completion_tokens", 0) or 0
-                        t = getattr(resp.usage, "total_tokens", 0) or (p + c)
-
-                        # 写入 token_usage 表（你已有的函数）
-                        log_token_usage(
-                            user_id=user_id,
-                            model=DEFAULT_MODEL,
-                            prompt_tokens=p,
-                            completion_tokens=c,
-                            total_tokens=t
-                        )
-
-                        # ====== 累加计数器 ======
-                        prompt_tokens_total += int(p)
-                        completion_tokens_total += int(c)
-                        total_tokens_total += int(t)
-
-                except Exception as chunk_err:
+            if streaming:
+                # ---------- 边解析边抽取：片段一凑满一个请求就提交，后面的页继续在解析 ----------
+                parse_result = {}
+                unit_stream = parse_engine.iter_parse(files, result=parse_result)
+                # 分块 prompt 需要主语言：先读入约一个请求的内容做检测（全文统计在分块结束后）
+                head, head_tokens = [], 0
+                for unit in unit_stream:
+                    head.append(unit)
+                    head_tokens += estimate_tokens(unit["text"])
+                    if head_tokens >= CHUNK_TOKEN_BUDGET:
+                        break
+                head_code = detect_language_code("\n".join(unit["text"] for unit in head))
+                main_lang = "Chinese" if head_code == "zh" else "English"
+
+                chunk_route = model_router.route_signature("chunk")
+                doc_parsed = {}        # 文件序号 → 解析单元（分块结束后拼成 texts 做语言 / 学科统计）
+                normalize_stats = []
+                deduper = Deduper()
+                seg_keys, seg_outputs, stored = [], [], {}
+
+                def _chunk_units(doc_idx, units):
+                    """解析单元 → 分块单元（与 split_units 的切法一致）→ 规整 → 去重，全程惰性"""
+                    parsed = doc_parsed.setdefault(doc_idx, [])
+
+                    def _split():
+                        rest = []
+                        for unit in units:
+                            parsed.append(unit)
+                            if unit["kind"] in ("page", "slide"):
+                                yield unit["text"].strip()
+                            else:
+                                rest.append(unit)
+                        if rest:
+                            # DOCX / TXT 按空行分段，需要整个文件
+                            yield from split_units(parse_engine.join_doc(rest))
+
+                    out = _split()
+                    if TEXT_NORMALIZE_ENABLED:
+                        stats = normalizer.new_stats()
+                        normalize_stats.append(stats)
+                        out = normalizer.normalize_stream(out, stats)
+                    return deduper.filter(out)
+
+                def _pending_segments():
+                    """逐个产出需要送去模型的片段；已抽取过的片段（内容哈希相同）直接复用"""
+                    grouped = itertools.groupby(itertools.chain(head, unit_stream), key=lambda unit: unit["doc"])
+                    for doc_idx, units in grouped:
+                        for seg in iter_segments(doc_idx, _chunk_units(doc_idx, units), CHUNK_TOKEN_BUDGET):
+                            seg["pos"] = len(segments)
+                            segments.append(seg)
+                            key = chunk_store.segment_key(seg["text"], EXTRACT_PROMPT_VERSION, chunk_route, main_lang)
+                            seg_keys.append(key)
+                            out = chunk_store.load_many([key]).get(key) if use_cache else None
+                            seg_outputs.append(out)
+                            if out is None:
+                                pending.append(seg)
+                                yield seg
+                            else:
+                                stored[key] = out
+
+                def _packs():
+                    for pack in iter_packs(_pending_segments(), CHUNK_TOKEN_BUDGET):
+                        if "first_chunk_submit" not in stage_seconds:
+                            stage_seconds["first_chunk_submit"] = round(time.time() - stage_start, 3)
+                        yield pack
+
+                chunk_jobs, chunk_results = run_streaming(_extract_chunk, _packs(), max_workers=max_concurrency)
+                texts = [parse_engine.join_doc(doc_parsed[idx]) for idx in sorted(doc_parsed)]
+                stage_seconds["parse"] = parse_result["stats"]["wall_seconds"]
+                dedup_stats = deduper.stats
+                if TEXT_NORMALIZE_ENABLED:
+                    _log_normalized(normalize_stats)
+                detected_lang, file_languages, main_lang, subject, subject_scores, file_subjects = _analyze(texts)
+            else:
+                # 先按页 / 幻灯片 / 段落拆成单元，去掉跨文件的近似重复单元
+                doc_units = [split_units(text) for text in texts]
+
+                # 规整：去掉页标签 / 页眉页脚 / 页码，合并断词，压缩空白
+                if TEXT_NORMALIZE_ENABLED:
+                    normalized = [normalize_units(units) for units in doc_units]
+                    doc_units = [units for units, _ in normalized]
+                    normalize_stats = [stats for _, stats in normalized]
+                    _log_normalized(normalize_stats)
+
+                doc_units, dedup_stats = dedup_units(doc_units)
+
+                # 可选的抽取式预筛选：每节只保留 TF-IDF 得分靠前的句子
+                prefilter_stats = None
+                if PREFILTER_ENABLED if prefilter is None else prefilter:
+                    doc_units, prefilter_stats = prefilter_units(doc_units, PREFILTER_KEEP_RATIO, PREFILTER_TOKEN_BUDGET)
+                    stage_seconds["prefilter"] = prefilter_stats["seconds"]
+
+                # 按 token 预算切片，再把小片段跨文件装箱到同一请求
+                segments = []
+                for idx, units in enumerate(doc_units, start=1):
+                    segments.extend(build_segments(idx, units, CHUNK_TOKEN_BUDGET))
+                for i, seg in enumerate(segments):
+                    seg["pos"] = i
+
+                # 已抽取过的片段（内容哈希相同）直接复用，只把新增 / 改动的片段送去模型
+                seg_keys = [
+                    chunk_store.segment_key(seg["text"], EXTRACT_PROMPT_VERSION, model_router.route_signature("chunk"), main_lang)
+                    for seg in segments
+                ]
+                stored = chunk_store.load_many(seg_keys) if use_cache else {}
+                seg_outputs = [stored.get(key) for key in seg_keys]
+                pending = [seg for seg, out in zip(segments, seg_outputs) if out is None]
+                chunk_jobs = pack_segments(pending, CHUNK_TOKEN_BUDGET)
+                stage_seconds["prepare"] = round(time.time() - stage_start, 3)
+                stage_start = time.time()
+
+                chunk_results = run_ordered(_extract_chunk, chunk_jobs, max_workers=max_concurrency)
+
+            # 结果按原始顺序回收；token 记录与累加都在主线程完成，避免并发写计数器
+            new_results = []
+            for pack, (ok, value) in zip(chunk_jobs, chunk_results):
+                if not ok:
+                    pack_label = ", ".join(f"{seg['doc']}-{seg['seg']}" for seg in pack)
                     log_event(
                         source_module=source_module,
                         level="WARNING",
                         status="warning",
                         things="chunk_failed",
-                        remark=f"Chunk {idx}-{c_idx} failed: {chunk_err}",
+                        remark=f"Chunk {pack_label} failed: {value}",
                         meta={"request_id": request_id},
                     )
+                    continue
+
+                pack_outputs, calls = value
+                _record_calls("chunk", calls)
+                for seg, seg_output in zip(pack, pack_outputs):
+                    seg_outputs[seg["pos"]] = seg_output
+                    new_results.append((seg_keys[seg["pos"]], seg_output))
+            chunk_store.save_many(new_results, EXTRACT_PROMPT_VERSION)
+
+            # 失败的片段不再静默跳过：全部失败时直接报错，部分失败写入 meta 并提示
+            chunks_failed = sum(1 for ok, _ in chunk_results if not ok)
+            if chunk_jobs and chunks_failed == len(chunk_jobs) and not stored:
+                raise RuntimeError(f"所有分块抽取均失败（{chunks_failed} 个请求），请稍后重试。")
+            if chunks_failed:
+                log_event(
+                    source_module=source_module,
+                    level="WARNING",
+                    status="warning",
+                    things="chunks_partially_failed",
+                    remark=f"{chunks_failed}/{len(chunk_jobs)} chunk requests failed after retries",
+                    meta={"request_id": request_id, "chunks_failed": chunks_failed},
+                )
 
-            file_merged = "\n\n".join(chunk_summaries).strip()
-            file_level_outputs.append({"name": fname, "content": file_merged})
+            stage_seconds["chunk"] = round(time.time() - stage_start, 3)
+            stage_start = time.time()
 
-        # ---------- 合并所有文本 ----------
-        files_block = "".join([f"## FILE: {fo['name']}\n{fo['content']}\n\n" for fo in file_level_outputs])
+            summaries_by_file = {idx: [] for idx in range(1, len(texts) + 1)}
+            for seg, seg_output in zip(segments, seg_outputs):
+                if seg_output:
+                    summaries_by_file[seg["doc"]].append(seg_output)
 
-        # ---------- 模式指令 ----------
-        if mode == "detailed":
-            mode_instruction = (
-                "MODE: DETAILED\n"
-                "For each FILE and each heading/term, produce detailed explanations and examples.\n"
+            file_level_outputs = []
+            for idx in range(1, len(texts) + 1):
+                file_merged = "\n\n".join(summaries_by_file[idx]).strip()
+                file_level_outputs.append({"name": f"Document_{idx}", "content": file_merged})
+
+            file_blocks = [f"## FILE: {fo['name']}\n{fo['content']}" for fo in file_level_outputs if fo["content"]]
+            if not chunks_failed:
+                # 有失败片段时不记断点：重试会重新跑分块阶段（成功的片段由 chunk_store 复用）
+                run_checkpoint.save(run_id, "chunked", {"file_blocks": file_blocks}, user_id)
+        else:
+            file_blocks = checkpoint["payload"].get("file_blocks", [])
+        _progress("chunked", 40)
+
+        # ---------- 多级合并：超出合成预算时先分批并行压缩 ----------
+        def _reduce_batch(batch_text, level):
+            return model_router.complete(
+                client,
+                "reduce",
+                build_reduce_messages(batch_text, level, main_lang),
+                max_tokens=REDUCE_MAX_TOKENS,
+                accept=lambda out: bool(out and out.strip()),
+                use_cache=use_cache,
             )
-        elif mode == "exam":
-            mode_instruction = (
-                "MODE: EXAM\n"
-                "Provide short Q&A style notes.\n"
+
+        if resumed_from in (None, "chunked"):
+            reduced_blocks, reduce_stats = hierarchical_reduce(
+                file_blocks,
+                _reduce_batch,
+                budget=REDUCE_INPUT_TOKEN_BUDGET,
+                max_depth=REDUCE_MAX_DEPTH,
+                max_workers=max_concurrency,
+                on_result=lambda calls: _record_calls("reduce", calls),
             )
+            run_checkpoint.save(run_id, "reduced", {"reduced_blocks": reduced_blocks}, user_id)
         else:
-            custom_text = custom_instruction.strip() if custom_instruction else "No custom instruction."
-            mode_instruction = f"MODE: CUSTOM\nUser instruction: {custom_text}\n"
+            reduced_blocks = checkpoint["payload"].get("reduced_blocks", [])
 
-        # ---------- 生成最终总结 ----------
-        final_prompt = f"""
-You are a disciplined note synthesizer.
-{mode_instruction}
-Output language: {main_lang}{' and ' + target_lang_name + ' translation' if bilingual else ''}.
-Input extracts:
-Subject detected: {subject}
+        stage_seconds["reduce"] = round(time.time() - stage_start, 3)
+        stage_start = time.time()
+        _progress("reduced", 70)
 
-{files_block}
-"""
+        # ---------- 合并所有文本 ----------
+        files_block = "".join(f"{block}\n\n" for block in reduced_blocks)
 
-        resp2 = client.chat.completions.create(
-            model=DEFAULT_MODEL,
-            messages=[
-                {"role": "system", "content": "You are a disciplined note synthesizer."},
-                {"role": "user", "content": final_prompt},
-            ],
-            max_tokens=3000,
-            temperature=0.0,
+        # ---------- 生成最终总结 ----------
+        # 双语不再由合成一次输出两种语言（最长的串行调用翻倍且容易截断），改为合成后单独的翻译阶段
+        synthesis_messages = build_synthesis_messages(
+            mode, custom_instruction, main_lang, False, target_lang_name, subject, files_block
         )
-
-        final_text = resp2.choices[0].message.content or ""
-        final_text = re.sub(r"(?im)^\s*(file format|unsupported|无法读取).*$", "", final_text).strip()
-
-        # ✅ 记录 token 使用 (总汇阶段)
-        if hasattr(resp2, "usage") and resp2.usage:
-            user_id = user_id or get_current_user_id()
-            p2 = getattr(resp2.usage, "prompt_tokens", 0) or 0
-            c2 = getattr(resp2.usage, "completion_tokens", 0) or 0
-            t2 = getattr(resp2.usage, "total_tokens", 0) or (p2 + c2)
-
-            log_token_usage(
-                user_id=user_id,
-                model=DEFAULT_MODEL,
-                prompt_tokens=p2,
-                completion_tokens=c2,
-                total_tokens=t2
+        synthesis = {}
+        first_token_at = None
+        mock_exam = checkpoint["payload"].get("mock_exam") if resumed_from == "synthesized" else None
+
+        # ---------- 模拟考题：与合成读取同一份抽取结果，在后台线程与合成并发执行 ----------
+        def _generate_mock():
+            mock_start = time.time()
+            content, calls = model_router.complete(
+                client,
+                "mock_exam",
+                build_mock_exam_messages(main_lang, subject, files_block),
+                max_tokens=MOCK_EXAM_MAX_TOKENS,
+                accept=lambda out: len(clean_final_text(out)) >= 30,
+                use_cache=use_cache,
             )
+            return content, calls, time.time() - mock_start
+
+        mock_pool = mock_future = None
+        if generate_mock and not mock_exam:
+            mock_pool = ThreadPoolExecutor(max_workers=1)
+            mock_future = mock_pool.submit(_generate_mock)
+
+        try:
+            if resumed_from == "synthesized":
+                # 合成已完成、只是后续步骤失败：直接回放上次的合成结果
+                synthesis = {"content": checkpoint["payload"]["content"], "ttft": None}
+                first_token_at = time.time()
+                yield synthesis["content"]
+            else:
+                # 级联：输出过短（未通过下方的长度检查）时升级到下一个模型重新合成
+                for piece in model_router.stream(
+                    client,
+                    "synthesis",
+                    synthesis_messages,
+                    max_tokens=SYNTHESIS_MAX_TOKENS,
+                    accept=lambda out: len(clean_final_text(out)) >= 30,
+                    use_cache=use_cache,
+                    result=synthesis,
+                ):
+                    if first_token_at is None:
+                        first_token_at = time.time()
+                    yield piece
+                _record_calls("synthesis", synthesis["calls"])
+            stage_seconds["synthesis"] = round(time.time() - stage_start, 3)
+
+            if mock_future is not None:
+                # 合成结束后才等待考题：只有考题比合成慢的部分才会增加总耗时
+                wait_start = time.time()
+                try:
+                    content, calls, mock_seconds = mock_future.result()
+                    _record_calls("mock_exam", calls)
+                    mock_exam = clean_final_text(content)
+                    stage_seconds["mock_exam"] = round(mock_seconds, 3)
+                except Exception as e:
+                    # 考题失败不影响笔记本身
+                    log_event(
+                        source_module=source_module,
+                        level="WARNING",
+                        status="warning",
+                        things="mock_exam_failed",
+                        remark=str(e),
+                        meta={"request_id": request_id, "run_id": run_id},
+                    )
+                stage_seconds["mock_exam_wait"] = round(time.time() - wait_start, 3)
+        finally:
+            if mock_pool is not None:
+                mock_pool.shutdown(wait=False)
 
-            # ====== 累加计数器 ======
-            prompt_tokens_total += int(p2)
-            completion_tokens_total += int(c2)
-            total_tokens_total += int(t2)
+        if resumed_from != "synthesized" or mock_future is not None:
+            run_checkpoint.save(run_id, "synthesized", {"content": synthesis["content"], "mock_exam": mock_exam}, user_id)
+        _progress("synthesized", 90)
+        final_text = clean_final_text(synthesis["content"])
 
         if len(final_text) < 30:
             raise RuntimeError("生成的笔记过短，可能模型未提取到有效内容。")
 
-        duration = round(time.time() - start_time, 2)
+        # ---------- 双语：按小节并行翻译，句子级翻译记忆跨笔记复用 ----------
+        translation_stats = None
+        translation_skipped = bilingual and not needs_translation(bilingual, detected_lang, target_lang)
+        if translation_skipped:
+            # 原文已是目标语言：不静默跳过，记录下来并在结果里告知页面
+            log_event(
+                source_module=source_module,
+                level="WARNING",
+                status="warning",
+                things="translation_skipped",
+                remark=f"bilingual requested but source language is already {target_lang}",
+                meta={"request_id": request_id, "run_id": run_id, "source_lang": detected_lang},
+            )
+        if needs_translation(bilingual, detected_lang, target_lang):
+            stage_start = time.time()
+
+            def _translate_batch(sentences):
+                # 少于 80% 的句子按编号返回时升级模型
+                content, calls = model_router.complete(
+                    client,
+                    "translation",
+                    build_translation_messages(sentences, main_lang, target_lang_name),
+                    max_tokens=translation_max_tokens(sentences),
+                    accept=lambda out: translation_output_ok(out, len(sentences)),
+                    use_cache=use_cache,
+                )
+                return translation_memory.parse_numbered_output(content, len(sentences)), calls
+
+            translated, translation_stats = translation_memory.translate_markdown(
+                final_text,
+                _translate_batch,
+                detected_lang,
+                target_lang,
+                model_router.route_signature("translation"),
+                TRANSLATION_BATCH_TOKENS,
+                max_workers=max_concurrency,
+                use_memory=use_cache,
+                on_result=lambda calls: _record_calls("translation", calls),
+            )
+            if translation_stats["failed_calls"]:
+                log_event(
+                    source_module=source_module,
+                    level="WARNING",
+                    status="warning",
+                    things="translation_partially_failed",
+                    remark=f"{translation_stats['failed_calls']}/{translation_stats['calls']} translation requests failed",
+                    meta={"request_id": request_id, "run_id": run_id},
+                )
+            translation_block = f"{TRANSLATION_HEADING.format(lang=target_lang_name)}\n\n{translated}"
+            yield f"\n\n---\n\n{translation_block}"
+            final_text = f"{final_text}\n\n---\n\n{translation_block}"
+            stage_seconds["translation"] = round(time.time() - stage_start, 3)
+            _progress("translated", 95)
 
-        # ====== 计算估算费用（尝试不同签名的 calculate_cost） ======
-        estimated_cost = None
-        try:
-            # 最常见： calculate_cost(model, total_tokens)
-            estimated_cost = calculate_cost(DEFAULT_MODEL, total_tokens_total)
-        except TypeError:
-            try:
-                # 另一种可能： calculate_cost(model, prompt_tokens, completion_tokens)
-                estimated_cost = calculate_cost(DEFAULT_MODEL, prompt_tokens_total, completion_tokens_total)
-            except Exception:
-                estimated_cost = None
-        except Exception:
-            estimated_cost = None
+        if mock_exam:
+            yield f"\n\n{MOCK_EXAM_HEADING}\n\n{mock_exam}"
+            final_text = f"{final_text}\n\n{MOCK_EXAM_HEADING}\n\n{mock_exam}"
 
+        duration = round(time.time() - start_time, 2)
+        # 首字延迟：从请求开始到用户看到第一段合成文本
+        ttft = round(first_token_at - start_time, 2) if first_token_at else None
+
+        # ====== 估算费用：各路由按实际使用的模型分别计价后求和 ======
+        estimated_cost = route_stats.total_cost()
+        routes = route_stats.summary()
+        route_stats.log(source_module, request_id=request_id)
+
+        run_stats = {
+            "duration": duration,
+            "ttft": ttft,
+            "synthesis_ttft": round(synthesis["ttft"], 2) if synthesis.get("ttft") else None,
+            "mode": mode,
+            "bilingual": bilingual,
+            "request_id": request_id,
+            "run_id": run_id,
+            "resumed_from": resumed_from,
+            "subject": subject,
+            "subject_scores": subject_scores,
+            "file_subjects": [label for label, _ in file_subjects],
+            "file_languages": file_languages,
+            "prompt_tokens": prompt_tokens_total,
+            "completion_tokens": completion_tokens_total,
+            "total_tokens": total_tokens_total,
+            "estimated_cost": estimated_cost,
+            "duplicate_units": dedup_stats["duplicates"],
+            "dedup_tokens_saved": dedup_stats["tokens_saved"],
+            "prefilter_tokens_before": prefilter_stats["tokens_before"] if prefilter_stats else None,
+            "prefilter_tokens_after": prefilter_stats["tokens_after"] if prefilter_stats else None,
+            "segments": len(segments),
+            "segments_reused": len(segments) - len(pending),
+            "chunks": len(chunk_jobs),
+            "chunks_failed": chunks_failed,
+            "reduce_depth": reduce_stats["depth"],
+            "reduce_fanout": reduce_stats["fanout"],
+            "reduce_over_budget": reduce_stats["over_budget"],
+            "cache_hits": cache_hits,
+            "cache_misses": cache_misses,
+            "llm_calls": sum(route["calls"] for route in routes.values()),
+            "routes": routes,
+            "stage_seconds": stage_seconds,
+            "stage_tokens": stage_tokens,
+            "mock_exam": bool(mock_exam),
+            "translation": translation_stats,
+            "translation_skipped": translation_skipped,
+        }
         log_event(
             source_module=source_module,
             level="INFO",
             status="work",
             things="extract_success",
             remark=f"Processed {len(texts)} docs in {duration}s, subject={subject}",
-            meta={
-                "duration": duration,
-                "mode": mode,
-                "bilingual": bilingual,
-                "request_id": request_id,
-                "prompt_tokens": prompt_tokens_total,
-                "completion_tokens": completion_tokens_total,
-                "total_tokens": total_tokens_total,
-                "estimated_cost": estimated_cost,
-            },
+            meta=run_stats,
         )
+        result["stats"] = run_stats
+        if use_cache:
+            log_cache_stats(source_module, cache_hits, cache_misses, request_id=request_id)
 
         # ✅ 成功后更新状态为运行中
         update_module_status("extractor", "running")
 
+        # 共享给相同的后续 / 正在等待的请求
+        if memo_owner:
+            memo_heartbeat.set()
+            request_memo.store(memo_key, memo_owner, final_text, run_stats)
+            memo_owner = None
+
         # === 保存笔记 ===
+        note_id = None
         if user_id:
-            try:
-                from modules.auth.routes_local import SessionLocal
-                from modules.auth.models import UserNote
-                from datetime import datetime
-                import json
-
-                db = SessionLocal()
-                note = UserNote(
-                    user_id=user_id,
-                    note_title=f"Auto Extracted ({mode}) - {subject}",
-                    note_content=final_text,
-                    metadata=json.dumps({
-                        "mode": mode,
-                        "bilingual": bilingual,
-                        "subject": subject,
-                        "duration": duration,
-                        "request_id": request_id,
-                        "prompt_tokens": prompt_tokens_total,
-                        "completion_tokens": completion_tokens_total,
-                        "total_tokens": total_tokens_total,
-                        "estimated_cost": estimated_cost,
-                    }),
-                    created_at=datetime.utcnow(),
-                    updated_at=datetime.utcnow(),
-                )
-                db.add(note)
-                db.commit()
-                db.close()
-            except Exception as save_err:
+            note_id = save_user_note(
+                user_id,
+                f"Auto Extracted ({mode}) - {subject}",
+                final_text,
+                {
+                    "mode": mode,
+                    "bilingual": bilingual,
+                    "subject": subject,
+                    "duration": duration,
+                    "request_id": request_id,
+                    "run_id": run_id,
+                    "prompt_tokens": prompt_tokens_total,
+                    "completion_tokens": completion_tokens_total,
+                    "total_tokens": total_tokens_total,
+                    "estimated_cost": estimated_cost,
+                },
+            )
+            if note_id is None:
+                # 断点停在 synthesized，重试时只需重新保存
                 log_event(
                     source_module=source_module,
                     level="ERROR",
                     status="warning",
                     things="note_save_failed",
-                    remark=f"笔记保存失败: {save_err}",
-                    meta={"request_id": request_id},
+                    remark="笔记保存失败，可重新提交以从断点继续",
+                    meta={"request_id": request_id, "run_id": run_id},
                 )
+        if note_id is not None or not user_id:
+            run_checkpoint.save(run_id, "done", {"text": final_text, "note_id": note_id, "stats": run_stats}, user_id)
 
-        return final_text
+        result["text"] = final_text
+        result["note_id"] = note_id
 
     except Exception as e:
         # ❌ 出错时更新健康状态
@@ -350,3 +976,9 @@ Subject detected: {subject}
             meta={"trace": traceback.format_exc(), "request_id": request_id},
         )
         raise e
+    finally:
+        if memo_heartbeat:
+            memo_heartbeat.set()
+        # 失败或流被中途关闭：释放占位，等待中的相同请求会重新竞争计算
+        if memo_owner:
+            request_memo.release(memo_key, memo_owner)
@@ -5,6 +5,7 @@
 import os
 import io
 import tempfile
+import time
 from pptx import Presentation
 from docx import Document
 import fitz  # PyMuPDF
@@ -42,135 +43,181 @@ def is_text_image(pil_img, threshold=0.05):
 
 
 # ======================================================
-#   各种文件格式解析
+#   各种文件格式解析（生成器：边解析边产出单元）
 # ======================================================
+# 每个单元为 {"file", "kind", "index", "text", "seconds"}：
+#   kind 为 page（PDF 页）/ slide（PPTX 幻灯片）/ paragraph（DOCX 段落）/ text（TXT 全文或占位）；
+#   index 从 1 开始；PDF / PPTX 的 text 带页 / 幻灯片标签，与拼接后的全文格式一致
 
-def extract_text_from_pptx_file(file_bytes, filename="unknown.pptx"):
-    """提取 PPTX 文本（OCR 暂时禁用）"""
-    try:
-        log_event("file_parser", "INFO", "work", f"开始解析 PPTX 文件: {filename}")
-        with tempfile.TemporaryDirectory() as tmpdir:
-            pptx_path = os.path.join(tmpdir, filename)
-            with open(pptx_path, "wb") as f:
-                f.write(file_bytes)
-
-            prs = Presentation(pptx_path)
-            text = []
-
-            for i, slide in enumerate(prs.slides, start=1):
-                slide_text = []
-
-                # 提取可编辑文字
-                for shape in slide.shapes:
-                    if shape.has_text_frame:
-                        for para in shape.text_frame.paragraphs:
-                            para_text = para.text.strip()
-                            if para_text:
-                                slide_text.append(para_text)
-
-                # 图片 OCR（禁用）
-                for shape in slide.shapes:
-                    if shape.shape_type == 13:  # Picture
-                        try:
-                            image = shape.image
-                            pil_img = Image.open(io.BytesIO(image.blob))
-                            if is_text_image(pil_img):
-                                ocr_text = ocr_image(pil_img)
-                                if ocr_text:
-                                    slide_text.append(ocr_text)
-                        except Exception as e:
-                            log_event("file_parser", "WARNING", "warning", f"PPTX 图片OCR失败: {filename}", remark=str(e))
-
-                if slide_text:
-                    text.append(f"【Slide {i} - {filename}】\n" + "\n".join(set(slide_text)))
-
-        result = "\n\n".join(text) if text else "（未提取到有效文本）"
-        log_event("file_parser", "INFO", "work", f"PPTX 文件解析完成: {filename}", meta={"text_length": len(result)})
-        return result
+NO_TEXT = "（未提取到有效文本）"
 
-    except Exception as e:
-        log_event("file_parser", "ERROR", "down", f"PPTX 解析失败: {filename}", remark=str(e))
-        return f"❌ 文件解析失败: {filename}"
 
+class UnsupportedFormat(ValueError):
+    pass
 
-def extract_text_from_file(uploaded_file, filename=None):
-    """根据文件类型提取纯文本（支持 PPTX/DOCX/PDF/TXT，OCR 暂时禁用）"""
-    filename = (filename or getattr(uploaded_file, "name", "unknown")).lower()
-    try:
-        log_event("file_parser", "INFO", "work", f"开始解析文件: {filename}")
 
-        # 确保 bytes 不会被读空
-        if hasattr(uploaded_file, "seek"):
-            uploaded_file.seek(0)
-        file_bytes = uploaded_file.read() if hasattr(uploaded_file, "read") else uploaded_file
-        file_stream = io.BytesIO(file_bytes)
+def _unit(filename, kind, index, text, started):
+    return {"file": filename, "kind": kind, "index": index, "text": text,
+            "seconds": round(time.perf_counter() - started, 4)}
 
-        # -------- PPTX --------
-        if filename.endswith(".pptx"):
-            return extract_text_from_pptx_file(file_bytes, filename=filename)
 
-        # -------- DOCX --------
-        elif filename.endswith(".docx"):
-            doc = Document(file_stream)
-            text = []
+def iter_pptx_slides(file_bytes, filename):
+    """逐张产出有文字的幻灯片（OCR 暂时禁用）"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pptx_path = os.path.join(tmpdir, os.path.basename(filename))
+        with open(pptx_path, "wb") as f:
+            f.write(file_bytes)
 
-            for p in doc.paragraphs:
-                if p.text.strip():
-                    text.append(p.text)
+        prs = Presentation(pptx_path)
+        for i, slide in enumerate(prs.slides, start=1):
+            started = time.perf_counter()
+            slide_text = []
+
+            # 提取可编辑文字
+            for shape in slide.shapes:
+                if shape.has_text_frame:
+                    for para in shape.text_frame.paragraphs:
+                        para_text = para.text.strip()
+                        if para_text:
+                            slide_text.append(para_text)
 
             # 图片 OCR（禁用）
-            for rel in doc.part.rels.values():
-                if hasattr(rel, "target_ref") and "image" in rel.target_ref:
+            for shape in slide.shapes:
+                if shape.shape_type == 13:  # Picture
                     try:
-                        image_data = rel.target_part.blob
-                        pil_img = Image.open(io.BytesIO(image_data))
-                        ocr_text = ocr_image(pil_img)
-                        if ocr_text:
-                            text.append(ocr_text)
+                        image = shape.image
+                        pil_img = Image.open(io.BytesIO(image.blob))
+                        if is_text_image(pil_img):
+                            ocr_text = ocr_image(pil_img)
+                            if ocr_text:
+                                slide_text.append(ocr_text)
                     except Exception as e:
-                        log_event("file_parser", "WARNING", "warning", f"DOCX 图片OCR失败: {filename}", remark=str(e))
-
-            result = "\n".join(text) if text else "（未提取到有效文本）"
-            log_event("file_parser", "INFO", "work", f"DOCX 文件解析完成: {filename}", meta={"text_length": len(result)})
-            return result
-
-        # -------- PDF --------
-        elif filename.endswith(".pdf"):
-            text = []
-            with fitz.open(stream=file_bytes, filetype="pdf") as pdf_doc:
-                for page_num, page in enumerate(pdf_doc, start=1):
-                    page_text = page.get_text("text").strip()
-                    ocr_text = ""  # OCR 暂不启用
-                    combined_parts = []
-                    if page_text:
-                        combined_parts.append(page_text)
-                    if ocr_text:
-                        combined_parts.append(ocr_text)
-
-                    page_content = "\n".join(combined_parts).strip()
-                    text.append(f"【第 {page_num} 页 - {filename}】\n{page_content}")
-
-            result = "\n\n".join(text) if text else "（未提取到有效文本）"
-            log_event("file_parser", "INFO", "work", f"PDF 文件解析完成: {filename}", meta={"pages": len(text)})
-            return result
-
-        # -------- TXT --------
-        elif filename.endswith(".txt"):
+                        log_event("file_parser", "WARNING", "warning", f"PPTX 图片OCR失败: {filename}", remark=str(e))
+
+            if slide_text:
+                text = f"【Slide {i} - {filename}】\n" + "\n".join(set(slide_text))
+                yield _unit(filename, "slide", i, text, started)
+
+
+def iter_docx_paragraphs(file_bytes, filename):
+    """逐段产出 DOCX 正文（图片 OCR 暂时禁用）"""
+    started = time.perf_counter()
+    doc = Document(io.BytesIO(file_bytes))
+    index = 0
+    for p in doc.paragraphs:
+        if p.text.strip():
+            index += 1
+            yield _unit(filename, "paragraph", index, p.text, started)
+            started = time.perf_counter()
+
+    for rel in doc.part.rels.values():
+        if hasattr(rel, "target_ref") and "image" in rel.target_ref:
             try:
-                result = file_bytes.decode("utf-8", errors="ignore").strip() or "（未提取到有效文本）"
-                log_event("file_parser", "INFO", "work", f"TXT 文件解析完成: {filename}", meta={"text_length": len(result)})
-                return result
+                image_data = rel.target_part.blob
+                pil_img = Image.open(io.BytesIO(image_data))
+                ocr_text = ocr_image(pil_img)
+                if ocr_text:
+                    index += 1
+                    yield _unit(filename, "paragraph", index, ocr_text, started)
+                    started = time.perf_counter()
             except Exception as e:
-                log_event("file_parser", "ERROR", "down", f"TXT 文件解析失败: {filename}", remark=str(e))
-                return "（未提取到有效文本）"
+                log_event("file_parser", "WARNING", "warning", f"DOCX 图片OCR失败: {filename}", remark=str(e))
+
+
+def _open_pdf(source):
+    """source 为 bytes 或文件路径"""
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def pdf_page_count(source):
+    with _open_pdf(source) as pdf_doc:
+        return pdf_doc.page_count
 
-        else:
-            log_event("file_parser", "WARNING", "warning", f"不支持的文件格式: {filename}")
-            return f"❌ 不支持的文件格式: {filename}"
 
+def iter_pdf_pages(source, filename, start=0, end=None):
+    """逐页产出 PDF 第 [start, end) 页（0 起始；解析引擎按页区间拆分时使用）"""
+    with _open_pdf(source) as pdf_doc:
+        end = pdf_doc.page_count if end is None else min(end, pdf_doc.page_count)
+        for page_index in range(start, end):
+            started = time.perf_counter()
+            page_text = pdf_doc[page_index].get_text("text").strip()
+            ocr_text = ""  # OCR 暂不启用
+            combined_parts = []
+            if page_text:
+                combined_parts.append(page_text)
+            if ocr_text:
+                combined_parts.append(ocr_text)
+
+            page_content = "\n".join(combined_parts).strip()
+            text = f"【第 {page_index + 1} 页 - {filename}】\n{page_content}"
+            yield _unit(filename, "page", page_index + 1, text, started)
+
+
+def iter_units(uploaded_file, filename=None):
+    """
+    根据文件类型逐个产出单元（支持 PPTX/DOCX/PDF/TXT）。
+    解析异常直接抛出（不支持的格式为 UnsupportedFormat），由调用方决定如何处理。
+    """
+    filename = (filename or getattr(uploaded_file, "name", "unknown")).lower()
+    # 确保 bytes 不会被读空
+    if hasattr(uploaded_file, "seek"):
+        uploaded_file.seek(0)
+    file_bytes = uploaded_file.read() if hasattr(uploaded_file, "read") else uploaded_file
+
+    if filename.endswith(".pptx"):
+        yield from iter_pptx_slides(file_bytes, filename)
+    elif filename.endswith(".docx"):
+        yield from iter_docx_paragraphs(file_bytes, filename)
+    elif filename.endswith(".pdf"):
+        yield from iter_pdf_pages(file_bytes, filename)
+    elif filename.endswith(".txt"):
+        started = time.perf_counter()
+        text = file_bytes.decode("utf-8", errors="ignore").strip()
+        if text:
+            yield _unit(filename, "text", 1, text, started)
+    else:
+        raise UnsupportedFormat(f"不支持的文件格式: {filename}")
+
+
+def join_units(units) -> str:
+    """单元 → 整个文件的文本（DOCX 段落按行拼接，页 / 幻灯片之间空一行）"""
+    units = list(units)
+    if not units:
+        return NO_TEXT
+    sep = "\n" if units[0]["kind"] == "paragraph" else "\n\n"
+    return sep.join(unit["text"] for unit in units)
+
+
+def failure_text(filename, error) -> str:
+    """解析失败时放进结果里的占位文本（与旧版 extract_text_from_file 一致）"""
+    if isinstance(error, UnsupportedFormat):
+        return f"❌ 不支持的文件格式: {filename.lower()}"
+    return f"❌ 文件解析失败: {filename.lower()}"
+
+
+def extract_text_from_pptx_file(file_bytes, filename="unknown.pptx"):
+    """提取 PPTX 文本（OCR 暂时禁用）"""
+    return extract_text_from_file(file_bytes, filename)
+
+
+def extract_text_from_file(uploaded_file, filename=None):
+    """根据文件类型提取纯文本（iter_units 的阻塞版本：解析完整个文件后拼接返回）"""
+    filename = (filename or getattr(uploaded_file, "name", "unknown")).lower()
+    try:
+        log_event("file_parser", "INFO", "work", f"开始解析文件: {filename}")
+        units = list(iter_units(uploaded_file, filename))
+        result = join_units(units)
+        log_event("file_parser", "INFO", "work", f"文件解析完成: {filename}",
+                  meta={"units": len(units), "text_length": len(result)})
+        return result
+    except UnsupportedFormat as e:
+        log_event("file_parser", "WARNING", "warning", str(e))
+        return failure_text(filename, e)
     except Exception as e:
         log_event("file_parser", "ERROR", "down", f"文件解析失败: {filename}", remark=str(e))
-        return f"❌ 文件解析失败: {filename}"
+        return failure_text(filename, e)
 
 
 def preview_files(uploaded_files):
@@ -0,0 +1,265 @@
+# modules/job_queue.py
+# 基于 system.db 中 jobs 表的后台任务队列：提交 / 租约领取 / 心跳续租 / 失败重试
+# UI 只负责提交任务并轮询进度，解析与 LLM 调用在独立的 worker 进程中执行（scripts/job_worker.py）
+
+import json
+import os
+import sqlite3
+import time
+from config import JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, JOB_RETRY_BACKOFF_SECONDS, JOB_RETENTION_SECONDS
+from modules.db_schema import SYSTEM_TABLES
+from modules.logger import connect_with_retry
+from modules.utils.path_helper import SYSTEM_DB, JOBS_DIR
+
+# 早期版本的 jobs 表没有这些列，启动时补齐
+_JOB_COLUMNS = {
+    "payload": "TEXT",
+    "attempts": "INTEGER DEFAULT 0",
+    "max_attempts": "INTEGER DEFAULT 3",
+    "available_at": "REAL",
+    "lease_owner": "TEXT",
+    "lease_expires": "REAL",
+    "heartbeat_at": "REAL",
+    "updated_at": "REAL",
+}
+
+FINAL_STATUSES = ("success", "failed", "cancelled")
+
+
+def init_job_table():
+    """确保 jobs 表及队列所需的列、索引存在"""
+    conn = connect_with_retry(SYSTEM_DB)
+    try:
+        conn.executescript(SYSTEM_TABLES["jobs"])
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, ddl in _JOB_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {ddl}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(status, available_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_user_id ON jobs(user_id)")
+    finally:
+        conn.close()
+
+
+def _row_to_job(cursor, row) -> dict:
+    job = {col[0]: value for col, value in zip(cursor.description, row)}
+    for key in ("payload", "meta"):
+        try:
+            job[key] = json.loads(job[key]) if job.get(key) else {}
+        except ValueError:
+            job[key] = {}
+    return job
+
+
+def submit(task_name: str, payload: dict, user_id=None, request_id=None, max_attempts: int = None) -> int:
+    """提交任务，返回 job_id"""
+    now = time.time()
+    conn = connect_with_retry(SYSTEM_DB)
+    try:
+        cur = conn.execute("""
+            INSERT INTO jobs (task_name, status, user_id, request_id, progress, payload, meta,
+                              attempts, max_attempts, available_at, updated_at)
+            VALUES (?, 'pending', ?, ?, 0, ?, '{}', 0, ?, ?, ?)
+        """, (task_name, user_id, request_id, json.dumps(payload, ensure_ascii=False),
+              max_attempts or JOB_MAX_ATTEMPTS, now, now))
+        return cur.lastrowid
+    finally:
+        conn.close()
+
+
+def lease(worker_id: str, task_names=None, lease_seconds: float = None):
+    """
+    领取一个可执行的任务（pending 且到了可执行时间，或 running 但租约已过期），返回 job dict 或 None。
+    BEGIN IMMEDIATE 保证多个 worker 进程不会领到同一个任务。
+    """
+    lease_seconds = lease_seconds or JOB_LEASE_SECONDS
+    now = time.time()
+    conn = connect_with_retry(SYSTEM_DB)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        # 租约过期且已用完重试次数的任务直接判失败（worker 崩溃导致）
+        conn.execute("""
+            UPDATE jobs SET status = 'failed', error_message = 'lease expired after max attempts',
+                            lease_owner = NULL, updated_at = ?
+            WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts
+        """, (now, now))
+
+        sql = """
+            SELECT id FROM jobs
+            WHERE ((status = 'pending' AND COALESCE(available_at, 0) <= ?)
+                   OR (status = 'running' AND lease_expires < ?))
+        """
+        params = [now, now]
+        if task_names:
+            sql += f" AND task_name IN ({','.join('?' * len(task_names))})"
+            params.extend(task_names)
+        sql += " ORDER BY COALESCE(available_at, 0), id LIMIT 1"
+        row = conn.execute(sql, params).fetchone()
+        if not row:
+            conn.execute("COMMIT")
+            return None
+
+        conn.execute("""
+            UPDATE jobs SET status = 'running', lease_owner = ?, lease_expires = ?, heartbeat_at = ?,
+                            attempts = COALESCE(attempts, 0) + 1, updated_at = ?
+            WHERE id = ?
+        """, (worker_id, now + lease_seconds, now, now, row[0]))
+        cur = conn.execute("SELECT * FROM jobs WHERE id = ?", (row[0],))
+        job = _row_to_job(cur, cur.fetchone())
+        conn.execute("COMMIT")
+        return job
+    except sqlite3.OperationalError:
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            pass
+        raise
+    finally:
+        conn.close()
+
+
+def heartbeat(job_id: int, worker_id: str, progress: int = None, message: str = None,
+              lease_seconds: float = None) -> bool:
+    """续租并更新进度；租约已被其他 worker 接管时返回 False（当前 worker 应放弃该任务）"""
+    lease_seconds = lease_seconds or JOB_LEASE_SECONDS
+    now = time.time()
+    conn = connect_with_retry(SYSTEM_DB)
+    try:
+        sets = ["lease_expires = ?", "heartbeat_at = ?", "updated_at = ?"]
+        params = [now + lease_seconds, now, now]
+        if progress is not None:
+            sets.append("progress = ?")
+            params.append(max(0, min(100, int(progress))))
+        if message is not None:
+            sets.append("meta = json_set(COALESCE(meta, '{}'), '$.message', ?)")
+            params.append(message)
+        params += [job_id, worker_id]
+        cur = conn.execute(
+            f"UPDATE jobs SET {', '.join(sets)} WHERE id = ? AND lease_owner = ? AND status = 'running'",
+            params,
+        )
+        return cur.rowcount == 1
+    finally:
+        conn.close()
+
+
+def complete(job_id: int, worker_id: str, result_path: str = None, meta: dict = None) -> bool:
+    now = time.time()
+    conn = connect_with_retry(SYSTEM_DB)
+    try:
+        cur = conn.execute("""
+            UPDATE jobs SET status = 'success', progress = 100, result_path = ?, error_message = NULL,
+                            meta = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?
+            WHERE id = ? AND lease_owner = ?
+        """, (result_path, json.dumps(meta or {}, ensure_ascii=False), now, job_id, worker_id))
+        return cur.rowcount == 1
+    finally:
+        conn.close()
+
+
+def fail(job_id: int, worker_id: str, error: str, retryable: bool = True) -> str:
+    """记录失败：还有重试次数时按退避重新排队（返回 'pending'），否则标记为 'failed'"""
+    now = time.time()
+    conn = connect_with_retry(SYSTEM_DB)
+    try:
+        row = conn.execute(
+            "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND lease_owner = ?", (job_id, worker_id)
+        ).fetchone()
+        if not row:
+            return "lost"
+        attempts, max_attempts = row[0] or 0, row[1] or JOB_MAX_ATTEMPTS
+        if retryable and attempts < max_attempts:
+            status, available_at = "pending", now + JOB_RETRY_BACKOFF_SECONDS * (2 ** (attempts - 1))
+        else:
+            status, available_at = "failed", None
+        conn.execute("""
+            UPDATE jobs SET status = ?, error_message = ?, available_at = COALESCE(?, available_at),
+                            lease_owner = NULL, lease_expires = NULL, updated_at = ?
+            WHERE id = ?
+        """, (status, str(error)[:2000], available_at, now, job_id))
+        return status
+    finally:
+        conn.close()
+
+
+def cancel(job_id: int) -> bool:
+    """取消尚未完成的任务（运行中的任务会在下一次心跳时发现租约失效）"""
+    conn = connect_with_retry(SYSTEM_DB)
+    try:
+        cur = conn.execute("""
+            UPDATE jobs SET status = 'cancelled', lease_owner = NULL, updated_at = ?
+            WHERE id = ? AND status IN ('pending', 'running')
+        """, (time.time(), job_id))
+        return cur.rowcount == 1
+    finally:
+        conn.close()
+
+
+def get(job_id: int):
+    conn = connect_with_retry(SYSTEM_DB)
+    try:
+        cur = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        row = cur.fetchone()
+        return _row_to_job(cur, row) if row else None
+    finally:
+        conn.close()
+
+
+def list_jobs(user_id=None, limit: int = 20):
+    conn = connect_with_retry(SYSTEM_DB)
+    try:
+        if user_id is None:
+            cur = conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+        else:
+            cur = conn.execute("SELECT * FROM jobs WHERE user_id = ? ORDER BY id DESC LIMIT ?", (user_id, limit))
+        return [_row_to_job(cur, row) for row in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+def _job_files(job) -> set:
+    """任务涉及的、位于 JOBS_DIR 内的输入 / 结果文件（目录外的路径不碰）"""
+    payload = job.get("payload") or {}
+    paths = [job.get("result_path"), payload.get("texts_path"), payload.get("text_path")]
+    paths += [item.get("path") for item in payload.get("files") or [] if isinstance(item, dict)]
+    root = os.path.realpath(JOBS_DIR)
+    found = set()
+    for path in paths:
+        if isinstance(path, str) and path:
+            real = os.path.realpath(path)
+            if os.path.commonpath([root, real]) == root and real != root:
+                found.add(real)
+    return found
+
+
+def purge_finished(retention_seconds: float = None) -> int:
+    """删除结束超过保留时长的任务行及其在 JOBS_DIR 中的输入 / 结果文件，返回删除的任务数"""
+    retention_seconds = JOB_RETENTION_SECONDS if retention_seconds is None else retention_seconds
+    if not retention_seconds:
+        return 0
+    placeholders = ",".join("?" * len(FINAL_STATUSES))
+    conn = connect_with_retry(SYSTEM_DB)
+    try:
+        cur = conn.execute(
+            f"SELECT * FROM jobs WHERE status IN ({placeholders}) AND COALESCE(updated_at, 0) < ?",
+            (*FINAL_STATUSES, time.time() - retention_seconds),
+        )
+        jobs = [_row_to_job(cur, row) for row in cur.fetchall()]
+        for job in jobs:
+            for path in _job_files(job):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+        if jobs:
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(job["id"],) for job in jobs])
+        return len(jobs)
+    finally:
+        conn.close()
+
+
+# ✅ 启动时确保表结构就绪，并清理过期任务
+init_job_table()
+purge_finished()
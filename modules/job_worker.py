@@ -0,0 +1,207 @@
+# modules/job_worker.py
+# 后台任务执行器：从 job_queue 领取任务，按 task_name 分派给处理函数，运行期间后台线程定时心跳续租
+# 处理函数只负责业务，失败重试 / 租约 / 进度写库都在这里统一处理
+
+import json
+import os
+import threading
+import time
+import traceback
+from config import JOB_LEASE_SECONDS, OPENAI_API_KEY
+from modules import job_queue
+from modules.logger import log_event
+from modules.utils.path_helper import JOBS_DIR
+
+# worker 主循环每隔多久清理一次过期任务及其文件
+PURGE_INTERVAL_SECONDS = 3600
+
+# task_name → handler(ctx, payload) -> (result_path, meta)
+HANDLERS = {}
+
+
+def register(task_name):
+    def decorator(func):
+        HANDLERS[task_name] = func
+        return func
+    return decorator
+
+
+class LeaseLost(Exception):
+    """租约已被取消或被其他 worker 接管，当前 worker 应立即放弃"""
+
+
+class JobContext:
+    """传给处理函数的任务上下文：上报进度，并在租约失效时中断任务"""
+
+    def __init__(self, job, worker_id):
+        self.job = job
+        self.job_id = job["id"]
+        self.worker_id = worker_id
+        self.lost = threading.Event()
+
+    def progress(self, percent, message=None):
+        if self.lost.is_set() or not job_queue.heartbeat(self.job_id, self.worker_id, percent, message):
+            self.lost.set()
+            raise LeaseLost(f"job {self.job_id} lease lost")
+
+    def output_path(self, suffix):
+        return os.path.join(JOBS_DIR, f"job_{self.job_id}{suffix}")
+
+
+def _heartbeat_loop(ctx, stop, interval):
+    """处理函数长时间没有上报进度时（例如等待单个 LLM 调用），仍保持租约不过期"""
+    while not stop.wait(interval):
+        if not job_queue.heartbeat(ctx.job_id, ctx.worker_id):
+            ctx.lost.set()
+            return
+
+
+def run_job(job, worker_id):
+    """执行单个已领取的任务，返回最终状态"""
+    handler = HANDLERS.get(job["task_name"])
+    if handler is None:
+        return job_queue.fail(job["id"], worker_id, f"未知任务类型: {job['task_name']}", retryable=False)
+
+    ctx = JobContext(job, worker_id)
+    stop = threading.Event()
+    beater = threading.Thread(target=_heartbeat_loop, args=(ctx, stop, JOB_LEASE_SECONDS / 3), daemon=True)
+    beater.start()
+    start = time.time()
+    log_event("job_worker", "INFO", "work", "job_start",
+              remark=f"{job['task_name']} #{job['id']} attempt {job.get('attempts')}",
+              meta={"job_id": job["id"], "worker_id": worker_id})
+    try:
+        result_path, meta = handler(ctx, job.get("payload") or {})
+        if ctx.lost.is_set():
+            raise LeaseLost(f"job {job['id']} lease lost")
+        meta = dict(meta or {}, seconds=round(time.time() - start, 3))
+        job_queue.complete(job["id"], worker_id, result_path, meta)
+        log_event("job_worker", "INFO", "success", "job_success",
+                  remark=f"{job['task_name']} #{job['id']}", meta={"job_id": job["id"], **meta})
+        return "success"
+    except LeaseLost as e:
+        log_event("job_worker", "WARNING", "warning", "job_lease_lost", remark=str(e), meta={"job_id": job["id"]})
+        return "lost"
+    except Exception as e:
+        # ValueError 视为输入问题，重试也不会成功
+        status = job_queue.fail(job["id"], worker_id, f"{type(e).__name__}: {e}",
+                                retryable=not isinstance(e, ValueError))
+        log_event("job_worker", "ERROR", "down", "job_failed",
+                  remark=f"{job['task_name']} #{job['id']} → {status}: {e}",
+                  meta={"job_id": job["id"], "traceback": traceback.format_exc()[-2000:]})
+        return status
+    finally:
+        stop.set()
+
+
+def run_worker(worker_id, task_names=None, poll_interval=1.0, stop_event=None):
+    """worker 主循环：领取 → 执行 → 再领取；没有任务时按 poll_interval 轮询"""
+    stop_event = stop_event or threading.Event()
+    log_event("job_worker", "INFO", "info", "worker_start", remark=worker_id,
+              meta={"tasks": task_names or sorted(HANDLERS)})
+    next_purge = time.time() + PURGE_INTERVAL_SECONDS
+    while not stop_event.is_set():
+        if time.time() >= next_purge:
+            next_purge = time.time() + PURGE_INTERVAL_SECONDS
+            try:
+                purged = job_queue.purge_finished()
+                if purged:
+                    log_event("job_worker", "INFO", "info", "jobs_purged", remark=f"{purged} jobs", meta={"worker_id": worker_id})
+            except Exception as e:
+                log_event("job_worker", "WARNING", "warning", "jobs_purge_failed", remark=str(e))
+        try:
+            job = job_queue.lease(worker_id, task_names or sorted(HANDLERS))
+        except Exception as e:
+            log_event("job_worker", "WARNING", "warning", "lease_failed", remark=str(e))
+            job = None
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+        run_job(job, worker_id)
+    log_event("job_worker", "INFO", "down", "worker_stop", remark=worker_id)
+
+
+# ================== 任务处理函数 ==================
+@register("parse_files")
+def handle_parse_files(ctx, payload):
+    """payload: {"files": [{"name", "path"}]} → 解析结果 JSON（list[str]，与上传顺序一致）"""
+    from modules import parse_engine
+
+    files = payload.get("files") or []
+    if not files:
+        raise ValueError("parse_files 需要 files 列表")
+    inputs = []
+    for item in files:
+        with open(item["path"], "rb") as f:
+            inputs.append((item["name"], f.read()))
+    texts, stats = parse_engine.parse_files(
+        inputs, on_progress=lambda done, total: ctx.progress(int(done / total * 100), f"已解析 {done}/{total}")
+    )
+
+    result_path = ctx.output_path(".json")
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(texts, f, ensure_ascii=False)
+    return result_path, {"files": len(files), "chars": sum(len(t) for t in texts), "parse": stats}
+
+
+@register("generate_notes")
+def handle_generate_notes(ctx, payload):
+    """
+    payload: {"texts_path" 或 "files": [{"name", "path"}], "user_id", "settings": extract_summary_stream 的参数} → Markdown 笔记
+    传 files 时不经过单独的解析任务，边解析边抽取
+    """
+    from modules import extractor
+
+    texts, files = None, None
+    if payload.get("files"):
+        files = []
+        for item in payload["files"]:
+            with open(item["path"], "rb") as f:
+                files.append((item["name"], f.read()))
+    else:
+        texts_path = payload.get("texts_path")
+        if not texts_path or not os.path.exists(texts_path):
+            raise ValueError(f"找不到输入文件: {texts_path}")
+        with open(texts_path, encoding="utf-8") as f:
+            texts = json.load(f)
+
+    ctx.progress(5, "开始分块抽取")
+    result = {}
+    for _ in extractor.extract_summary_stream(
+        texts,
+        files=files,
+        api_key=OPENAI_API_KEY,
+        user_id=payload.get("user_id"),
+        result=result,
+        on_progress=lambda stage, percent: ctx.progress(percent, stage),
+        **(payload.get("settings") or {}),
+    ):
+        if ctx.lost.is_set():
+            raise LeaseLost(f"job {ctx.job_id} lease lost")
+
+    result_path = ctx.output_path(".md")
+    with open(result_path, "w", encoding="utf-8") as f:
+        f.write(result["text"])
+    return result_path, {
+        "run_id": result.get("run_id"),
+        "note_id": result.get("note_id"),
+        "resumed_from": result.get("resumed_from"),
+        "memo_hit": result.get("memo_hit", False),
+        "stats": result.get("stats"),
+    }
+
+
+@register("export_pdf")
+def handle_export_pdf(ctx, payload):
+    """payload: {"text" 或 "text_path", "filename"} → PDF 路径（JOBS_DIR/job_<id>.pdf，下载名在 meta["filename"]）"""
+    from modules.pdf_export import save_to_pdf, safe_filename, clean_filename
+
+    text = payload.get("text")
+    if text is None and payload.get("text_path"):
+        with open(payload["text_path"], encoding="utf-8") as f:
+            text = f.read()
+    if not text or not text.strip():
+        raise ValueError("export_pdf 需要非空的 text")
+    filename = clean_filename(payload.get("filename") or safe_filename(text))
+    pdf_path = save_to_pdf(text, filename, pdf_path=ctx.output_path(".pdf"))
+    return pdf_path, {"bytes": os.path.getsize(pdf_path), "filename": filename}
@@ -0,0 +1,116 @@
+# modules/lang_detect.py
+# 语言检测：每个文档只抽样固定数量的窗口投票，结果按 文档长度 + 抽样窗口哈希 缓存
+# langdetect 在长文本上又慢又不稳定（内部随机采样）；中文窗口直接按字符比例判定，不走 langdetect
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from langdetect import DetectorFactory, detect
+from modules.chunker import UNIT_LABEL_RE
+
+DetectorFactory.seed = 0   # 固定 langdetect 的随机种子，同一输入结果稳定
+
+SAMPLE_WINDOWS = 8         # 每个文档最多抽样的窗口数
+WINDOW_CHARS = 400         # 每个窗口的字符数
+RAW_WINDOW_FACTOR = 2      # 清洗前每个窗口从原文多取的倍数
+CJK_RATIO_ZH = 0.6         # 汉字占字母类字符的比例 ≥ 该值直接判为中文
+CJK_RATIO_LATIN = 0.1      # ≤ 该值时交给 langdetect 判断具体的拉丁语种
+CACHE_SIZE = 1024
+
+_CJK_RE = re.compile(r"[一-鿿㐀-䶿]")
+_KANA_RE = re.compile(r"[぀-ヿ]")
+_LATIN_RE = re.compile(r"[A-Za-zÀ-ɏ]")
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _raw_windows(text: str):
+    """在原文中均匀切出 SAMPLE_WINDOWS 段（每段多取一些，留给清洗掉的标签 / 空白）；短文本整段返回。只按长度定位，不扫描全文"""
+    raw_chars = WINDOW_CHARS * RAW_WINDOW_FACTOR
+    if len(text) <= raw_chars * SAMPLE_WINDOWS:
+        return [text]
+    step = (len(text) - raw_chars) / (SAMPLE_WINDOWS - 1)
+    return [text[int(i * step):int(i * step) + raw_chars] for i in range(SAMPLE_WINDOWS)]
+
+
+def _clean(raw: str) -> str:
+    raw = UNIT_LABEL_RE.sub("", raw)
+    return re.sub(r"\s+", " ", raw).strip()
+
+
+def _sample_windows(raws):
+    """原文片段 → 清洗后的检测窗口（短文本按 WINDOW_CHARS 切分，长文本每段取一个窗口）"""
+    if len(raws) == 1:
+        text = _clean(raws[0])
+        return [text[i:i + WINDOW_CHARS] for i in range(0, len(text), WINDOW_CHARS)][:SAMPLE_WINDOWS] or [""]
+    return [_clean(raw)[:WINDOW_CHARS] for raw in raws]
+
+
+def _window_language(window: str):
+    """返回 (语言代码, 权重)；权重为窗口内的字母类字符数，空白 / 纯符号窗口不参与投票"""
+    cjk = len(_CJK_RE.findall(window))
+    kana = len(_KANA_RE.findall(window))
+    latin = len(_LATIN_RE.findall(window))
+    weight = cjk + kana + latin
+    if not weight:
+        return None, 0
+    if kana == 0 and cjk / weight >= CJK_RATIO_ZH:
+        return "zh", weight
+    try:
+        lang = detect(window)
+    except Exception:
+        return ("zh" if cjk > latin else "en"), weight
+    return ("zh" if lang.startswith("zh") else lang), weight
+
+
+def _detect_uncached(raws) -> str:
+    votes = {}
+    for window in _sample_windows(raws):
+        lang, weight = _window_language(window)
+        if lang:
+            votes[lang] = votes.get(lang, 0) + weight
+    if not votes:
+        return "en"
+    return max(votes.items(), key=lambda kv: kv[1])[0]
+
+
+def detect_language_code(text: str) -> str:
+    """
+    文档主语言的 ISO 代码（中文统一为 "zh"，其余沿用 langdetect 的代码，无法判断时为 "en"）。
+    只看抽样窗口：缓存键为 文本长度 + 抽样片段的哈希，长文档不做全文哈希 / 全文正则。
+    """
+    if not text or text.isspace():
+        return "en"
+    raws = _raw_windows(text)
+    digest = hashlib.sha1()
+    for raw in raws:
+        digest.update(raw.encode("utf-8", errors="ignore"))
+    key = f"{len(text)}:{digest.hexdigest()}"
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    lang = _detect_uncached(raws)
+    with _cache_lock:
+        _cache[key] = lang
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return lang
+
+
+def detect_languages(texts):
+    """
+    按文件分别检测，再按粗略 token 数加权得到整体主语言
+    （中文约 1 字 / token，其余约 4 字符 / token；不再扫描全文）。
+    返回 (主语言代码, [每个文件的语言代码])
+    """
+    per_file = [detect_language_code(text) for text in texts]
+    weights = {}
+    for text, lang in zip(texts, per_file):
+        chars = len(text or "")
+        weights[lang] = weights.get(lang, 0) + (chars if lang == "zh" else chars / 4)
+    main = max(weights.items(), key=lambda kv: kv[1])[0] if weights else "en"
+    return main, per_file
@@ -0,0 +1,275 @@
+# modules/llm_cache.py
+# LLM 响应缓存（内容寻址：hash(model, messages, max_tokens, temperature[, 非官方端点]) → 响应文本）
+# 存储在 database/cache.db，支持 TTL 过期 + 按总大小的 LRU 淘汰
+
+import hashlib
+import json
+import threading
+import time
+from config import LLM_CACHE_ENABLED, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_MB
+from modules.logger import connect_with_retry, log_event
+from modules.llm_call import create_completion
+from modules.utils.path_helper import CACHE_DB
+
+# 每写入多少条触发一次淘汰检查（避免每次写入都扫表）
+EVICT_EVERY_N_PUTS = 50
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "puts": 0, "evicted": 0}
+
+
+def init_cache_table():
+    """确保 llm_cache 表存在"""
+    conn = connect_with_retry(CACHE_DB)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            cache_key TEXT PRIMARY KEY,
+            model TEXT,
+            content TEXT,
+            usage TEXT,
+            size_bytes INTEGER,
+            hits INTEGER DEFAULT 0,
+            created_at REAL,
+            last_access REAL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access);")
+    conn.close()
+
+
+def endpoint_of(client):
+    """客户端指向的非官方端点（假服务 / 代理 / 兼容厂商）；官方端点返回 None，保持旧 key 不变"""
+    base_url = str(getattr(client, "base_url", "") or "")
+    if not base_url or "api.openai.com" in base_url:
+        return None
+    return base_url.rstrip("/")
+
+
+def make_key(model, messages, max_tokens=None, temperature=None, base_url=None) -> str:
+    """对请求参数做规范化 JSON 后取 sha256；非官方端点的结果单独成 key，不会混进真实调用的缓存"""
+    request = {"model": model, "messages": messages, "max_tokens": max_tokens, "temperature": temperature}
+    if base_url:
+        request["base_url"] = base_url
+    payload = json.dumps(
+        request,
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get(cache_key: str):
+    """读取缓存，命中返回 {"content", "usage"}，过期或不存在返回 None"""
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        row = conn.execute(
+            "SELECT content, usage, created_at FROM llm_cache WHERE cache_key = ?",
+            (cache_key,),
+        ).fetchone()
+        if not row:
+            return None
+
+        now = time.time()
+        if LLM_CACHE_TTL_SECONDS and now - row[2] > LLM_CACHE_TTL_SECONDS:
+            conn.execute("DELETE FROM llm_cache WHERE cache_key = ?", (cache_key,))
+            return None
+
+        conn.execute(
+            "UPDATE llm_cache SET hits = hits + 1, last_access = ? WHERE cache_key = ?",
+            (now, cache_key),
+        )
+        return {"content": row[0], "usage": json.loads(row[1]) if row[1] else None}
+    finally:
+        conn.close()
+
+
+def put(cache_key: str, model: str, content: str, usage: dict = None):
+    """写入缓存（同 key 覆盖）"""
+    now = time.time()
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        conn.execute("""
+            INSERT OR REPLACE INTO llm_cache (
+                cache_key, model, content, usage, size_bytes, hits, created_at, last_access
+            ) VALUES (?, ?, ?, ?, ?, 0, ?, ?)
+        """, (
+            cache_key,
+            model,
+            content,
+            json.dumps(usage) if usage else None,
+            len(content.encode("utf-8")),
+            now,
+            now,
+        ))
+    finally:
+        conn.close()
+
+    with _lock:
+        _stats["puts"] += 1
+        should_evict = _stats["puts"] % EVICT_EVERY_N_PUTS == 0
+    if should_evict:
+        evict()
+
+
+def evict():
+    """先删除过期条目，再按 last_access 从旧到新删除，直到总大小低于上限"""
+    removed = 0
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        if LLM_CACHE_TTL_SECONDS:
+            cur = conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?",
+                (time.time() - LLM_CACHE_TTL_SECONDS,),
+            )
+            removed += cur.rowcount
+
+        max_bytes = LLM_CACHE_MAX_MB * 1024 * 1024
+        total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM llm_cache").fetchone()[0]
+        if total > max_bytes:
+            rows = conn.execute(
+                "SELECT cache_key, size_bytes FROM llm_cache ORDER BY last_access ASC"
+            ).fetchall()
+            victims = []
+            for key, size in rows:
+                if total <= max_bytes:
+                    break
+                victims.append((key,))
+                total -= size or 0
+            conn.executemany("DELETE FROM llm_cache WHERE cache_key = ?", victims)
+            removed += len(victims)
+    finally:
+        conn.close()
+
+    with _lock:
+        _stats["evicted"] += removed
+    return removed
+
+
+def usage_of(resp):
+    """把 response.usage 统一成 dict（没有 usage 时返回 None）"""
+    usage = getattr(resp, "usage", None)
+    if not usage:
+        return None
+    p = int(getattr(usage, "prompt_tokens", 0) or 0)
+    c = int(getattr(usage, "completion_tokens", 0) or 0)
+    t = int(getattr(usage, "total_tokens", 0) or (p + c))
+    return {"prompt_tokens": p, "completion_tokens": c, "total_tokens": t}
+
+
+def _lookup(cache_key: str):
+    """读缓存并更新命中计数；读失败按未命中处理"""
+    try:
+        cached = get(cache_key)
+    except Exception as e:
+        cached = None
+        print(f"[LLM CACHE] 读取失败: {e}")
+    with _lock:
+        _stats["hits" if cached is not None else "misses"] += 1
+    return cached
+
+
+def _store(cache_key: str, model: str, content: str, usage: dict):
+    # 空结果不缓存，避免把一次异常回复固化下来
+    if not content.strip():
+        return
+    try:
+        put(cache_key, model, content, usage)
+    except Exception as e:
+        print(f"[LLM CACHE] 写入失败: {e}")
+
+
+def _request_kwargs(model, messages, max_tokens, temperature):
+    kwargs = {"model": model, "messages": messages}
+    if max_tokens is not None:
+        kwargs["max_tokens"] = max_tokens
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    return kwargs
+
+
+def cached_completion(client, model, messages, max_tokens=None, temperature=None, use_cache=True):
+    """
+    带缓存的 chat.completions 调用。
+    返回 (content, usage, hit)：命中时 usage 为 None（没有产生新的 token 消耗）。
+    """
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    cache_key = make_key(model, messages, max_tokens, temperature, endpoint_of(client)) if use_cache else None
+
+    if use_cache:
+        cached = _lookup(cache_key)
+        if cached is not None:
+            return cached["content"], None, True
+
+    resp = create_completion(client, **_request_kwargs(model, messages, max_tokens, temperature))
+    content = resp.choices[0].message.content or ""
+    usage = usage_of(resp)
+
+    if use_cache:
+        _store(cache_key, model, content, usage)
+    return content, usage, False
+
+
+def stream_completion(client, model, messages, max_tokens=None, temperature=None, use_cache=True, result=None):
+    """
+    流式版本的 cached_completion：逐段 yield 文本增量（可直接交给 st.write_stream）。
+    结束后在 result 中写入 {"content", "usage", "hit", "ttft"}，ttft 为首个增量到达的秒数。
+    缓存命中时一次性 yield 全文。
+    """
+    result = result if result is not None else {}
+    start = time.time()
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    cache_key = make_key(model, messages, max_tokens, temperature, endpoint_of(client)) if use_cache else None
+
+    if use_cache:
+        cached = _lookup(cache_key)
+        if cached is not None:
+            result.update(content=cached["content"], usage=None, hit=True, ttft=time.time() - start)
+            yield cached["content"]
+            return
+
+    kwargs = _request_kwargs(model, messages, max_tokens, temperature)
+    kwargs.update(stream=True, stream_options={"include_usage": True})
+
+    parts, usage, ttft = [], None, None
+    for event in create_completion(client, **kwargs):
+        # include_usage 时最后一个事件只带 usage，choices 为空
+        if getattr(event, "usage", None):
+            usage = usage_of(event)
+        if not event.choices:
+            continue
+        delta = event.choices[0].delta.content
+        if delta:
+            if ttft is None:
+                ttft = time.time() - start
+            parts.append(delta)
+            yield delta
+
+    content = "".join(parts)
+    if use_cache:
+        _store(cache_key, model, content, usage)
+    result.update(content=content, usage=usage, hit=False, ttft=ttft)
+
+
+def cache_stats() -> dict:
+    """进程内累计的命中 / 未命中 / 淘汰计数"""
+    with _lock:
+        return dict(_stats)
+
+
+def log_cache_stats(source_module: str, hits: int, misses: int, request_id: str = None):
+    """把一次请求的缓存命中情况写入日志"""
+    log_event(
+        source_module=source_module,
+        level="INFO",
+        status="info",
+        things="llm_cache_stats",
+        remark=f"cache hits={hits}, misses={misses}",
+        request_id=request_id,
+        meta={"hits": hits, "misses": misses, "process_totals": cache_stats()},
+    )
+
+
+# ✅ 启动时初始化
+init_cache_table()
@@ -0,0 +1,262 @@
+# modules/llm_call.py
+# 统一的 LLM 调用层：指数退避重试（带抖动、遵守 Retry-After）+ 按模型熔断 + AIMD 自适应并发
+# 所有 chat.completions 请求都应经过 create_completion()
+
+import email.utils
+import random
+import threading
+import time
+import openai
+from config import (
+    LLM_PROCESS_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_COOLDOWN_SECONDS,
+)
+from modules.logger import log_event
+from modules.utils.system_status import update_module_status
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器打开期间直接拒绝请求"""
+
+
+# ================== AIMD 自适应并发 ==================
+class AIMDLimiter:
+    """
+    进程级并发上限：成功时加性增长（约每 limit 次成功 +1），
+    遇到限流时乘性减半；上限为 LLM_PROCESS_CONCURRENCY。
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def on_throttle(self):
+        with self._cond:
+            self.limit = max(self.min_limit, self.limit / 2)
+
+
+limiter = AIMDLimiter(LLM_PROCESS_CONCURRENCY)
+
+
+# ================== 熔断器 ==================
+class CircuitBreaker:
+    """closed → (连续失败达到阈值) → open → (冷却结束) → half_open → 试探成功 closed / 失败 open"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open":
+                if time.time() - self.opened_at < BREAKER_COOLDOWN_SECONDS:
+                    raise CircuitOpenError(f"模型 {self.model} 熔断中，请稍后重试")
+                self._transition("half_open")
+            if self.state == "half_open":
+                # 半开状态只放行一个试探请求
+                if self.probing:
+                    raise CircuitOpenError(f"模型 {self.model} 正在恢复，请稍后重试")
+                self.probing = True
+
+    def on_success(self):
+        with self._lock:
+            self.failures = 0
+            self.probing = False
+            if self.state != "closed":
+                self._transition("closed")
+
+    def on_neutral(self):
+        """请求结束但不代表服务健康与否（如参数错误）：只释放试探名额"""
+        with self._lock:
+            self.probing = False
+
+    def on_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.probing = False
+            if self.state == "half_open" or self.failures >= BREAKER_FAILURE_THRESHOLD:
+                self.opened_at = time.time()
+                if self.state != "open":
+                    self._transition("open")
+
+    def _transition(self, new_state: str):
+        self.state = new_state
+        status = {"closed": "work", "half_open": "warning", "open": "down"}[new_state]
+        message = f"breaker={new_state}, failures={self.failures}, concurrency_limit={int(limiter.limit)}"
+        try:
+            update_module_status(f"llm:{self.model}", status, message, error_count=self.failures)
+        except Exception as e:
+            print(f"[LLM CALL] 状态上报失败: {e}")
+        log_event(
+            source_module="llm_call",
+            level="WARNING" if new_state != "closed" else "INFO",
+            status="warning" if new_state != "closed" else "info",
+            things="breaker_state",
+            remark=f"{self.model}: {message}",
+            meta={"model": self.model, "state": new_state, "failures": self.failures},
+        )
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if model not in _breakers:
+            _breakers[model] = CircuitBreaker(model)
+        return _breakers[model]
+
+
+def breaker_states() -> dict:
+    """当前所有模型的熔断状态（管理面板 / 调试用）"""
+    with _breakers_lock:
+        return {m: {"state": b.state, "failures": b.failures} for m, b in _breakers.items()}
+
+
+# ================== 重试 ==================
+def _is_rate_limit(err) -> bool:
+    return isinstance(err, openai.RateLimitError) or getattr(err, "status_code", None) == 429
+
+
+def _is_retryable(err) -> bool:
+    if isinstance(err, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    status = getattr(err, "status_code", None)
+    return status in (408, 409, 429) or (status is not None and status >= 500)
+
+
+def is_model_error(err) -> bool:
+    """
+    该模型本身处理不了这个请求（如 400 参数 / 上下文超限、404 模型不可用），换一个模型可能成功。
+    限流、熔断、超时 / 5xx（已重试用尽）、鉴权错误都不算：换到更贵的模型只会在服务吃紧时加重负载
+    """
+    if isinstance(err, CircuitOpenError) or _is_retryable(err):
+        return False
+    status = getattr(err, "status_code", None)
+    return status is not None and 400 <= status < 500 and status not in (401, 403)
+
+
+def _retry_after_seconds(err):
+    """读取响应头里的 retry-after-ms / retry-after（秒数或 HTTP 日期）"""
+    response = getattr(err, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            parsed = email.utils.parsedate_to_datetime(value)
+            return max(0.0, parsed.timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def _backoff_seconds(attempt: int, err) -> float:
+    """full jitter 指数退避；服务端给了 Retry-After 时以它为下限"""
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+    retry_after = _retry_after_seconds(err)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, LLM_BACKOFF_MAX))
+    return delay
+
+
+def create_completion(client, **kwargs):
+    """
+    client.chat.completions.create 的包装：
+    - 熔断器打开时直接抛 CircuitOpenError
+    - 可重试错误（429 / 5xx / 超时 / 连接错误）按指数退避重试 LLM_MAX_RETRIES 次
+    - 每次尝试占用一个 AIMD 并发槽，退避等待期间不占槽
+    stream=True 时只对建立连接阶段重试，返回的流由调用方消费；
+    并发槽一直占到流读完或被关闭为止。
+    """
+    model = kwargs.get("model", "")
+    breaker = get_breaker(model)
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        breaker.before_call()
+        limiter.acquire()
+        try:
+            resp = client.chat.completions.create(**kwargs)
+        except Exception as e:
+            limiter.release()
+            if not _is_retryable(e):
+                # 4xx 参数错误等不是服务端故障，不计入熔断
+                breaker.on_neutral()
+                raise
+            if _is_rate_limit(e):
+                # 限流由 AIMD 降并发处理，不计入熔断
+                limiter.on_throttle()
+                breaker.on_neutral()
+            else:
+                breaker.on_failure()
+            if attempt >= LLM_MAX_RETRIES:
+                raise
+            delay = _backoff_seconds(attempt, e)
+            log_event(
+                source_module="llm_call",
+                level="WARNING",
+                status="warning",
+                things="llm_retry",
+                remark=f"{model} attempt {attempt + 1} failed: {e}; retry in {delay:.1f}s",
+                meta={"model": model, "attempt": attempt + 1, "delay": round(delay, 2),
+                      "status_code": getattr(e, "status_code", None)},
+            )
+            time.sleep(delay)
+            continue
+
+        breaker.on_success()
+        if kwargs.get("stream"):
+            return _held_stream(resp)
+        limiter.release()
+        limiter.on_success()
+        return resp
+
+
+def _held_stream(resp):
+    """流式响应：生成数据期间仍占着并发槽，读完 / 中途出错 / 被关闭时才归还"""
+    completed = False
+    try:
+        for event in resp:
+            yield event
+        completed = True
+    finally:
+        close = getattr(resp, "close", None)
+        if not completed and close:
+            close()
+        limiter.release()
+        if completed:
+            limiter.on_success()
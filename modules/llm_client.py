@@ -0,0 +1,150 @@
+# modules/llm_client.py
+# 进程级 LLM 客户端注册表：按 (provider, api_key, base_url) 复用同一个客户端和 httpx 连接池
+# 保持长连接（装了 h2 时启用 HTTP/2），避免每次请求都重新做 TCP + TLS 握手；
+# 同时统计连接复用率与握手耗时，供管理面板 / 基准测试查看
+
+import threading
+import time
+import httpx
+from openai import OpenAI
+from config import (
+    OPENAI_BASE_URL,
+    LLM_HTTP_MAX_CONNECTIONS,
+    LLM_HTTP_KEEPALIVE_CONNECTIONS,
+    LLM_HTTP_KEEPALIVE_EXPIRY,
+    LLM_HTTP_TIMEOUT,
+    LLM_HTTP2_ENABLED,
+)
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class ConnectionStats:
+    """按客户端累计：请求数、新建连接数、复用次数、TCP / TLS 握手耗时"""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.reused = 0
+        self.connect_seconds = 0.0
+        self.tls_seconds = 0.0
+        self.http_versions = {}
+        self._lock = threading.Lock()
+
+    def event_hooks(self):
+        return {"request": [self._on_request], "response": [self._on_response]}
+
+    def _on_request(self, request):
+        # httpcore 通过 trace 扩展回调连接事件；本次请求没触发 connect_tcp 即为复用
+        state = {"connected": False, "t": {}}
+
+        def trace(event_name, info):
+            now = time.perf_counter()
+            if event_name.endswith(".started"):
+                state["t"][event_name[:-len(".started")]] = now
+            elif event_name.endswith(".complete"):
+                name = event_name[:-len(".complete")]
+                started = state["t"].get(name)
+                if name == "connection.connect_tcp":
+                    state["connected"] = True
+                    state["connect"] = now - started if started else 0.0
+                elif name == "connection.start_tls":
+                    state["tls"] = now - started if started else 0.0
+
+        request.extensions["trace"] = trace
+        request.extensions["_conn_state"] = state
+
+    def _on_response(self, response):
+        state = response.request.extensions.get("_conn_state")
+        if state is None:
+            return
+        version = response.http_version
+        with self._lock:
+            self.requests += 1
+            if state["connected"]:
+                self.new_connections += 1
+                self.connect_seconds += state.get("connect", 0.0)
+                self.tls_seconds += state.get("tls", 0.0)
+            else:
+                self.reused += 1
+            self.http_versions[version] = self.http_versions.get(version, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            new = self.new_connections
+            return {
+                "requests": self.requests,
+                "new_connections": new,
+                "reused": self.reused,
+                "reuse_rate": round(self.reused / self.requests, 3) if self.requests else 0.0,
+                "avg_connect_ms": round(self.connect_seconds / new * 1000, 1) if new else 0.0,
+                "avg_tls_ms": round(self.tls_seconds / new * 1000, 1) if new else 0.0,
+                "http_versions": dict(self.http_versions),
+            }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _build_http_client(stats: ConnectionStats) -> httpx.Client:
+    return httpx.Client(
+        http2=LLM_HTTP2_ENABLED and HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(LLM_HTTP_TIMEOUT, connect=10.0),
+        event_hooks=stats.event_hooks(),
+    )
+
+
+def get_client(api_key: str, base_url: str = None, provider: str = "openai"):
+    """
+    返回共享的 OpenAI 兼容客户端（线程安全，可在工作线程中并发使用）。
+    base_url 默认取 config.OPENAI_BASE_URL；SDK 自带重试关闭，重试统一由 llm_call 处理。
+    """
+    if provider != "openai":
+        raise ValueError(f"不支持的 LLM provider: {provider}")
+
+    base_url = base_url or OPENAI_BASE_URL
+    key = (provider, api_key, base_url or "")
+    with _clients_lock:
+        entry = _clients.get(key)
+        if entry is None:
+            stats = ConnectionStats()
+            client = OpenAI(
+                api_key=api_key,
+                base_url=base_url or None,
+                max_retries=0,
+                http_client=_build_http_client(stats),
+            )
+            entry = _clients[key] = {"client": client, "stats": stats}
+        return entry["client"]
+
+
+def connection_stats() -> dict:
+    """所有客户端的连接统计（key 不含 api_key 明文）"""
+    with _clients_lock:
+        entries = list(_clients.items())
+    return {
+        f"{provider}:{base_url or 'default'}:{api_key[-4:] if api_key else '-'}": entry["stats"].snapshot()
+        for (provider, api_key, base_url), entry in entries
+    }
+
+
+def close_all():
+    """关闭所有连接池（脚本 / 测试退出时调用）"""
+    with _clients_lock:
+        entries = list(_clients.values())
+        _clients.clear()
+    for entry in entries:
+        try:
+            entry["client"].close()
+        except Exception as e:
+            print(f"[LLM CLIENT] 关闭客户端失败: {e}")
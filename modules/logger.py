@@ -130,21 +130,47 @@ def init_usage_table():
             prompt_tokens INTEGER,
             completion_tokens INTEGER,
             total_tokens INTEGER,
-            cost REAL
+            cost REAL,
+            stage TEXT
         )
     """)
+    # 旧表没有 stage 列（按流水线阶段区分 token 消耗，如 chunk / synthesis / mock_exam）
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(usage_records)")}
+    if "stage" not in columns:
+        cursor.execute("ALTER TABLE usage_records ADD COLUMN stage TEXT")
     conn.commit()
     conn.close()
 
 
-def calculate_cost(model, total_tokens):
-    """根据模型计算消耗成本"""
-    price_per_1k = {
-        "gpt-4o": 0.005,
-        "gpt-4-turbo": 0.01,
-        "gpt-3.5-turbo": 0.001
-    }
-    return round((total_tokens / 1000) * price_per_1k.get(model, 0.005), 6)
+# 官方标价（USD / 1K tokens）：(输入单价, 输出单价)；管理面板里设置的单价优先
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4.1-nano": (0.0001, 0.0004),
+    "gpt-4.1-mini": (0.0004, 0.0016),
+    "gpt-4.1": (0.002, 0.008),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4": (0.03, 0.06),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+DEFAULT_PRICE = MODEL_PRICES["gpt-4o"]   # 未知模型按 gpt-4o 估算
+
+
+def _listed_price(model: str):
+    """带日期后缀的模型名（gpt-4o-mini-2024-07-18）按最长前缀匹配"""
+    model = (model or "").lower()
+    matches = [name for name in MODEL_PRICES if model == name or model.startswith(name + "-")]
+    return MODEL_PRICES[max(matches, key=len)] if matches else DEFAULT_PRICE
+
+
+def calculate_cost(model, total_tokens, prompt_tokens=None, completion_tokens=None):
+    """根据模型计算消耗成本：输入 / 输出分别计价；不知道拆分时全部按输出单价估算（偏高）"""
+    prompt_price, completion_price = get_model_price(model)
+    if prompt_tokens is None and completion_tokens is None:
+        cost = total_tokens / 1000 * completion_price
+    else:
+        cost = (prompt_tokens or 0) / 1000 * prompt_price + (completion_tokens or 0) / 1000 * completion_price
+    return round(cost, 6)
 
 
 def log_token_usage(
@@ -156,11 +182,12 @@ def log_token_usage(
     model_name=None,
     cost_estimate=None,
     request_id=None,
-    remark=None
+    remark=None,
+    stage=None
 ):
-    """记录一次 token 消耗"""
+    """记录一次 token 消耗；stage 为产生消耗的流水线阶段（可为空）"""
     model = model or model_name
-    cost = cost_estimate or calculate_cost(model, total_tokens)
+    cost = cost_estimate or calculate_cost(model, total_tokens, prompt_tokens, completion_tokens)
 
     try:
         conn = connect_with_retry(DB_PATH)
@@ -169,8 +196,8 @@ def log_token_usage(
             INSERT INTO usage_records (
                 created_at, user_id, model,
                 prompt_tokens, completion_tokens,
-                total_tokens, cost
-            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                total_tokens, cost, stage
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             datetime.datetime.utcnow().isoformat(),
             user_id,
@@ -178,7 +205,8 @@ def log_token_usage(
             prompt_tokens,
             completion_tokens,
             total_tokens,
-            cost
+            cost,
+            stage
         ))
         conn.commit()
         conn.close()
@@ -196,7 +224,8 @@ def log_token_usage(
                 "completion_tokens": completion_tokens,
                 "total_tokens": total_tokens,
                 "cost": cost,
-                "request_id": request_id
+                "request_id": request_id,
+                "stage": stage
             }
         )
     except Exception as e:
@@ -222,41 +251,52 @@ def init_model_price_table():
             updated_at TEXT
         )
     """)
+    # 旧表只有一个单价：补上输入 / 输出分开的单价列
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(model_prices)")}
+    for column in ("prompt_price_per_1k", "completion_price_per_1k"):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE model_prices ADD COLUMN {column} REAL")
     conn.commit()
     conn.close()
 
 
-def get_model_price(model: str) -> float:
-    """读取模型单价"""
-    conn = connect_with_retry(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT price_per_1k FROM model_prices WHERE model = ?", (model,))
-    row = cursor.fetchone()
-    conn.close()
-
-    if row:
-        return row[0]
+def get_model_price(model: str):
+    """读取模型单价 → (输入单价, 输出单价)，USD / 1K tokens；表里没有时用 MODEL_PRICES"""
+    try:
+        conn = connect_with_retry(DB_PATH)
+        try:
+            row = conn.execute(
+                "SELECT prompt_price_per_1k, completion_price_per_1k, price_per_1k FROM model_prices WHERE model = ?",
+                (model,),
+            ).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        row = None
 
-    default_prices = {
-        "gpt-4o": 0.005,
-        "gpt-4-turbo": 0.01,
-        "gpt-3.5-turbo": 0.001
-    }
-    return default_prices.get(model.lower(), 0.005)
+    if row and row[0] is not None:
+        return row[0], row[1] if row[1] is not None else row[0]
+    if row and row[2] is not None:
+        # 只设置过旧的单一单价
+        return row[2], row[2]
+    return _listed_price(model)
 
 
-def set_model_price(model: str, price: float):
-    """更新或插入模型单价"""
+def set_model_price(model: str, prompt_price: float, completion_price: float = None):
+    """更新或插入模型单价（USD / 1K tokens）；只给一个单价时输入输出同价"""
+    completion_price = prompt_price if completion_price is None else completion_price
     conn = connect_with_retry(DB_PATH)
     cursor = conn.cursor()
     cursor.execute("""
-        INSERT INTO model_prices (model, price_per_1k, updated_at)
-        VALUES (?, ?, ?)
+        INSERT INTO model_prices (model, price_per_1k, prompt_price_per_1k, completion_price_per_1k, updated_at)
+        VALUES (?, ?, ?, ?, ?)
         ON CONFLICT(model)
         DO UPDATE SET
             price_per_1k = excluded.price_per_1k,
+            prompt_price_per_1k = excluded.prompt_price_per_1k,
+            completion_price_per_1k = excluded.completion_price_per_1k,
             updated_at = excluded.updated_at
-    """, (model, price, datetime.datetime.utcnow().isoformat()))
+    """, (model, completion_price, prompt_price, completion_price, datetime.datetime.utcnow().isoformat()))
     conn.commit()
     conn.close()
 
@@ -0,0 +1,166 @@
+# modules/model_router.py
+# 按阶段选模型：每个阶段一条模型级联（config.MODEL_ROUTES），先试便宜 / 快的模型，
+# 输出没通过该阶段的检查（accept）时才升级到下一个；每次调用的模型、耗时、token、费用汇总成路由统计，
+# 写进日志后可以按数据调整路由表
+
+import time
+from config import DEFAULT_MODEL, ESCALATION_MODEL, MODEL_ROUTES, OPENAI_BASE_URL
+from modules.llm_cache import cached_completion, stream_completion
+from modules.llm_call import is_model_error
+from modules.logger import calculate_cost, log_event
+
+STAGES = ("chunk", "reduce", "synthesis", "mock_exam", "translation", "edit")
+# 逐段显示在页面上的阶段：默认不级联，第一个 token 到达就能显示
+STREAMED_STAGES = ("synthesis", "edit")
+
+
+def models_for(stage: str):
+    """阶段 → 按顺序尝试的模型列表（去重）"""
+    default = [DEFAULT_MODEL] if stage in STREAMED_STAGES else [DEFAULT_MODEL, ESCALATION_MODEL]
+    models = MODEL_ROUTES.get(stage) or default
+    if isinstance(models, str):
+        models = [models]
+    return list(dict.fromkeys(m for m in models if m))
+
+
+def route_signature(stage: str) -> str:
+    """
+    用于缓存 key / run_id：路由变化后不复用旧路由产生的中间结果。
+    指向非官方端点（如压测用的 fake_llm_server）时带上端点，片段 / 翻译 / 修改结果不会与真实调用共用
+    """
+    signature = "+".join(models_for(stage))
+    return f"{signature}@{OPENAI_BASE_URL.rstrip('/')}" if OPENAI_BASE_URL else signature
+
+
+def complete(client, stage, messages, max_tokens=None, accept=None, temperature=0.0, use_cache=True):
+    """
+    沿级联依次调用，直到 accept(content) 为真（accept 为空时第一个模型即接受）。
+    前面的模型报 is_model_error 类错误时同样升级；限流 / 熔断 / 服务端故障直接抛出，不转嫁给更贵的模型。
+    最后一个模型的结果无论是否通过都返回，由调用方决定如何处理。
+    返回 (content, calls)，calls = [{"model", "usage", "hit", "seconds", "accepted"}]（可在工作线程中调用）
+    """
+    models = models_for(stage)
+    calls = []
+    for i, model in enumerate(models):
+        last = i == len(models) - 1
+        start = time.time()
+        try:
+            content, usage, hit = cached_completion(
+                client,
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                use_cache=use_cache,
+            )
+        except Exception as e:
+            if last or not is_model_error(e):
+                raise
+            calls.append({"model": model, "usage": None, "hit": False,
+                          "seconds": time.time() - start, "accepted": False})
+            continue
+        accepted = accept is None or bool(accept(content))
+        calls.append({"model": model, "usage": usage, "hit": hit,
+                      "seconds": time.time() - start, "accepted": accepted})
+        if accepted or last:
+            return content, calls
+
+
+def stream(client, stage, messages, max_tokens=None, accept=None, temperature=0.0, use_cache=True, result=None):
+    """
+    流式版本，升级规则与 complete 相同。最后一个模型（默认路由下流式阶段只有一个模型）的输出逐段 yield；
+    MODEL_ROUTES 给流式阶段配置了后备模型时，前面模型的输出先缓冲，通过 accept 后一次性 yield，
+    未通过或报 is_model_error 类错误时丢弃并升级，页面上不会出现被替换掉的内容。
+    结束后 result = {"content"(最后一个模型的输出), "ttft"(调用方看到首段输出的耗时), "calls"}。
+    """
+    result = result if result is not None else {}
+    models = models_for(stage)
+    calls = []
+    result["calls"] = calls
+    result["ttft"] = None
+    route_start = time.time()
+    for i, model in enumerate(models):
+        last = i == len(models) - 1
+        start = time.time()
+        attempt = {}
+        pieces = stream_completion(
+            client,
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            use_cache=use_cache,
+            result=attempt,
+        )
+        if last:
+            for piece in pieces:
+                if result["ttft"] is None:
+                    result["ttft"] = time.time() - route_start
+                yield piece
+        else:
+            try:
+                for _ in pieces:
+                    pass
+            except Exception as e:
+                if not is_model_error(e):
+                    raise
+                calls.append({"model": model, "usage": None, "hit": False,
+                              "seconds": time.time() - start, "accepted": False})
+                continue
+        content = attempt.get("content", "")
+        accepted = accept is None or bool(accept(content))
+        calls.append({"model": model, "usage": attempt.get("usage"), "hit": attempt.get("hit", False),
+                      "seconds": time.time() - start, "accepted": accepted})
+        if accepted or last:
+            if not last and content:
+                result["ttft"] = time.time() - route_start
+                yield content
+            result["content"] = content
+            return
+
+
+def call_cost(call) -> float:
+    usage = call.get("usage")
+    if not usage:
+        return 0.0
+    return calculate_cost(call["model"], usage["total_tokens"], usage.get("prompt_tokens"), usage.get("completion_tokens"))
+
+
+class RouteStats:
+    """按 阶段:模型 汇总调用次数、升级次数、耗时、token、费用"""
+
+    def __init__(self):
+        self.routes = {}
+
+    def add(self, stage, calls):
+        for call in calls:
+            route = self.routes.setdefault(f"{stage}:{call['model']}", {
+                "calls": 0, "cache_hits": 0, "rejected": 0, "seconds": 0.0, "tokens": 0, "cost": 0.0,
+            })
+            route["calls"] += 1
+            route["cache_hits"] += int(bool(call.get("hit")))
+            route["rejected"] += int(not call.get("accepted", True))
+            route["seconds"] += call.get("seconds") or 0.0
+            route["tokens"] += (call.get("usage") or {}).get("total_tokens", 0)
+            route["cost"] += call_cost(call)
+
+    def summary(self) -> dict:
+        return {
+            key: {**r, "seconds": round(r["seconds"], 3), "cost": round(r["cost"], 6),
+                  "avg_seconds": round(r["seconds"] / r["calls"], 3) if r["calls"] else None}
+            for key, r in sorted(self.routes.items())
+        }
+
+    def total_cost(self) -> float:
+        return round(sum(r["cost"] for r in self.routes.values()), 6)
+
+    def log(self, source_module, request_id=None):
+        if self.routes:
+            log_event(
+                source_module=source_module,
+                level="INFO",
+                status="info",
+                things="model_routes",
+                remark=", ".join(f"{k}×{r['calls']}" for k, r in sorted(self.routes.items())),
+                meta={"request_id": request_id, "routes": self.summary()},
+            )
@@ -0,0 +1,168 @@
+# modules/normalizer.py
+# 分块前的文本规整：去掉解析器的页标签、跨页重复的页眉 / 页脚、页码，合并断词连字符，压缩空白
+# 这些内容每页都会重复一遍，既浪费 token，也会干扰近似去重和片段切分
+
+import re
+from modules.chunker import UNIT_LABEL_RE, estimate_tokens
+
+EDGE_LINES = 3             # 每页顶部 / 底部各检查几行作为页眉页脚候选
+REPEAT_MIN_UNITS = 3       # 至少在这么多页出现
+REPEAT_MIN_RATIO = 0.5     # 且出现在不少于该比例的页中
+MAX_HEADER_CHARS = 120     # 太长的行不可能是页眉页脚
+STREAM_WINDOW = 24         # 流式规整时用前多少页学习页眉页脚
+
+_PAGE_NUMBER_RE = re.compile(
+    r"^(?:"
+    r"(?:page|p\.|slide)\s*\d{1,4}(?:\s*(?:/|of)\s*\d{1,4})?"        # Page 3 / p. 3 / Page 3 of 20
+    r"|\d{1,4}\s*(?:/|of)\s*\d{1,4}"                                # 3 of 20 / 3/20
+    r"|[-–—]\s*\d{1,4}\s*[-–—]"                                       # - 3 -
+    r"|第\s*\d{1,4}\s*页(?:\s*[,，/]?\s*共\s*\d{1,4}\s*页)?"           # 第 3 页 共 20 页
+    r")$",
+    re.IGNORECASE,
+)
+# 单独的数字 / 罗马数字（3、iv）也可能是正文（列表序号、年份、"I"），只有在多数页的顶部 / 底部都出现、
+# 且数值随页序递增（数值 - 页序号 为同一个常数）时才当作页码
+_BARE_NUMBER_RE = re.compile(r"^(?:\d{1,4}|(?=[ivx])x{0,3}(?:ix|iv|v?i{0,3}))$", re.IGNORECASE)
+_ROMAN_VALUES = {"i": 1, "v": 5, "x": 10}
+_HYPHEN_BREAK_RE = re.compile(r"([A-Za-z]{2,})-\n\s*([a-z]{2,})")
+_SPACES_RE = re.compile(r"[ \t 　]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+def _line_key(line: str) -> str:
+    """页眉页脚比较用：数字统一替换（页码、日期不同也视为同一行）、忽略大小写和空白"""
+    return re.sub(r"\d+", "#", _SPACES_RE.sub(" ", line)).strip().lower()
+
+
+def _bare_number(line: str):
+    """单独一行的数字 / 罗马数字 → 数值；其他行返回 None"""
+    line = line.strip()
+    if not _BARE_NUMBER_RE.match(line):
+        return None
+    if line.isdigit():
+        return int(line)
+    values = [_ROMAN_VALUES[ch] for ch in line.lower()]
+    return sum(-v if v < nxt else v for v, nxt in zip(values, values[1:] + [0]))
+
+
+def _edge_lines(lines):
+    """顶部和底部各 EDGE_LINES 个非空行的下标"""
+    idx = [i for i, line in enumerate(lines) if line.strip()]
+    return set(idx[:EDGE_LINES] + idx[-EDGE_LINES:])
+
+
+def _clean(text: str) -> str:
+    text = _HYPHEN_BREAK_RE.sub(r"\1\2", text)
+    lines = [_SPACES_RE.sub(" ", line).strip() for line in text.split("\n")]
+    return _BLANK_LINES_RE.sub("\n\n", "\n".join(lines)).strip()
+
+
+def new_stats():
+    return {"bytes_before": 0, "bytes_after": 0, "tokens_before": 0, "tokens_after": 0,
+            "headers_removed": 0, "page_numbers_removed": 0}
+
+
+def _body(unit: str, stats):
+    stats["bytes_before"] += len(unit.encode("utf-8"))
+    stats["tokens_before"] += estimate_tokens(unit)
+    return UNIT_LABEL_RE.sub("", unit).split("\n")
+
+
+def _repeated_keys(bodies):
+    """在不少于 REPEAT_MIN_RATIO 的页顶部 / 底部重复出现的行（页眉页脚）；单独的数字行交给 _page_offset 判断"""
+    if len(bodies) < REPEAT_MIN_UNITS:
+        return set()
+    counts = {}
+    for lines in bodies:
+        keys = {_line_key(lines[i]) for i in _edge_lines(lines)
+                if len(lines[i].strip()) <= MAX_HEADER_CHARS and _bare_number(lines[i]) is None}
+        for key in keys:
+            if key:
+                counts[key] = counts.get(key, 0) + 1
+    threshold = max(REPEAT_MIN_UNITS, REPEAT_MIN_RATIO * len(bodies))
+    return {key for key, n in counts.items() if n >= threshold}
+
+
+def _page_offset(bodies):
+    """单独数字形式的页码：多数页边缘的数字满足 数值 = 页序号 + offset 时返回 offset，否则 None"""
+    if len(bodies) < REPEAT_MIN_UNITS:
+        return None
+    counts = {}
+    for index, lines in enumerate(bodies):
+        offsets = {_bare_number(lines[i]) - index for i in _edge_lines(lines) if _bare_number(lines[i]) is not None}
+        for offset in offsets:
+            counts[offset] = counts.get(offset, 0) + 1
+    threshold = max(REPEAT_MIN_UNITS, REPEAT_MIN_RATIO * len(bodies))
+    offset, n = max(counts.items(), key=lambda kv: kv[1], default=(None, 0))
+    return offset if n >= threshold else None
+
+
+def _clean_body(lines, paged, repeated, stats, index=0, page_offset=None) -> str:
+    """index：单元在文件中的序号，page_offset 不为 None 时用来核对单独数字形式的页码"""
+    edges = _edge_lines(lines)
+    kept = []
+    for i, line in enumerate(lines):
+        if i in edges:
+            stripped = line.strip()
+            if paged and _PAGE_NUMBER_RE.match(stripped):
+                stats["page_numbers_removed"] += 1
+                continue
+            if page_offset is not None and _bare_number(stripped) == index + page_offset:
+                stats["page_numbers_removed"] += 1
+                continue
+            if _line_key(line) in repeated:
+                stats["headers_removed"] += 1
+                continue
+        kept.append(line)
+    cleaned = _clean("\n".join(kept))
+    if cleaned:
+        stats["bytes_after"] += len(cleaned.encode("utf-8"))
+        stats["tokens_after"] += estimate_tokens(cleaned)
+    return cleaned
+
+
+def normalize_units(units):
+    """
+    units: split_units 的输出（单个文件）。
+    返回 (规整后的单元列表, stats)，stats = {"bytes_before", "bytes_after", "tokens_before", "tokens_after",
+    "headers_removed", "page_numbers_removed"}
+    """
+    stats = new_stats()
+    if not units:
+        return [], stats
+
+    paged = any(UNIT_LABEL_RE.match(unit) for unit in units)
+    bodies = [_body(unit, stats) for unit in units]
+    # 页眉页脚：只在按页 / 幻灯片切分的文档里检测（段落单元之间的重复行可能是正文）
+    repeated = _repeated_keys(bodies) if paged else set()
+    page_offset = _page_offset(bodies) if paged else None
+    cleaned_units = [_clean_body(lines, paged, repeated, stats, i, page_offset) for i, lines in enumerate(bodies)]
+    return [unit for unit in cleaned_units if unit], stats
+
+
+def normalize_stream(units, stats, window: int = STREAM_WINDOW):
+    """
+    流式版本：先缓冲前 window 个单元学习页眉页脚，之后逐个规整并产出（stats 原地累加）。
+    单元数不超过 window 时结果与 normalize_units 相同；更长的文档按前 window 页的统计判断页眉页脚。
+    """
+    units = iter(units)
+    head = []
+    for unit in units:
+        head.append(unit)
+        if len(head) >= window:
+            break
+    if not head:
+        return
+
+    paged = any(UNIT_LABEL_RE.match(unit) for unit in head)
+    bodies = [_body(unit, stats) for unit in head]
+    repeated = _repeated_keys(bodies) if paged else set()
+    page_offset = _page_offset(bodies) if paged else None
+    for i, lines in enumerate(bodies):
+        cleaned = _clean_body(lines, paged, repeated, stats, i, page_offset)
+        if cleaned:
+            yield cleaned
+    for i, unit in enumerate(units, start=len(bodies)):
+        cleaned = _clean_body(_body(unit, stats), paged, repeated, stats, i, page_offset)
+        if cleaned:
+            yield cleaned
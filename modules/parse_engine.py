@@ -0,0 +1,208 @@
+# modules/parse_engine.py
+# 文件解析引擎（进程池）：PyMuPDF / python-pptx 解析基本是 CPU 密集、受 GIL 限制，线程池几乎没有加速
+# 按文件拆分任务，大 PDF 再按页区间拆分，分发到与 CPU 核数相同的进程池；结果按上传顺序拼回，并统计每个文件 / 每页的耗时
+# iter_parse 为流式接口：前面的页解析完就先产出，下游（分块抽取）不必等整份资料解析结束
+# 子进程里执行的任务在 parse_tasks 中（不依赖 config），本模块只在父进程 import
+
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import PARSE_WORKERS, PARSE_PDF_PAGES_PER_TASK
+from modules import file_parser
+from modules.logger import log_event
+from modules.parse_tasks import parse_file_task, parse_pdf_range_task
+
+# 进程池在进程内共享、按需创建（子进程启动和 import 的开销只付一次）
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn：Streamlit 进程里有多个线程，fork 出的子进程可能继承被占用的锁
+            _pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown():
+    """关闭进程池（子进程崩溃后也用来丢弃坏掉的池，下次调用时重建）"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ================== 拆分 / 执行 ==================
+def _plan(files, pages_per_task, tmpdir):
+    """→ [(文件序号, 任务函数, 参数)]，按文件、页码顺序排列；大 PDF 先写入临时文件，各子任务按路径打开，避免重复传输整份 bytes"""
+    tasks = []
+    for idx, (name, data) in enumerate(files):
+        lower = name.lower()
+        if lower.endswith(".pdf") and pages_per_task > 0:
+            try:
+                count = file_parser.pdf_page_count(data)
+            except Exception:
+                count = 0  # 交给整文件任务记录解析失败
+            if count > pages_per_task:
+                path = os.path.join(tmpdir, f"{idx}.pdf")
+                with open(path, "wb") as f:
+                    f.write(data)
+                for start in range(0, count, pages_per_task):
+                    tasks.append((idx, parse_pdf_range_task, (path, lower, start, start + pages_per_task)))
+                continue
+        tasks.append((idx, parse_file_task, (data, name)))
+    return tasks
+
+
+def _ordered_results(tasks, state):
+    """
+    按任务顺序逐个产出 (任务序号, 结果)：全部任务一次性提交给进程池，前面的任务一完成就先产出，后面的继续在子进程里解析。
+    进程池不可用或子进程崩溃时，剩余任务退回当前进程执行。state["mode"] 记录实际使用的模式
+    """
+    futures = None
+    state["mode"] = "inline"
+    if PARSE_WORKERS > 1 and len(tasks) > 1:
+        try:
+            pool = _get_pool()
+            futures = [pool.submit(fn, *args) for _, fn, args in tasks]
+            state["mode"] = "process"
+        except (BrokenProcessPool, OSError, NotImplementedError, RuntimeError) as e:
+            log_event("parse_engine", "WARNING", "warning", "parse_pool_fallback", remark=str(e))
+            shutdown()
+
+    for i, (_, fn, args) in enumerate(tasks):
+        if futures is not None:
+            try:
+                yield i, futures[i].result()
+                continue
+            except BrokenProcessPool as e:
+                log_event("parse_engine", "WARNING", "warning", "parse_pool_fallback", remark=str(e),
+                          meta={"done": i, "tasks": len(tasks)})
+                shutdown()
+                futures = None
+                state["mode"] = "process+inline" if i else "inline"
+        yield i, fn(*args)
+
+
+def _file_stat(name, seconds, tasks, units):
+    stat = {"name": name, "seconds": round(seconds, 4), "tasks": tasks, "units": len(units), "slowest_unit": None}
+    if units:
+        slowest = max(units, key=lambda u: u["seconds"])
+        stat["slowest_unit"] = {"kind": slowest["kind"], "index": slowest["index"], "seconds": slowest["seconds"]}
+        stat["avg_unit_seconds"] = round(sum(u["seconds"] for u in units) / len(units), 4)
+    return stat
+
+
+def _log_done(files, tasks, mode, wall_start, file_stats):
+    stats = {
+        "wall_seconds": round(time.perf_counter() - wall_start, 4),
+        "mode": mode,
+        "workers": PARSE_WORKERS if mode != "inline" else 1,
+        "tasks": tasks,
+        "files": file_stats,
+    }
+    log_event("parse_engine", "INFO", "success", "parse_done",
+              remark=f"{len(files)} 个文件 / {tasks} 个子任务，{stats['wall_seconds']}s（{mode}）", meta=stats)
+    return stats
+
+
+def iter_parse(files, pages_per_task=None, result=None):
+    """
+    流式解析：files: [(filename, bytes)] → 按上传顺序、页码顺序逐个产出单元（file_parser.iter_units 的格式，另加 "doc"：文件序号，从 1 开始）。
+    PARSE_WORKERS<=1 时在当前进程逐页解析；否则按文件 / 页区间并行，已完成的前缀先产出。
+    解析失败的文件产出一个 kind="error" 的占位单元；没有文字的文件产出 kind="text" 的占位单元。
+    结束后 result["stats"] 为解析统计（格式同 parse_files）。
+    """
+    files = list(files)
+    result = result if result is not None else {}
+    pages_per_task = PARSE_PDF_PAGES_PER_TASK if pages_per_task is None else pages_per_task
+    wall_start = time.perf_counter()
+    file_stats = []
+
+    def _placeholder(idx, name, kind, text):
+        return {"doc": idx + 1, "file": name.lower(), "kind": kind, "index": 1, "text": text, "seconds": 0.0}
+
+    if PARSE_WORKERS <= 1 or len(files) == 0:
+        # 串行：真正逐页产出，第一页解析完就能交给下游
+        for idx, (name, data) in enumerate(files):
+            started, units = time.perf_counter(), []
+            try:
+                for unit in file_parser.iter_units(data, name):
+                    units.append(unit)
+                    yield {**unit, "doc": idx + 1}
+                if not units:
+                    yield _placeholder(idx, name, "text", file_parser.NO_TEXT)
+            except Exception as e:
+                log_event("parse_engine", "ERROR", "down", f"文件解析失败: {name}", remark=str(e))
+                yield _placeholder(idx, name, "error", file_parser.failure_text(name, e))
+            file_stats.append(_file_stat(name, time.perf_counter() - started, 1, units))
+        result["stats"] = _log_done(files, len(files), "inline", wall_start, file_stats)
+        return
+
+    state = {}
+    with tempfile.TemporaryDirectory(prefix="parse_") as tmpdir:
+        tasks = _plan(files, pages_per_task, tmpdir)
+        current, units, seconds, count, failed = None, [], 0.0, 0, None
+
+        def _close():
+            if failed:
+                yield _placeholder(current, files[current][0], "error", failed)
+            elif not units:
+                yield _placeholder(current, files[current][0], "text", file_parser.NO_TEXT)
+            file_stats.append(_file_stat(files[current][0], seconds, count, units))
+
+        for i, (task_units, task_failed, task_seconds) in _ordered_results(tasks, state):
+            idx = tasks[i][0]
+            if idx != current:
+                if current is not None:
+                    yield from _close()
+                current, units, seconds, count, failed = idx, [], 0.0, 0, None
+            seconds += task_seconds
+            count += 1
+            if task_failed:
+                # 分页任务中的任意一段失败 → 整个文件按失败处理（与整文件解析一致），已产出的页不撤回
+                failed = failed or task_failed
+                continue
+            if failed:
+                continue
+            for unit in task_units:
+                units.append(unit)
+                yield {**unit, "doc": idx + 1}
+        if current is not None:
+            yield from _close()
+    result["stats"] = _log_done(files, len(tasks), state.get("mode", "inline"), wall_start, file_stats)
+
+
+def parse_files(files, pages_per_task=None, on_progress=None):
+    """
+    files: [(filename, bytes)] → (texts, stats)，texts 与输入顺序一致（与 extract_text_from_file 的输出相同）。
+    on_progress(done, total)：每解析完一个文件在调用线程回调。
+    stats = {"wall_seconds", "mode", "workers", "tasks", "files": [{"name", "seconds", "tasks", "units", "slowest_unit"}]}
+    """
+    files = list(files)
+    result = {}
+    by_doc = [[] for _ in files]
+    done = 0
+    for unit in iter_parse(files, pages_per_task, result):
+        by_doc[unit["doc"] - 1].append(unit)
+        # 单元按文件顺序产出：出现下一个文件的单元时，前面的文件已解析完
+        while on_progress and done < unit["doc"] - 1:
+            done += 1
+            on_progress(done, len(files))
+    if on_progress and files:
+        on_progress(len(files), len(files))
+
+    return [join_doc(units) for units in by_doc], result["stats"]
+
+
+def join_doc(units) -> str:
+    """iter_parse 产出的同一文件的单元 → 该文件的文本（解析失败时为失败占位文本）"""
+    errors = [unit for unit in units if unit["kind"] == "error"]
+    return errors[0]["text"] if errors else file_parser.join_units(units)
@@ -0,0 +1,29 @@
+# modules/parse_tasks.py
+# parse_engine 进程池子进程里执行的解析任务（须为模块顶层函数才能 pickle）
+# spawn 出的子进程只会 import 本模块：这里及其依赖都不能 import config
+# （config 会读取 st.secrets / 打印 Key 信息，只在 Streamlit 主进程里才可靠），需要的设置由父进程作为参数传入
+
+import time
+from modules import file_parser
+from modules.logger import log_event
+
+
+def parse_file_task(file_bytes, filename):
+    """整个文件 → (单元列表, 失败时的占位文本或 None, 耗时)"""
+    start = time.perf_counter()
+    try:
+        units, failed = list(file_parser.iter_units(file_bytes, filename)), None
+    except Exception as e:
+        log_event("parse_engine", "ERROR", "down", f"文件解析失败: {filename}", remark=str(e))
+        units, failed = [], file_parser.failure_text(filename, e)
+    return units, failed, round(time.perf_counter() - start, 4)
+
+
+def parse_pdf_range_task(path, filename, start, end):
+    t0 = time.perf_counter()
+    try:
+        units, failed = list(file_parser.iter_pdf_pages(path, filename, start, end)), None
+    except Exception as e:
+        log_event("parse_engine", "ERROR", "down", f"PDF 分页解析失败: {filename} [{start}, {end})", remark=str(e))
+        units, failed = [], file_parser.failure_text(filename, e)
+    return units, failed, round(time.perf_counter() - t0, 4)
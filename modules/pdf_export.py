@@ -0,0 +1,131 @@
+# modules/pdf_export.py
+# Markdown 笔记 → PDF（reportlab），供导出页面与后台任务共用
+
+import os
+import re
+from datetime import datetime
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib import colors
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, ListFlowable, ListItem
+
+
+def safe_filename(text: str) -> str:
+    """用正文第一行作为文件名（去掉非法字符）"""
+    first_line = text.split("\n")[0].strip()
+    safe_title = re.sub(r'[\\/*?:"<>|]', "_", first_line)  # 去掉非法字符
+    return f"{safe_title or 'exported_notes'}.pdf"
+
+
+def clean_filename(name: str) -> str:
+    """用户 / 调用方给的文件名 → 只保留文件名本身（去掉目录、非法字符和开头的点），保证以 .pdf 结尾"""
+    name = re.sub(r'[\\/*?:"<>|\x00-\x1f]', "_", os.path.basename((name or "").replace("\\", "/"))).strip()
+    name = name.lstrip(".").strip() or "exported_notes"
+    return name if name.lower().endswith(".pdf") else f"{name}.pdf"
+
+
+def clean_text(text: str) -> str:
+    """
+    清理不需要导出的标记，例如 FILE: Document_1
+    """
+    # 去掉 FILE: Document_x 开头的行
+    text = re.sub(r"^FILE: Document_\d+\s*\n?", "", text, flags=re.MULTILINE)
+    return text
+
+
+def save_to_pdf(text, filename="exported_notes.pdf", pdf_path=None):
+    """
+    使用 reportlab 将文本导出为 PDF，支持简单 Markdown 格式。
+    默认写到 exports/<filename>（filename 只取文件名部分）；pdf_path 指定时直接写到该路径（后台任务写到 JOBS_DIR）
+    """
+
+    # 在导出前清理
+    text = clean_text(text)
+
+    # 输出目录
+    if pdf_path is None:
+        output_dir = "exports"
+        os.makedirs(output_dir, exist_ok=True)
+        pdf_path = os.path.join(output_dir, clean_filename(filename))
+
+    # 创建 PDF
+    doc = SimpleDocTemplate(
+        pdf_path,
+        pagesize=A4,
+        rightMargin=50,
+        leftMargin=50,
+        topMargin=50,
+        bottomMargin=50
+    )
+
+    # 样式
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(
+        name="CustomTitle",
+        fontSize=16,
+        leading=20,
+        spaceAfter=15,
+        textColor=colors.HexColor("#2C3E50"),
+        alignment=1,  # 居中
+    ))
+    styles.add(ParagraphStyle(
+        name="CustomBody",
+        fontSize=11,
+        leading=16,
+        spaceAfter=8,
+    ))
+
+    story = []
+
+    # 添加标题
+    story.append(Paragraph("ExamSOS", styles["CustomTitle"]))
+    story.append(Spacer(1, 12))
+
+    # 添加时间戳
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
+    story.append(Paragraph(f"Time export {timestamp}", styles["CustomBody"]))
+    story.append(Spacer(1, 20))
+
+    # 逐行写入正文（解析 Markdown）
+    bullet_items = []
+    for line in text.split("\n"):
+        line = line.strip()
+
+        # 空行
+        if not line:
+            if bullet_items:
+                story.append(ListFlowable(bullet_items, bulletType='bullet'))
+                bullet_items = []
+            story.append(Spacer(1, 12))
+            continue
+
+        # 处理 Markdown 粗体
+        line = re.sub(r"\*\*(.+?)\*\*", r"<b>\1</b>", line)
+
+        # 处理标题
+        if line.startswith("## "):
+            if bullet_items:
+                story.append(ListFlowable(bullet_items, bulletType='bullet'))
+                bullet_items = []
+            story.append(Paragraph(line[3:], styles["Heading2"]))
+        elif line.startswith("# "):
+            if bullet_items:
+                story.append(ListFlowable(bullet_items, bulletType='bullet'))
+                bullet_items = []
+            story.append(Paragraph(line[2:], styles["Heading1"]))
+
+        # 处理列表
+        elif line.startswith("- "):
+            bullet_items.append(ListItem(Paragraph(line[2:], styles["CustomBody"])))
+        else:
+            if bullet_items:
+                story.append(ListFlowable(bullet_items, bulletType='bullet'))
+                bullet_items = []
+            story.append(Paragraph(line, styles["CustomBody"]))
+
+    # 收尾（如果最后还有列表）
+    if bullet_items:
+        story.append(ListFlowable(bullet_items, bulletType='bullet'))
+
+    doc.build(story)
+    return pdf_path
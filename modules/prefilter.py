@@ -0,0 +1,167 @@
+# modules/prefilter.py
+# 抽取前的抽取式预筛选（TF-IDF 句子打分，NumPy 向量化）
+# 每个单元（页 / 幻灯片 / 段落）视为一节，只保留得分靠前的句子；参考文献、版权声明、答案页这类内容
+# 词汇与全文主题关联弱，再叠加模式降权，自然排在后面
+
+import re
+import time
+import numpy as np
+from modules.chunker import UNIT_LABEL_RE, estimate_tokens
+
+# 句子切分：先按行，再按中文句末标点 / 英文句号后接大写字母切开
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[。！？!?；;])\s*|(?<=\.)\s+(?=[A-Z\"'(])")
+# 词项：英文单词（≥2 字母）/ 数字串 / 中文按相邻二字
+_WORD_RE = re.compile(r"[a-z][a-z\-']+|\d+(?:\.\d+)?")
+_CJK_RUN_RE = re.compile(r"[㐀-䶿一-鿿]+")
+
+# 典型样板内容：整节出现时整体降权
+_BOILERPLATE_RE = re.compile(
+    r"references|bibliography|参考文献|all rights reserved|copyright|©|license|licen[cs]ed under|"
+    r"doi:|isbn|https?://|www\.|answer key|answers to exercises|参考答案|版权所有",
+    re.IGNORECASE,
+)
+BOILERPLATE_PENALTY = 0.2
+
+# 标题 / 短行（≤ 该 token 数）总是保留，保证结构不丢
+HEADING_MAX_TOKENS = 12
+
+
+def _sentences(unit: str):
+    """单元 → (标签行, [句子])；标签行原样保留不参与打分"""
+    label = ""
+    m = UNIT_LABEL_RE.match(unit)
+    if m:
+        label = m.group().strip()
+        unit = unit[m.end():]
+    sentences = [
+        s.strip()
+        for line in unit.splitlines()
+        for s in _SENTENCE_SPLIT_RE.split(line)
+        if s.strip()
+    ]
+    return label, sentences
+
+
+def _terms(sentence: str):
+    lowered = sentence.lower()
+    terms = _WORD_RE.findall(lowered)
+    for run in _CJK_RUN_RE.findall(lowered):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def _score_sentences(sections):
+    """
+    sections: list[list[str]]（每节的句子）。
+    词在全部资料中的频率 × 逆节频率 (idf) 作为词权，句子得分为词权的平均值（按句长归一）。
+    返回与句子一一对应的得分数组。
+    """
+    vocab = {}
+    sent_ids, term_ids, sec_of_term = [], [], []
+    n_sentences = 0
+    for sec_idx, sentences in enumerate(sections):
+        for sentence in sentences:
+            for term in _terms(sentence):
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                sent_ids.append(n_sentences)
+                sec_of_term.append(sec_idx)
+            n_sentences += 1
+
+    if not term_ids:
+        return np.zeros(n_sentences)
+
+    sent_ids = np.asarray(sent_ids)
+    term_ids = np.asarray(term_ids)
+    sec_of_term = np.asarray(sec_of_term)
+    n_terms = len(vocab)
+    n_sections = max(1, len(sections))
+
+    # 词频（全部资料）与节频（出现过该词的节数），都用 bincount 计算
+    tf = np.bincount(term_ids, minlength=n_terms).astype(float)
+    pairs = np.unique(sec_of_term.astype(np.int64) * n_terms + term_ids)
+    df = np.bincount(pairs % n_terms, minlength=n_terms).astype(float)
+    idf = np.log((1 + n_sections) / (1 + df)) + 1.0
+    weights = np.log1p(tf) * idf
+
+    totals = np.bincount(sent_ids, weights=weights[term_ids], minlength=n_sentences)
+    counts = np.bincount(sent_ids, minlength=n_sentences).astype(float)
+    # 除以 sqrt(长度)：长句略占优，但不会单纯因为长而胜出
+    return totals / np.sqrt(np.maximum(counts, 1.0))
+
+
+def prefilter_units(doc_units, keep_ratio: float, token_budget: int = 0):
+    """
+    doc_units: list[list[str]]（每个文件的单元列表）。
+    每节按得分保留约 keep_ratio 的 token（标题 / 短行总是保留）；token_budget > 0 时再全局按得分截断。
+    返回 (过滤后的 doc_units, stats)，stats = {"sentences", "kept_sentences", "tokens_before", "tokens_after", "seconds"}
+    """
+    start = time.time()
+    parsed = [[_sentences(unit) for unit in units] for units in doc_units]
+    sections = [sentences for doc in parsed for _, sentences in doc]
+    scores = _score_sentences(sections)
+
+    # 展平后的句子信息：(节序号, 句内序号, token, 是否强制保留, 样板降权系数)
+    flat = []
+    for sec_idx, sentences in enumerate(sections):
+        penalty = BOILERPLATE_PENALTY if _BOILERPLATE_RE.search(" ".join(sentences[:3])) else 1.0
+        for sent_idx, sentence in enumerate(sentences):
+            tokens = estimate_tokens(sentence)
+            forced = penalty == 1.0 and tokens <= HEADING_MAX_TOKENS and not _BOILERPLATE_RE.search(sentence)
+            flat.append((sec_idx, sent_idx, tokens, forced, penalty))
+    tokens_arr = np.asarray([f[2] for f in flat], dtype=float)
+    if flat:
+        scores = scores * np.asarray([f[4] for f in flat])
+    keep = np.zeros(len(flat), dtype=bool)
+
+    # 每节内按得分保留前 keep_ratio 的 token
+    pos = 0
+    for sentences in sections:
+        n = len(sentences)
+        if n:
+            idx = np.arange(pos, pos + n)
+            forced = np.asarray([flat[i][3] for i in idx])
+            keep[idx[forced]] = True
+            quota = keep_ratio * tokens_arr[idx].sum() - tokens_arr[idx[forced]].sum()
+            for i in idx[np.argsort(-scores[idx], kind="stable")]:
+                if quota <= 0:
+                    break
+                if not keep[i]:
+                    keep[i] = True
+                    quota -= tokens_arr[i]
+        pos += n
+
+    # 全局预算：从得分最低的可选句子开始去掉，直到满足预算
+    if token_budget and tokens_arr[keep].sum() > token_budget:
+        optional = np.where(keep & ~np.asarray([f[3] for f in flat], dtype=bool))[0]
+        excess = tokens_arr[keep].sum() - token_budget
+        for i in optional[np.argsort(scores[optional], kind="stable")]:
+            if excess <= 0:
+                break
+            keep[i] = False
+            excess -= tokens_arr[i]
+
+    # 按原顺序重建单元
+    kept_docs = []
+    pos = 0
+    for doc in parsed:
+        units = []
+        for label, sentences in doc:
+            kept = [s for j, s in enumerate(sentences) if keep[pos + j]]
+            pos += len(sentences)
+            if kept:
+                units.append("\n".join(([label] if label else []) + kept))
+        kept_docs.append(units)
+
+    tokens_before = int(tokens_arr.sum())
+    tokens_after = int(tokens_arr[keep].sum())
+    stats = {
+        "sentences": len(flat),
+        "kept_sentences": int(keep.sum()),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "seconds": round(time.time() - start, 3),
+    }
+    return kept_docs, stats
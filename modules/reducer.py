@@ -0,0 +1,115 @@
+# modules/reducer.py
+# 多级 map-reduce 合并：分块摘要总量超出最终合成的输入预算时，
+# 先分批并行压缩，再递归，直到一次合成放得下；到达最大层数仍超出时按比例截断
+
+from modules.chunk_engine import run_ordered
+from modules.chunker import estimate_tokens, split_units, build_segments
+from modules.logger import log_event
+
+
+def _split_block(block: str, budget: int):
+    """单个块超出预算时按段落切开（保留 FILE 标题在第一块）"""
+    return [seg["text"] for seg in build_segments(0, split_units(block), budget)]
+
+
+def _batch_blocks(blocks, budget: int):
+    """按顺序把块装进 ≤ budget token 的批次"""
+    batches, current, current_tokens = [], [], 0
+    for block in blocks:
+        tokens = estimate_tokens(block)
+        if current and current_tokens + tokens > budget:
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(block)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def needs_reduce(blocks, budget: int) -> bool:
+    return sum(estimate_tokens(b) for b in blocks) > budget
+
+
+def plan_reduce_batches(blocks, budget: int):
+    """把超出预算的块先切开，再按顺序分成 ≤ budget 的批次（list[list[str]]）"""
+    pieces = []
+    for block in blocks:
+        if estimate_tokens(block) > budget:
+            pieces.extend(_split_block(block, budget))
+        else:
+            pieces.append(block)
+    return _batch_blocks(pieces, budget)
+
+
+def truncate_to_budget(blocks, budget: int):
+    """
+    按各块的 token 占比分配预算，超出份额的块只保留开头（按段落 / 页切，保留 FILE 标题）。
+    结果只取决于输入，同样的输入截断结果相同
+    """
+    sizes = [estimate_tokens(b) for b in blocks]
+    total = sum(sizes)
+    if total <= budget:
+        return list(blocks)
+    truncated = []
+    for block, tokens in zip(blocks, sizes):
+        share = max(1, budget * tokens // total)
+        if tokens <= share:
+            truncated.append(block)
+            continue
+        pieces = build_segments(0, split_units(block), share)
+        if pieces:
+            truncated.append(pieces[0]["text"])
+    return truncated
+
+
+def hierarchical_reduce(blocks, reduce_fn, budget: int, max_depth: int = 4, max_workers=None, on_result=None):
+    """
+    - blocks: 待合并的文本块（通常一个文件一块，形如 "## FILE: ...\\n..."）
+    - reduce_fn(batch_text, level) -> (text, *info)：把一批块压缩成一段（在工作线程中调用），
+      info 通常为 (usage, hit)
+    - on_result(*info): 每个成功批次在调用线程上回调一次，用于记录 token
+    - budget: 最终合成允许的输入 token 上限，也是每批的上限
+    返回 (blocks, stats)，stats = {"depth", "fanout": [每层批次数], "failed", "over_budget"}
+    到达 max_depth 后仍超出预算时记录 over_budget（截断前的 token 数）并按 truncate_to_budget 截断
+    """
+    stats = {"depth": 0, "fanout": [], "failed": 0, "over_budget": None}
+    blocks = [b for b in blocks if b and b.strip()]
+
+    while needs_reduce(blocks, budget) and stats["depth"] < max_depth:
+        batches = plan_reduce_batches(blocks, budget)
+        level = stats["depth"] + 1
+        results = run_ordered(
+            lambda batch: reduce_fn("\n\n".join(batch), level),
+            batches,
+            max_workers=max_workers,
+        )
+
+        reduced = []
+        for batch, (ok, value) in zip(batches, results):
+            text = ""
+            if ok:
+                text, *info = value
+                if on_result:
+                    on_result(*info)
+            if text and text.strip():
+                reduced.append(text.strip())
+            else:
+                # 压缩失败时保留原文，下一层再试
+                stats["failed"] += 1
+                reduced.append("\n\n".join(batch))
+
+        stats["depth"] = level
+        stats["fanout"].append(len(batches))
+        blocks = reduced
+
+    if needs_reduce(blocks, budget):
+        tokens = sum(estimate_tokens(b) for b in blocks)
+        stats["over_budget"] = tokens
+        log_event("reducer", "WARNING", "warning", "reduce_over_budget",
+                  remark=f"{tokens} > {budget} tokens after {stats['depth']} levels，按比例截断",
+                  meta={"tokens": tokens, "budget": budget, "depth": stats["depth"],
+                        "failed": stats["failed"], "blocks": len(blocks)})
+        blocks = truncate_to_budget(blocks, budget)
+
+    return blocks, stats
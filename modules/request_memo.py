@@ -0,0 +1,253 @@
+# modules/request_memo.py
+# 请求级结果复用：同一份资料（文件内容哈希，与顺序无关）+ 同一组设置 → 直接返回已生成的笔记
+# single-flight：相同请求同时到达时只有一个「领头」请求真正计算，其余等待它的结果（进程内用 Event，跨进程靠表里的租约行）
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from config import REQUEST_MEMO_TTL_SECONDS, REQUEST_MEMO_LEASE_SECONDS, REQUEST_MEMO_WAIT_SECONDS
+from modules.logger import connect_with_retry, log_event
+from modules.utils.path_helper import CACHE_DB
+
+# 进程内正在计算的 key → Event（领头请求结束时 set，跟随者不必轮询数据库）
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+POLL_INTERVAL = 1.0
+
+
+def init_memo_table():
+    """确保 request_memo 表存在"""
+    conn = connect_with_retry(CACHE_DB)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS request_memo (
+            memo_key TEXT PRIMARY KEY,
+            status TEXT,                -- pending（计算中）/ done
+            owner TEXT,
+            lease_expires REAL,
+            text TEXT,
+            meta TEXT,
+            hits INTEGER DEFAULT 0,
+            created_at REAL,
+            updated_at REAL
+        )
+    """)
+    conn.close()
+
+
+def make_key(texts, *settings) -> str:
+    """各文件内容哈希排序后 + 设置 → key（上传顺序不同也视为同一请求）"""
+    h = hashlib.sha256()
+    for digest in sorted(hashlib.sha256((t or "").encode("utf-8")).hexdigest() for t in texts):
+        h.update(digest.encode("ascii"))
+    h.update(json.dumps(settings, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8"))
+    return f"memo_{h.hexdigest()[:40]}"
+
+
+def get(memo_key: str):
+    """返回 {"text", "meta"}；没有已完成的结果或已过期时返回 None"""
+    now = time.time()
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        row = conn.execute(
+            "SELECT text, meta, updated_at FROM request_memo WHERE memo_key = ? AND status = 'done'", (memo_key,)
+        ).fetchone()
+        if not row or (REQUEST_MEMO_TTL_SECONDS and now - row[2] > REQUEST_MEMO_TTL_SECONDS):
+            return None
+        conn.execute("UPDATE request_memo SET hits = hits + 1 WHERE memo_key = ?", (memo_key,))
+    finally:
+        conn.close()
+    try:
+        meta = json.loads(row[1]) if row[1] else {}
+    except ValueError:
+        meta = {}
+    return {"text": row[0], "meta": meta}
+
+
+def acquire(memo_key: str, owner: str) -> bool:
+    """尝试成为领头请求：没有记录、结果已过期、或原领头的租约已过期时占位成功"""
+    now = time.time()
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT status, lease_expires, updated_at FROM request_memo WHERE memo_key = ?", (memo_key,)
+        ).fetchone()
+        free = (
+            row is None
+            or (row[0] == "pending" and (row[1] or 0) < now)
+            or (row[0] == "done" and REQUEST_MEMO_TTL_SECONDS and now - row[2] > REQUEST_MEMO_TTL_SECONDS)
+        )
+        if free:
+            conn.execute("""
+                INSERT INTO request_memo (memo_key, status, owner, lease_expires, created_at, updated_at)
+                VALUES (?, 'pending', ?, ?, ?, ?)
+                ON CONFLICT(memo_key) DO UPDATE SET
+                    status = 'pending', owner = excluded.owner, lease_expires = excluded.lease_expires,
+                    text = NULL, meta = NULL, updated_at = excluded.updated_at
+            """, (memo_key, owner, now + REQUEST_MEMO_LEASE_SECONDS, now, now))
+        conn.execute("COMMIT")
+    except sqlite3.OperationalError:
+        try:
+            conn.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            pass
+        raise
+    finally:
+        conn.close()
+
+    if free:
+        with _inflight_lock:
+            _inflight[memo_key] = threading.Event()
+    return free
+
+
+def renew(memo_key: str, owner: str) -> bool:
+    """领头请求在长时间计算中续租，避免被误判为崩溃；返回 False 表示占位已被接管或清理"""
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        cur = conn.execute(
+            "UPDATE request_memo SET lease_expires = ? WHERE memo_key = ? AND owner = ? AND status = 'pending'",
+            (time.time() + REQUEST_MEMO_LEASE_SECONDS, memo_key, owner),
+        )
+        return cur.rowcount > 0
+    finally:
+        conn.close()
+
+
+def _heartbeat_loop(memo_key, owner, stop, interval):
+    while not stop.wait(interval):
+        try:
+            if not renew(memo_key, owner):
+                log_event("request_memo", "WARNING", "warning", "memo_lease_lost",
+                          remark="领头请求的占位已被接管或清理", meta={"memo_key": memo_key, "owner": owner})
+                return
+        except Exception as e:
+            # 单次续租失败（数据库繁忙）不终止心跳，下个周期再试
+            log_event("request_memo", "WARNING", "warning", "memo_renew_failed", remark=str(e),
+                      meta={"memo_key": memo_key})
+
+
+def start_heartbeat(memo_key: str, owner: str) -> threading.Event:
+    """领头请求计算期间在后台线程定时续租（每 1/3 租约时长一次）；set 返回的 Event 即停止"""
+    stop = threading.Event()
+    threading.Thread(
+        target=_heartbeat_loop, args=(memo_key, owner, stop, REQUEST_MEMO_LEASE_SECONDS / 3),
+        name="memo-heartbeat", daemon=True,
+    ).start()
+    return stop
+
+
+def _finish(memo_key: str):
+    with _inflight_lock:
+        event = _inflight.pop(memo_key, None)
+    if event:
+        event.set()
+
+
+def store(memo_key: str, owner: str, text: str, meta: dict = None) -> str:
+    """
+    领头请求完成：写入结果并唤醒等待者。返回 "stored"；
+    占位已被接管（租约过期后其他请求成为领头）或被清理时，只要还没有已完成的结果就照样写入，返回 "adopted"；
+    已有其他请求写入的结果时保留对方的，返回 "skipped"。
+    """
+    now = time.time()
+    payload = json.dumps(meta or {}, ensure_ascii=False, default=str)
+    try:
+        conn = connect_with_retry(CACHE_DB)
+        try:
+            cur = conn.execute("""
+                UPDATE request_memo SET status = 'done', text = ?, meta = ?, lease_expires = NULL, updated_at = ?
+                WHERE memo_key = ? AND owner = ? AND status = 'pending'
+            """, (text, payload, now, memo_key, owner))
+            if cur.rowcount:
+                return "stored"
+            cur = conn.execute("""
+                INSERT INTO request_memo (memo_key, status, owner, lease_expires, text, meta, created_at, updated_at)
+                VALUES (?, 'done', ?, NULL, ?, ?, ?, ?)
+                ON CONFLICT(memo_key) DO UPDATE SET
+                    status = 'done', owner = excluded.owner, lease_expires = NULL,
+                    text = excluded.text, meta = excluded.meta, updated_at = excluded.updated_at
+                WHERE request_memo.status != 'done'
+            """, (memo_key, owner, text, payload, now, now))
+            outcome = "adopted" if cur.rowcount else "skipped"
+        finally:
+            conn.close()
+        log_event("request_memo", "WARNING", "warning", "memo_store_after_lease_lost",
+                  remark=f"领头请求的占位已失效，结果{'仍写入' if outcome == 'adopted' else '已由其他请求写入，丢弃本次'}",
+                  meta={"memo_key": memo_key, "owner": owner, "outcome": outcome})
+        return outcome
+    finally:
+        _finish(memo_key)
+
+
+def release(memo_key: str, owner: str):
+    """领头请求失败：删除占位，等待者会重新竞争领头"""
+    try:
+        conn = connect_with_retry(CACHE_DB)
+        try:
+            conn.execute(
+                "DELETE FROM request_memo WHERE memo_key = ? AND owner = ? AND status = 'pending'", (memo_key, owner)
+            )
+        finally:
+            conn.close()
+    finally:
+        _finish(memo_key)
+
+
+def _pending(memo_key: str) -> bool:
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        row = conn.execute(
+            "SELECT lease_expires FROM request_memo WHERE memo_key = ? AND status = 'pending'", (memo_key,)
+        ).fetchone()
+    finally:
+        conn.close()
+    return bool(row) and (row[0] or 0) >= time.time()
+
+
+def single_flight(memo_key: str, owner: str, wait_seconds: float = None):
+    """
+    返回 ("hit", memo)：已有结果（可能是等到的）；
+         ("leader", None)：本请求负责计算，完成后调用 store / 失败时调用 release；
+         ("timeout", None)：等待超时，本请求直接计算但不写入共享结果。
+    """
+    deadline = time.time() + (REQUEST_MEMO_WAIT_SECONDS if wait_seconds is None else wait_seconds)
+    while True:
+        memo = get(memo_key)
+        if memo:
+            return "hit", memo
+        if acquire(memo_key, owner):
+            return "leader", None
+
+        # 已有其他请求在计算：同进程等 Event，跨进程轮询到领头完成、失败或租约过期
+        with _inflight_lock:
+            event = _inflight.get(memo_key)
+        while _pending(memo_key):
+            if time.time() >= deadline:
+                return "timeout", None
+            if event:
+                event.wait(POLL_INTERVAL)
+            else:
+                time.sleep(POLL_INTERVAL)
+
+
+def purge_expired():
+    """删除过期结果与失效的占位，返回删除条数"""
+    now = time.time()
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        cur = conn.execute(
+            "DELETE FROM request_memo WHERE (status = 'pending' AND lease_expires < ?) OR (status = 'done' AND ? > 0 AND updated_at < ?)",
+            (now, REQUEST_MEMO_TTL_SECONDS, now - REQUEST_MEMO_TTL_SECONDS),
+        )
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+# ✅ 启动时初始化并清理过期结果
+init_memo_table()
+purge_expired()
@@ -0,0 +1,131 @@
+# modules/run_checkpoint.py
+# 提取流程的断点记录：每个阶段完成后把中间结果写入 run_checkpoints 表
+# 合成失败、笔记保存失败或页面刷新后重新提交时，从最后完成的阶段继续，不必重新付费跑分块抽取
+
+import hashlib
+import json
+import threading
+import time
+from config import RUN_CHECKPOINT_TTL_SECONDS
+from modules.logger import connect_with_retry
+from modules.utils.path_helper import CACHE_DB
+
+# 阶段按顺序推进：chunked → reduced → synthesized → done
+STAGES = ("chunked", "reduced", "synthesized", "done")
+
+# 每保存多少次触发一次过期清理（长期运行的进程不能只靠启动时清理）
+PURGE_EVERY_N_SAVES = 50
+
+_lock = threading.Lock()
+_saves = 0
+
+
+def init_checkpoint_table():
+    """确保 run_checkpoints 表存在"""
+    conn = connect_with_retry(CACHE_DB)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS run_checkpoints (
+            run_id TEXT PRIMARY KEY,
+            user_id TEXT,
+            stage TEXT,
+            payload TEXT,
+            created_at REAL,
+            updated_at REAL
+        )
+    """)
+    conn.close()
+
+
+def file_source_ids(files):
+    """[(filename, bytes)] → 每个文件的内容哈希；有原始文件时 run_id / request_memo 都按它计算（同一批上传无论走哪条路径键都相同）"""
+    return [f"file:{hashlib.sha256(data).hexdigest()}" for _, data in files]
+
+
+def make_run_id(texts, *settings) -> str:
+    """资料原文 + 影响输出的全部设置 → run_id；同样的提交得到同样的 run_id"""
+    h = hashlib.sha256()
+    h.update(json.dumps(settings, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8"))
+    for text in texts:
+        h.update(b"\x00")
+        h.update((text or "").encode("utf-8"))
+    return f"run_{h.hexdigest()[:32]}"
+
+
+def load(run_id: str):
+    """返回 {"stage", "payload"}；没有记录或已过期时返回 None"""
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        row = conn.execute(
+            "SELECT stage, payload, updated_at FROM run_checkpoints WHERE run_id = ?", (run_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    stage, payload, updated_at = row
+    if RUN_CHECKPOINT_TTL_SECONDS and time.time() - updated_at > RUN_CHECKPOINT_TTL_SECONDS:
+        return None
+    try:
+        return {"stage": stage, "payload": json.loads(payload)}
+    except ValueError:
+        return None
+
+
+def save(run_id: str, stage: str, payload: dict, user_id=None):
+    """记录某阶段已完成（覆盖之前的阶段）；写入失败只打印，不影响主流程"""
+    if stage not in STAGES:
+        raise ValueError(f"未知阶段: {stage}")
+    now = time.time()
+    try:
+        conn = connect_with_retry(CACHE_DB)
+        try:
+            conn.execute("""
+                INSERT INTO run_checkpoints (run_id, user_id, stage, payload, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(run_id) DO UPDATE SET
+                    stage = excluded.stage, payload = excluded.payload, updated_at = excluded.updated_at
+            """, (run_id, str(user_id) if user_id is not None else None, stage,
+                  json.dumps(payload, ensure_ascii=False), now, now))
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"[CHECKPOINT] 保存失败 {run_id}/{stage}: {e}")
+        return
+
+    global _saves
+    with _lock:
+        _saves += 1
+        should_purge = _saves % PURGE_EVERY_N_SAVES == 0
+    if should_purge:
+        try:
+            purge_expired()
+        except Exception as e:
+            print(f"[CHECKPOINT] 清理过期断点失败: {e}")
+
+
+def discard(run_id: str):
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        conn.execute("DELETE FROM run_checkpoints WHERE run_id = ?", (run_id,))
+    finally:
+        conn.close()
+
+
+def purge_expired():
+    """删除超过 TTL 未更新的断点，返回删除条数"""
+    if not RUN_CHECKPOINT_TTL_SECONDS:
+        return 0
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        cur = conn.execute(
+            "DELETE FROM run_checkpoints WHERE updated_at < ?",
+            (time.time() - RUN_CHECKPOINT_TTL_SECONDS,),
+        )
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+# ✅ 启动时初始化并清理过期断点
+init_checkpoint_table()
+purge_expired()
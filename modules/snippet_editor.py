@@ -0,0 +1,286 @@
+# modules/snippet_editor.py
+# Step 4「提交修改」：多个 (片段, 修改要求) 合并为一次请求、按片段长度限定 max_tokens、
+# 按 (片段哈希, 要求, 语言) 缓存结果 —— 常见的「翻译成英文」等修改重复提交时直接返回
+
+import hashlib
+import re
+import time
+from config import LLM_CACHE_TTL_SECONDS
+from modules.chunk_engine import run_ordered
+from modules.chunker import estimate_tokens
+from modules.lang_detect import detect_language_code
+from modules.logger import connect_with_retry, log_event, log_token_usage
+from modules.utils.path_helper import CACHE_DB
+from modules import model_router
+
+# 修改 prompt 后需要递增，否则会复用旧 prompt 的缓存结果
+EDIT_PROMPT_VERSION = "edit-v1"
+
+EDIT_MIN_TOKENS = 256
+EDIT_MAX_TOKENS = 4000
+# 要求扩写 / 加例子 / 转表格时输出会明显长于原文
+_EXPAND_RE = re.compile(r"详细|展开|扩写|解释|例子|举例|表格|expand|elaborate|explain|example|table", re.IGNORECASE)
+
+_LANG_INSTRUCTIONS = {
+    "en": "Please make sure the output remains in English.",
+    "zh": "请确保输出保持为中文。",
+}
+_RESULT_RE = re.compile(r"<<<RESULT (\d+)>>>[ \t]*\n?(.*?)\n?[ \t]*<<<END RESULT \1>>>", re.DOTALL)
+
+
+def init_edit_table():
+    """确保 edit_cache 表存在"""
+    conn = connect_with_retry(CACHE_DB)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS edit_cache (
+            edit_key TEXT PRIMARY KEY,
+            lang TEXT,
+            instruction TEXT,
+            result TEXT,
+            created_at REAL,
+            last_access REAL
+        )
+    """)
+    conn.close()
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+def edit_key(snippet: str, instruction: str, lang: str) -> str:
+    """片段哈希 + 规整后的要求 + 语言 + prompt 版本 + 路由 → sha256"""
+    h = hashlib.sha256()
+    route = model_router.route_signature("edit")
+    for part in (EDIT_PROMPT_VERSION, route, lang, _normalize(instruction).lower(), snippet.strip()):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def edit_max_tokens(snippet: str, instruction: str) -> int:
+    ratio = 3.0 if _EXPAND_RE.search(instruction or "") else 1.5
+    return max(EDIT_MIN_TOKENS, min(EDIT_MAX_TOKENS, int(estimate_tokens(snippet) * ratio) + 150))
+
+
+def _lookup(keys):
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+    now = time.time()
+    found = {}
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        placeholders = ",".join("?" * len(keys))
+        rows = conn.execute(
+            f"SELECT edit_key, result, last_access FROM edit_cache WHERE edit_key IN ({placeholders})", keys
+        ).fetchall()
+        for key, result, last_access in rows:
+            if LLM_CACHE_TTL_SECONDS and now - last_access > LLM_CACHE_TTL_SECONDS:
+                continue
+            found[key] = result
+        if found:
+            conn.executemany("UPDATE edit_cache SET last_access = ? WHERE edit_key = ?", [(now, k) for k in found])
+    finally:
+        conn.close()
+    return found
+
+
+def _store(items):
+    items = [item for item in items if item.get("result")]
+    if not items:
+        return
+    now = time.time()
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        conn.executemany("""
+            INSERT OR REPLACE INTO edit_cache (edit_key, lang, instruction, result, created_at, last_access)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [(i["key"], i["lang"], _normalize(i["instruction"]), i["result"], now, now) for i in items])
+    finally:
+        conn.close()
+
+
+def purge_expired():
+    """删除超过 TTL 未被使用的修改结果，返回删除条数"""
+    if not LLM_CACHE_TTL_SECONDS:
+        return 0
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        cur = conn.execute("DELETE FROM edit_cache WHERE last_access < ?", (time.time() - LLM_CACHE_TTL_SECONDS,))
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+# ================== Prompt 构造 ==================
+def build_edit_messages(item):
+    lang_instruction = _LANG_INSTRUCTIONS.get(item["lang"][:2], "Keep the same language as the original text.")
+    prompt = f"""以下是文档中的一个片段，请根据用户的需求进行修改。
+注意：保持原文片段的语言风格不变。
+
+原文片段：
+{item["snippet"]}
+
+用户的修改要求：
+{item["instruction"]}
+
+{lang_instruction}
+
+请输出修改后的结果：
+"""
+    return [{"role": "user", "content": prompt}]
+
+
+def build_batch_edit_messages(items):
+    blocks = []
+    for n, item in enumerate(items, start=1):
+        lang_instruction = _LANG_INSTRUCTIONS.get(item["lang"][:2], "Keep the same language as the original text.")
+        blocks.append(
+            f"<<<EDIT {n}>>>\n原文片段：\n{item['snippet']}\n\n用户的修改要求：\n{item['instruction']}\n\n"
+            f"{lang_instruction}\n<<<END EDIT {n}>>>"
+        )
+    prompt = f"""以下是文档中的 {len(items)} 个片段，请根据每个片段各自的修改要求分别修改。
+注意：保持各片段原文的语言风格不变；片段之间互不影响。
+
+{chr(10).join(blocks)}
+
+请按编号依次输出每个片段修改后的结果，格式严格如下，不要输出其他内容：
+<<<RESULT 1>>>
+修改后的内容
+<<<END RESULT 1>>>
+"""
+    return [{"role": "user", "content": prompt}]
+
+
+def parse_batch_output(content: str, n: int):
+    out = [None] * n
+    for m in _RESULT_RE.finditer(content or ""):
+        i = int(m.group(1)) - 1
+        if 0 <= i < n and m.group(2).strip():
+            out[i] = m.group(2).strip()
+    return out
+
+
+# ================== 执行 ==================
+def prepare(pairs, use_cache=True):
+    """
+    pairs: [(snippet, instruction)] → items：
+    {"snippet", "instruction", "lang", "key", "max_tokens", "result"(缓存命中时已有), "hit"}
+    """
+    items = []
+    for snippet, instruction in pairs:
+        lang = detect_language_code(snippet)
+        items.append({
+            "snippet": snippet,
+            "instruction": instruction,
+            "lang": lang,
+            "key": edit_key(snippet, instruction, lang),
+            "max_tokens": edit_max_tokens(snippet, instruction),
+            "result": None,
+            "hit": False,
+        })
+    cached = _lookup([item["key"] for item in items]) if use_cache else {}
+    for item in items:
+        if item["key"] in cached:
+            item["result"], item["hit"] = cached[item["key"]], True
+    return items
+
+
+def _log_calls(calls, user_id, request_id):
+    """记录路由调用的 token（含升级）与路由统计"""
+    for call in calls:
+        usage = call["usage"]
+        if usage:
+            log_token_usage(
+                user_id=user_id,
+                model=call["model"],
+                prompt_tokens=usage["prompt_tokens"],
+                completion_tokens=usage["completion_tokens"],
+                total_tokens=usage["total_tokens"],
+                request_id=request_id,
+                stage="edit",
+            )
+    stats = model_router.RouteStats()
+    stats.add("edit", calls)
+    stats.log("snippet_editor", request_id=request_id)
+
+
+def stream_edit(client, item, use_cache=True, user_id=None, request_id=None):
+    """单个片段：逐段 yield 修改结果（交给 st.write_stream），结束后写入 item["result"] 并缓存"""
+    result = {}
+    yield from model_router.stream(
+        client,
+        "edit",
+        build_edit_messages(item),
+        max_tokens=item["max_tokens"],
+        accept=lambda out: bool(out and out.strip()),
+        use_cache=use_cache,
+        result=result,
+    )
+    item["result"] = result.get("content", "").strip()
+    item["ttft"] = result.get("ttft")
+    _log_calls(result["calls"], user_id, request_id)
+    _store([item])
+
+
+def run_batch(client, items, use_cache=True, user_id=None, request_id=None):
+    """
+    多个片段合并为一次请求；输出里缺失 / 格式不对的片段再单独并发补发。
+    结果写入各 item["result"]，返回本次实际发出的请求数。
+    单独补发仍失败的片段 result 留空、错误写入 item["error"]，其余片段照常返回并缓存。
+    """
+    pending = [item for item in items if not item.get("result")]
+    if not pending:
+        return 0
+    calls = 0
+    if len(pending) > 1:
+        # 级联：有片段没按 RESULT 格式返回时升级模型；整批请求失败时全部交给下面单独补发
+        try:
+            content, route_calls = model_router.complete(
+                client,
+                "edit",
+                build_batch_edit_messages(pending),
+                max_tokens=min(EDIT_MAX_TOKENS * 2, sum(item["max_tokens"] for item in pending) + 30 * len(pending)),
+                accept=lambda out: all(parse_batch_output(out, len(pending))),
+                use_cache=use_cache,
+            )
+        except Exception as e:
+            log_event("snippet_editor", "WARNING", "warning", "edit_batch_failed", remark=str(e),
+                      meta={"request_id": request_id, "items": len(pending)})
+        else:
+            calls += len(route_calls)
+            _log_calls(route_calls, user_id, request_id)
+            for item, output in zip(pending, parse_batch_output(content, len(pending))):
+                item["result"] = output
+
+    retry = [item for item in pending if not item.get("result")]
+
+    def _single(item):
+        return model_router.complete(
+            client,
+            "edit",
+            build_edit_messages(item),
+            max_tokens=item["max_tokens"],
+            accept=lambda out: bool(out and out.strip()),
+            use_cache=use_cache,
+        )
+
+    for item, (ok, value) in zip(retry, run_ordered(_single, retry)):
+        if not ok:
+            item["result"], item["error"] = "", str(value)
+            log_event("snippet_editor", "WARNING", "warning", "edit_item_failed", remark=str(value),
+                      meta={"request_id": request_id, "edit_key": item["key"], "instruction": item["instruction"]})
+            continue
+        content, route_calls = value
+        calls += len(route_calls)
+        item["result"] = (content or "").strip()
+        _log_calls(route_calls, user_id, request_id)
+
+    _store(pending)
+    return calls
+
+
+# ✅ 启动时初始化并清理过期结果
+init_edit_table()
+purge_expired()
@@ -0,0 +1,159 @@
+# modules/subject_classifier.py
+# 学科识别：所有学科的关键词编译进同一个前缀树正则，一次扫描统计全部命中，按加权得分给出分布
+# 替代逐关键词 `kw in text` 的多次全文扫描，也不会因为一个零星的 "{" 就把历史讲义判成 code
+
+import json
+import os
+import re
+import threading
+from config import SUBJECT_KEYWORDS_FILE
+
+# subject -> {keyword: weight}；符号类、过于常见的关键词降权
+DEFAULT_SUBJECT_KEYWORDS = {
+    "code": {"def ": 1.0, "class ": 1.0, "import ": 1.0, "{": 0.1, "}": 0.1, "function": 0.5,
+             "程序": 1.0, "代码": 1.0, "编程": 1.0},
+    "math": {"公式": 1.0, "定理": 1.0, "证明": 1.0, "方程": 1.0, "函数": 1.0, "微积分": 1.0,
+             "matrix": 1.0, "theorem": 1.0},
+    "physics": {"力学": 1.0, "电磁": 1.0, "量子": 1.0, "热力学": 1.0, "波动": 1.0, "newton": 1.0, "einstein": 1.0},
+    "chemistry": {"化学式": 1.0, "分子": 1.0, "反应": 1.0, "酸碱": 1.0, "化合物": 1.0, "reaction": 1.0},
+    "engineering": {"电路": 1.0, "结构": 1.0, "控制系统": 1.0, "机械": 1.0, "材料力学": 1.0},
+    "theory": {"概念": 1.0, "定义": 1.0, "章节": 1.0, "理论": 1.0, "原理": 1.0, "模型": 1.0},
+}
+
+# 最高分低于该值时判为 general（避免零星命中决定学科）
+MIN_SCORE = 2.0
+
+
+def _normalize_keyword_sets(keyword_sets) -> dict:
+    """接受 {subject: [kw, ...]} 或 {subject: {kw: weight}}，统一成小写关键词 → 权重"""
+    normalized = {}
+    for subject, kws in (keyword_sets or {}).items():
+        if isinstance(kws, dict):
+            items = kws.items()
+        else:
+            items = ((kw, 1.0) for kw in kws)
+        bucket = normalized.setdefault(subject, {})
+        for kw, weight in items:
+            if kw and str(kw).strip():
+                bucket[str(kw).lower()] = float(weight)
+    return normalized
+
+
+def merge_keyword_sets(base, extra) -> dict:
+    """extra 中的学科追加到 base（同名学科合并关键词，后者覆盖权重）"""
+    merged = {s: dict(kws) for s, kws in _normalize_keyword_sets(base).items()}
+    for subject, kws in _normalize_keyword_sets(extra).items():
+        merged.setdefault(subject, {}).update(kws)
+    return merged
+
+
+def _trie_regex(words) -> str:
+    """把关键词建成前缀树再转成正则：共享前缀只比较一次，贪婪匹配取最长关键词"""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def to_regex(node):
+        end = "" in node
+        alts = [re.escape(ch) + to_regex(child) for ch, child in sorted(node.items()) if ch != ""]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 and not end else "(?:" + "|".join(alts) + ")"
+        return body + "?" if end else body
+
+    return to_regex(trie)
+
+
+class SubjectClassifier:
+    """多模式关键词匹配器：一次扫描得到所有学科的加权命中数"""
+
+    def __init__(self, keyword_sets):
+        self.keyword_sets = _normalize_keyword_sets(keyword_sets)
+        # 同一关键词可以属于多个学科
+        self._targets = {}
+        for subject, kws in self.keyword_sets.items():
+            for kw, weight in kws.items():
+                self._targets.setdefault(kw, []).append((subject, weight))
+        self._pattern = re.compile(_trie_regex(self._targets)) if self._targets else None
+
+    def scores(self, text: str) -> dict:
+        """{subject: 加权命中数}（没有命中的学科不出现）"""
+        result = {}
+        if not text or self._pattern is None:
+            return result
+        for m in self._pattern.finditer(text.lower()):
+            for subject, weight in self._targets.get(m.group(), ()):
+                result[subject] = result.get(subject, 0.0) + weight
+        return result
+
+    def classify(self, text: str):
+        """返回 (学科, 归一化分布)"""
+        return label_from_scores(self.scores(text))
+
+
+def label_from_scores(scores: dict):
+    """加权命中数 → (学科, 归一化分布)；最高分不足 MIN_SCORE 时为 general"""
+    total = sum(scores.values())
+    if not total:
+        return "general", {}
+    distribution = {s: round(v / total, 3) for s, v in sorted(scores.items(), key=lambda kv: -kv[1])}
+    best, best_score = max(scores.items(), key=lambda kv: kv[1])
+    return (best if best_score >= MIN_SCORE else "general"), distribution
+
+
+def _load_keyword_file(path):
+    """SUBJECT_KEYWORDS_FILE：JSON 格式的额外学科关键词，与默认集合合并"""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception as e:
+        print(f"[SUBJECT] 关键词文件读取失败: {e}")
+        return {}
+
+
+_base_keywords = merge_keyword_sets(DEFAULT_SUBJECT_KEYWORDS, _load_keyword_file(SUBJECT_KEYWORDS_FILE))
+_default_classifier = SubjectClassifier(_base_keywords)
+_custom_classifiers = {}
+_custom_lock = threading.Lock()
+
+
+def get_classifier(extra_keywords=None) -> SubjectClassifier:
+    """默认分类器；传入用户自定义关键词集时返回合并后的分类器（按内容缓存编译结果）"""
+    if not extra_keywords:
+        return _default_classifier
+    cache_key = json.dumps(_normalize_keyword_sets(extra_keywords), sort_keys=True, ensure_ascii=False)
+    with _custom_lock:
+        classifier = _custom_classifiers.get(cache_key)
+        if classifier is None:
+            if len(_custom_classifiers) >= 64:
+                _custom_classifiers.clear()
+            classifier = SubjectClassifier(merge_keyword_sets(_base_keywords, extra_keywords))
+            _custom_classifiers[cache_key] = classifier
+        return classifier
+
+
+def classify_texts(texts, extra_keywords=None):
+    """
+    按文件分别打分，再汇总得到整体学科（不需要再扫描拼接后的全文）。
+    返回 (整体学科, 整体分布, [(文件学科, 文件分布), ...])
+    """
+    classifier = get_classifier(extra_keywords)
+    total = {}
+    per_file = []
+    for text in texts:
+        scores = classifier.scores(text)
+        per_file.append(label_from_scores(scores))
+        for subject, value in scores.items():
+            total[subject] = total.get(subject, 0.0) + value
+    label, distribution = label_from_scores(total)
+    return label, distribution, per_file
+
+
+def detect_subject(text: str, extra_keywords=None) -> str:
+    return get_classifier(extra_keywords).classify(text)[0]
@@ -3,10 +3,13 @@
 import streamlit as st
 from modules import file_parser, extractor
 from config import OPENAI_API_KEY
-import openai
-from langdetect import detect
 from modules.logger import log_event
 from modules.auth.user_memory import record_user_edit
+from modules.llm_client import get_client
+from modules import snippet_editor
+from modules import job_queue, run_checkpoint
+from modules.utils.path_helper import JOBS_DIR
+import json, os, time, uuid
 
 # === 模块健康状态上报 ===
 from modules.utils.system_status import update_module_status
@@ -16,6 +19,13 @@ try:
 except Exception as e:
     update_module_status("summary_generator", "error", str(e))
 
+def _summary_notice(stats):
+    """生成结果里需要提示用户的情况（目前只有：选了双语但原文已是目标语言）"""
+    if stats and stats.get("translation_skipped"):
+        return "ℹ️ 资料本身已是目标语言，双语模式没有额外生成译文。"
+    return None
+
+
 # ================= 原有导航栏函数 =================
 def navigation_buttons(prev_label=None, next_label=None, prev_step=None, next_step=None):
     st.markdown(
@@ -89,7 +99,9 @@ def run():
             for key in ["uploaded_files", "summary", "step",
                         "bilingual", "target_lang", "style",
                         "pending_new_text", "pending_selected_text",
-                        "pending_user_request", "show_pending", "parsed_texts"]:
+                        "pending_user_request", "show_pending", "parsed_texts",
+                        "pending_edits", "edit_queue", "extract_job_id",
+                        "parse_job_id", "parse_job_sig"]:
                 st.session_state.pop(key, None)
             st.session_state["step"] = 1
             st.rerun()
@@ -105,32 +117,16 @@ def run():
     st.markdown(f"### 当前进度：{steps[current_step - 1]}")
 
     # ================= 性能优化部分（并行 + 缓存函数） =================
-    from concurrent.futures import ThreadPoolExecutor
-
     @st.cache_data(show_spinner=False)
-    def cached_extract(file_bytes, file_name):
-        """缓存解析结果：以 (bytes, filename) 为 key"""
-        import io
-        from modules import file_parser
-        return file_parser.extract_text_from_file(io.BytesIO(file_bytes), file_name)
+    def cached_parse(files):
+        """缓存解析结果：以 ((filename, bytes), ...) 为 key"""
+        from modules import parse_engine
+        texts, _ = parse_engine.parse_files(files)
+        return texts
 
     def extract_texts_parallel(files):
-        """并行解析多个 Streamlit UploadedFile 列表（返回 list[str]）"""
-        results = []
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            futures = []
-            for f in files:
-                # f is streamlit.uploaded_file.UploadedFile
-                futures.append(
-                    executor.submit(
-                        cached_extract,
-                        f.getvalue(),  # bytes
-                        f.name
-                    )
-                )
-            for fut in futures:
-                results.append(fut.result())
-        return results
+        """多进程解析多个 Streamlit UploadedFile 列表（按文件 / PDF 页区间拆分，返回 list[str]）"""
+        return cached_parse(tuple((f.name, f.getvalue()) for f in files))
     # =================================================
 
     # ---------- Step 1: 上传文件 ----------
@@ -142,13 +138,43 @@ def run():
             type=["pdf", "docx", "txt", "pptx"]
         )
 
+        parse_in_background = st.checkbox(
+            "🧵 后台解析",
+            value=False,
+            key="parse_in_background",
+            help="大文件交给后台 worker 解析（需运行 scripts/job_worker.py），解析期间页面可刷新"
+        )
+
         # 用户上传了新文件：写入 session 并触发解析（清理旧解析）
-        if new_uploads:
+        if new_uploads and parse_in_background:
+            # 同一批文件只提交一次，轮询期间的 rerun 不重复提交
+            upload_sig = [(f.name, f.size) for f in new_uploads]
+            st.session_state["uploaded_files"] = new_uploads
+            uploaded_files = new_uploads
+            if st.session_state.get("parse_job_sig") != upload_sig:
+                log_event("summary_generator", "INFO", "work", "用户上传文件", meta={"count": len(new_uploads)})
+                st.session_state.pop("parsed_texts", None)
+                # 上传内容写入文件，任务行里只放路径
+                files = []
+                for f in new_uploads:
+                    path = os.path.join(JOBS_DIR, f"input_{uuid.uuid4().hex}_{os.path.basename(f.name)}")
+                    with open(path, "wb") as out:
+                        out.write(f.getvalue())
+                    files.append({"name": f.name, "path": path})
+                st.session_state["parse_job_id"] = job_queue.submit(
+                    "parse_files", {"files": files}, user_id=st.session_state.get("user_id", "guest")
+                )
+                st.session_state["parse_job_sig"] = upload_sig
+                log_event("summary_generator", "INFO", "work", "文件解析已提交后台任务",
+                          meta={"job_id": st.session_state["parse_job_id"]})
+        elif new_uploads:
             try:
                 log_event("summary_generator", "INFO", "work", "用户上传文件", meta={"count": len(new_uploads)})
                 st.session_state["uploaded_files"] = new_uploads
                 uploaded_files = new_uploads  
                 st.session_state.pop("parsed_texts", None)
+                st.session_state.pop("parse_job_id", None)
+                st.session_state.pop("parse_job_sig", None)
 
                 with st.spinner("⏳ 正在解析文件..."):
                     st.session_state["parsed_texts"] = extract_texts_parallel(new_uploads)
@@ -159,6 +185,32 @@ def run():
                 log_event("summary_generator", "ERROR", "down", "文件解析失败", remark=str(e), reason="文件解析异常")
                 st.error(f"❌ 文件解析出错：{e}")
 
+        # ---------- 后台解析：轮询进度 ----------
+        parse_job_id = st.session_state.get("parse_job_id")
+        if parse_job_id:
+            job = job_queue.get(parse_job_id)
+            if job is None:
+                st.session_state.pop("parse_job_id", None)
+            elif job["status"] == "success":
+                with open(job["result_path"], encoding="utf-8") as f:
+                    st.session_state["parsed_texts"] = json.load(f)
+                st.session_state.pop("parse_job_id", None)
+                log_event("summary_generator", "INFO", "work", "文件解析成功（后台任务）",
+                          meta={"job_id": parse_job_id, "chars": job["meta"].get("chars")})
+                st.success("✅ 文件解析完成！")
+            elif job["status"] in job_queue.FINAL_STATUSES:
+                st.error(f"❌ 后台解析失败：{job.get('error_message') or job['status']}")
+                st.session_state.pop("parse_job_id", None)
+            else:
+                message = job["meta"].get("message") or ("排队中..." if job["status"] == "pending" else "解析中...")
+                st.progress(job.get("progress") or 0, text=f"🧵 后台解析 #{parse_job_id}：{message}")
+                if st.button("✖️ 取消解析", key="cancel_parse_job"):
+                    job_queue.cancel(parse_job_id)
+                    st.session_state.pop("parse_job_id", None)
+                    st.rerun()
+                time.sleep(2)
+                st.rerun()
+
         # 如果 session 中已有 parsed_texts（来自之前上传），也显示预览
         if uploaded_files and st.session_state.get("parsed_texts"):
             for uf, preview_text in zip(uploaded_files, st.session_state["parsed_texts"]):
@@ -292,33 +344,134 @@ def run():
         parsed_texts = st.session_state.get("parsed_texts", [])
 
         if parsed_texts and uploaded_files:
+            # request_memo / 断点按上传文件内容计算，与后台 files= 路径的键一致
+            source_ids = run_checkpoint.file_source_ids((f.name, f.getvalue()) for f in uploaded_files)
             st.subheader("📂 文件预览")
             file_parser.preview_files(uploaded_files)
 
+            bypass_cache = st.checkbox(
+                "🔁 忽略缓存，重新生成",
+                value=False,
+                key="bypass_cache",
+                help="默认会复用相同资料与设置的历史结果（不消耗 token）"
+            )
+
+            use_prefilter = st.checkbox(
+                "✂️ 预筛选低信息量内容",
+                value=False,
+                key="use_prefilter",
+                help="抽取前去掉参考文献、版权声明等低相关句子，减少 token 消耗（可能略去少量细节）"
+            )
+
+            run_in_background = st.checkbox(
+                "🧵 后台生成",
+                value=False,
+                key="run_in_background",
+                help="交给后台 worker 生成（需运行 scripts/job_worker.py），页面刷新或断开不会中断任务"
+            )
+
+            # ---------- 后台任务：轮询进度 ----------
+            job_id = st.session_state.get("extract_job_id")
+            if job_id:
+                job = job_queue.get(job_id)
+                if job is None:
+                    st.session_state.pop("extract_job_id", None)
+                elif job["status"] == "success":
+                    with open(job["result_path"], encoding="utf-8") as f:
+                        st.session_state["summary"] = f.read()
+                    st.session_state["summary_notice"] = _summary_notice(job["meta"].get("stats"))
+                    st.session_state.pop("extract_job_id", None)
+                    log_event("summary_generator", "INFO", "work", "AI提取完成（后台任务）",
+                              meta={"job_id": job_id, "run_id": job["meta"].get("run_id")})
+                    st.session_state["step"] = 4
+                    st.rerun()
+                elif job["status"] in job_queue.FINAL_STATUSES:
+                    st.error(f"❌ 后台任务失败：{job.get('error_message') or job['status']}")
+                    st.session_state.pop("extract_job_id", None)
+                else:
+                    message = job["meta"].get("message") or ("排队中..." if job["status"] == "pending" else "运行中...")
+                    st.progress(job.get("progress") or 0, text=f"🧵 后台任务 #{job_id}：{message}")
+                    if job["status"] == "pending" and job.get("error_message"):
+                        st.caption(f"上次尝试失败，稍后自动重试：{job['error_message']}")
+                    if st.button("✖️ 取消任务", key="cancel_extract_job"):
+                        job_queue.cancel(job_id)
+                        st.session_state.pop("extract_job_id", None)
+                        st.rerun()
+                    time.sleep(2)
+                    st.rerun()
+
             col_extract, col_back = st.columns([1, 1])
             with col_extract:
-                if st.button("📑 提取重点", key="extract_step3"):
+                clicked = st.button("📑 提取重点", key="extract_step3", disabled=bool(job_id))
+                if clicked and run_in_background:
+                    # 解析结果写入文件，任务行里只放路径
+                    texts_path = os.path.join(JOBS_DIR, f"input_{uuid.uuid4().hex}.json")
+                    with open(texts_path, "w", encoding="utf-8") as f:
+                        json.dump(parsed_texts, f, ensure_ascii=False)
+                    user_id = st.session_state.get("user_id", "guest")
+                    st.session_state["extract_job_id"] = job_queue.submit("generate_notes", {
+                        "texts_path": texts_path,
+                        "user_id": user_id,
+                        "settings": {
+                            "bilingual": st.session_state.get("bilingual", False),
+                            "target_lang": st.session_state.get("target_lang", "zh"),
+                            "mode": st.session_state.get("style", "default"),
+                            "generate_mock": st.session_state.get("need_exam_questions", False),
+                            "custom_instruction": st.session_state.get("custom_instruction"),
+                            "use_cache": not bypass_cache,
+                            "subject_keywords": st.session_state.get("subject_keywords"),
+                            "prefilter": use_prefilter or None,
+                            "share_results": st.session_state.get("share_results"),
+                            "source_ids": source_ids,
+                        },
+                    }, user_id=user_id)
+                    log_event("summary_generator", "INFO", "work", "AI提取已提交后台任务",
+                              meta={"job_id": st.session_state["extract_job_id"]})
+                    st.rerun()
+                elif clicked:
                     log_event("summary_generator", "INFO", "work", "AI提取开始")
                     try:
+                        # 合成阶段逐段显示；分块抽取阶段仍在 spinner 中等待首段输出
+                        extract_result = {}
                         with st.spinner("AI 正在分析中..."):
-                            summary = extractor.extract_summary(
+                            stream = extractor.extract_summary_stream(
                                 texts=parsed_texts,
                                 api_key=OPENAI_API_KEY,
                                 bilingual=st.session_state.get("bilingual", False),
                                 target_lang=st.session_state.get("target_lang", "zh"),
                                 mode=st.session_state.get("style", "default"),
                                 generate_mock=st.session_state.get("need_exam_questions", False),
-                                custom_instruction=st.session_state.get("custom_instruction")
+                                custom_instruction=st.session_state.get("custom_instruction"),
+                                use_cache=not bypass_cache,
+                                result=extract_result,
+                                subject_keywords=st.session_state.get("subject_keywords"),
+                                prefilter=use_prefilter or None,
+                                share_results=st.session_state.get("share_results"),
+                                source_ids=source_ids,
                             )
-                            if summary.strip():
-                                st.session_state["summary"] = summary
-                                st.success("✅ 提取完成！")
-                                st.session_state["step"] = 4
-                                log_event("summary_generator", "INFO", "work", "AI提取完成")
-                                st.rerun()
+                            first_piece = next(stream, "")
+
+                        def _replay():
+                            yield first_piece
+                            yield from stream
+
+                        st.write_stream(_replay())
+                        summary = extract_result.get("text", "")
+                        if summary.strip():
+                            st.session_state["summary"] = summary
+                            st.session_state["summary_notice"] = _summary_notice(extract_result.get("stats"))
+                            st.success("✅ 提取完成！")
+                            st.session_state["step"] = 4
+                            log_event("summary_generator", "INFO", "work", "AI提取完成",
+                                      meta={"run_id": extract_result.get("run_id"),
+                                            "resumed_from": extract_result.get("resumed_from"),
+                                            "memo_hit": extract_result.get("memo_hit", False)})
+                            st.rerun()
                     except Exception as e:
                         log_event("summary_generator", "ERROR", "down", "AI提取失败", remark=str(e), reason="模型调用失败")
                         st.error(f"❌ AI 提取失败：{e}")
+                        if extract_result.get("run_id") and not bypass_cache:
+                            st.info("💾 已完成的阶段已保存，再次点击「提取重点」将从中断处继续。")
             with col_back:
                 if st.button("⬅️ 上一步", key="prev_step3"):
                     st.session_state["step"] = 2
@@ -333,6 +486,8 @@ def run():
         summary_text = st.session_state.get("summary", "")
 
         if summary_text.strip():
+            if st.session_state.get("summary_notice"):
+                st.info(st.session_state["summary_notice"])
             # ✅ 显示生成的总结内容
             st.code(summary_text, language="text")
             st.caption("⬆️ 点击右上角的 📋 按钮即可复制内容")
@@ -353,122 +508,147 @@ def run():
                 key="user_request_input"
             )
 
+            # 多处修改先加入列表，最后一次提交（合并为一个请求）
+            edit_queue = st.session_state.setdefault("edit_queue", [])
+            if st.button("➕ 加入修改列表", key="queue_modification"):
+                if not selected_text.strip() or not user_request.strip():
+                    st.warning("⚠️ 请先粘贴片段并输入修改要求")
+                else:
+                    edit_queue.append({"snippet": selected_text, "instruction": user_request})
+
+            if edit_queue:
+                st.markdown(f"**待提交的修改（{len(edit_queue)}）**")
+                for idx, pair in enumerate(edit_queue):
+                    col_item, col_remove = st.columns([8, 1])
+                    with col_item:
+                        st.caption(f"{idx + 1}. 「{pair['snippet'][:40]}…」→ {pair['instruction']}")
+                    with col_remove:
+                        if st.button("🗑", key=f"remove_edit_{idx}"):
+                            edit_queue.pop(idx)
+                            st.rerun()
+
             # ======== 提交修改请求 ========
             if st.button("提交修改", key="submit_modification"):
-                if not selected_text.strip() or not user_request.strip():
+                pairs = [(p["snippet"], p["instruction"]) for p in edit_queue]
+                if selected_text.strip() and user_request.strip() and (selected_text, user_request) not in pairs:
+                    pairs.append((selected_text, user_request))
+                if not pairs:
                     st.warning("⚠️ 请先粘贴片段并输入修改要求")
                 else:
                     try:
-                        lang = detect(selected_text)
-                    except:
-                        lang = "en"
-
-                    lang_instruction = {
-                        "en": "Please make sure the output remains in English.",
-                        "zh": "请确保输出保持为中文。"
-                    }.get(lang[:2], "Keep the same language as the original text.")
-
-                    with st.spinner("AI 正在修改中..."):
-                        try:
-                            client = openai.OpenAI(api_key=OPENAI_API_KEY)
-                            prompt = f"""以下是文档中的一个片段，请根据用户的需求进行修改。
-    注意：保持原文片段的语言风格不变。
-
-    原文片段：
-    {selected_text}
-
-    用户的修改要求：
-    {user_request}
-
-    {lang_instruction}
-
-    请输出修改后的结果：
-    """
-                            response = client.chat.completions.create(
-                                model="gpt-4o-mini",
-                                messages=[{"role": "user", "content": prompt}]
-                            )
-                            new_text = response.choices[0].message.content.strip()
-
-                            # ======== 保存修改结果到 session ========
-                            st.session_state["pending_original"] = selected_text
-                            st.session_state["pending_new"] = new_text
-                            st.session_state["pending_request"] = user_request
-                            st.session_state["show_pending"] = True
-
-                            log_event(
-                                "summary_generator", "INFO", "change",
-                                "AI 修改完成",
-                                meta={"request": user_request, "lang": lang}
-                            )
-                            st.rerun()
+                        edit_start = time.time()
+                        request_id = f"edit_{int(edit_start)}"
+                        user_id = st.session_state.get("user_id")
+                        items = snippet_editor.prepare(pairs)
+                        missing = [item for item in items if not item["result"]]
+                        calls = 0
+                        if len(missing) == 1:
+                            # 只有一处需要调用模型：流式显示
+                            st.markdown("**AI 正在修改中…**")
+                            st.write_stream(snippet_editor.stream_edit(
+                                get_client(OPENAI_API_KEY), missing[0], user_id=user_id, request_id=request_id
+                            ))
+                            calls = 1
+                        elif missing:
+                            with st.spinner(f"AI 正在修改 {len(missing)} 处片段…"):
+                                calls = snippet_editor.run_batch(
+                                    get_client(OPENAI_API_KEY), missing, user_id=user_id, request_id=request_id
+                                )
+
+                        # ======== 保存修改结果到 session ========
+                        st.session_state["pending_edits"] = [
+                            {"original": item["snippet"], "new": item["result"] or "",
+                             "request": item["instruction"], "hit": item["hit"], "error": item.get("error")}
+                            for item in items
+                        ]
+                        st.session_state["show_pending"] = True
+                        st.session_state["edit_queue"] = []
+
+                        log_event(
+                            "summary_generator", "INFO", "change",
+                            "AI 修改完成",
+                            meta={
+                                "requests": [item["instruction"] for item in items],
+                                "langs": [item["lang"] for item in items],
+                                "cache_hits": sum(item["hit"] for item in items),
+                                "failed": sum(bool(item.get("error")) for item in items),
+                                "llm_calls": calls,
+                                "ttft": round(missing[0]["ttft"], 2) if len(missing) == 1 and missing[0].get("ttft") else None,
+                                "duration": round(time.time() - edit_start, 2),
+                            }
+                        )
+                        st.rerun()
 
-                        except Exception as e:
-                            log_event(
-                                "summary_generator", "ERROR", "down",
-                                "AI 修改失败",
-                                remark=str(e),
-                                reason="模型调用异常"
-                            )
-                            st.error(f"❌ AI 修改失败：{e}")
+                    except Exception as e:
+                        log_event(
+                            "summary_generator", "ERROR", "down",
+                            "AI 修改失败",
+                            remark=str(e),
+                            reason="模型调用异常"
+                        )
+                        st.error(f"❌ AI 修改失败：{e}")
 
             # ======== 显示修改对比结果 ========
             if st.session_state.get("show_pending"):
                 st.markdown("### 🔍 修改对比结果")
-                col1, col2 = st.columns(2)
-
-                with col1:
-                    st.subheader("原文片段")
-                    st.text_area(
-                        "原文",
-                        st.session_state.get("pending_original", ""),
-                        height=200,
-                        key="pending_original_text"
-                    )
-
-                with col2:
-                    st.subheader("修改后")
-                    st.text_area(
-                        "修改后",
-                        st.session_state.get("pending_new", ""),
-                        height=200,
-                        key="pending_new_text"
-                    )
+                pending_edits = st.session_state.get("pending_edits", [])
+                selected = []
+                for idx, edit in enumerate(pending_edits):
+                    if len(pending_edits) > 1:
+                        st.markdown(f"**{idx + 1}. {edit['request']}**" + ("（缓存）" if edit["hit"] else ""))
+                    if edit.get("error"):
+                        st.error(f"❌ 这一处修改失败：{edit['error']}")
+                        continue
+                    col1, col2 = st.columns(2)
+
+                    with col1:
+                        st.subheader("原文片段")
+                        st.text_area("原文", edit["original"], height=200, key=f"pending_original_text_{idx}")
+
+                    with col2:
+                        st.subheader("修改后")
+                        st.text_area("修改后", edit["new"], height=200, key=f"pending_new_text_{idx}")
+
+                    if st.checkbox("应用这一处", value=True, key=f"apply_pending_{idx}"):
+                        selected.append(edit)
 
                 # ======== 确认或取消修改 ========
                 col_apply, col_cancel = st.columns(2)
 
                 with col_apply:
                     if st.button("✅ 应用修改", key="apply_pending"):
-                        original = st.session_state.get("pending_original")
-                        new = st.session_state.get("pending_new")
-                        request = st.session_state.get("pending_request")
-
-                        if original and original in st.session_state["summary"]:
-                            st.session_state["summary"] = st.session_state["summary"].replace(original, new, 1)
-
-                            # ✅✅✅ 新增：记录用户修改行为（保存修改习惯）
-                            user_id = st.session_state.get("user", {}).get("id")
-                            if user_id:
-                                record_user_edit(user_id, original, new, request)
-
-                            log_event(
-                                "summary_generator", "INFO", "change",
-                                "用户应用修改",
-                                meta={"request": request}
-                            )
-
+                        not_found = []
+                        for edit in selected:
+                            original, new, request = edit["original"], edit["new"], edit["request"]
+                            if original and new and original in st.session_state["summary"]:
+                                st.session_state["summary"] = st.session_state["summary"].replace(original, new, 1)
+
+                                # ✅✅✅ 新增：记录用户修改行为（保存修改习惯）
+                                user_id = st.session_state.get("user", {}).get("id")
+                                if user_id:
+                                    record_user_edit(user_id, original, new, request)
+
+                                log_event(
+                                    "summary_generator", "INFO", "change",
+                                    "用户应用修改",
+                                    meta={"request": request}
+                                )
+                            else:
+                                not_found.append(edit)
+
+                        if not_found:
+                            st.session_state["pending_edits"] = not_found
+                            st.warning("⚠️ 部分片段未能在原文中找到，可能已被修改或不完全匹配。")
+                        else:
                             # 清理状态
-                            for k in ["pending_original", "pending_new", "pending_request", "show_pending"]:
+                            for k in ["pending_edits", "show_pending"]:
                                 st.session_state.pop(k, None)
                             st.success("✅ 修改已应用！")
                             st.rerun()
-                        else:
-                            st.warning("⚠️ 未能在原文中找到待替换的片段，可能已被修改或不完全匹配。")
 
                 with col_cancel:
                     if st.button("❌ 取消修改", key="cancel_pending"):
-                        for k in ["pending_original", "pending_new", "pending_request", "show_pending"]:
+                        for k in ["pending_edits", "show_pending"]:
                             st.session_state.pop(k, None)
                         log_event("summary_generator", "INFO", "work", "用户取消修改")
                         st.info("已取消修改。")
@@ -0,0 +1,248 @@
+# modules/translation_memory.py
+# 双语模式的翻译阶段：笔记按小节切分、按句子查翻译记忆，只把没见过的句子分批并行发给模型
+# 翻译记忆以规整后的句子哈希为 key 存在 cache.db，跨笔记、跨用户复用（常见定义、标题只翻译一次）
+
+import hashlib
+import re
+import time
+import unicodedata
+from config import LLM_CACHE_TTL_SECONDS
+from modules.chunk_engine import run_ordered
+from modules.chunker import estimate_tokens
+from modules.logger import connect_with_retry
+from modules.utils.path_helper import CACHE_DB
+
+# 行首的 Markdown 结构（标题 / 引用 / 列表 / 编号）原样保留，只翻译后面的正文
+_PREFIX_RE = re.compile(r"^(\s*(?:#{1,6}\s+|>\s*|[-*+]\s+|\d+[.)]\s+)*)(.*?)\s*$")
+_HEADING_RE = re.compile(r"^#{1,6}\s")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[。！？!?；;])\s*|(?<=\.)\s+(?=[A-Z\"'(])")
+_WORD_RE = re.compile(r"[A-Za-z㐀-䶿一-鿿]")
+_NUMBERED_RE = re.compile(r"^\s*\[(\d+)\]\s?(.*)$")
+
+
+def init_translation_table():
+    """确保 translation_memory 表存在"""
+    conn = connect_with_retry(CACHE_DB)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS translation_memory (
+            tm_key TEXT PRIMARY KEY,
+            src_lang TEXT,
+            tgt_lang TEXT,
+            source TEXT,
+            translation TEXT,
+            hits INTEGER DEFAULT 0,
+            created_at REAL,
+            last_access REAL
+        )
+    """)
+    conn.close()
+
+
+def normalize_sentence(sentence: str) -> str:
+    """全角 / 半角统一、压缩空白；大小写保留（专有名词的译法可能不同）"""
+    return " ".join(unicodedata.normalize("NFKC", sentence).split())
+
+
+def tm_key(sentence: str, src_lang: str, tgt_lang: str, model: str) -> str:
+    h = hashlib.sha256()
+    for part in (model, src_lang, tgt_lang, normalize_sentence(sentence)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def load_many(keys):
+    """批量读取，返回 {tm_key: translation}，并累加命中次数"""
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+
+    now = time.time()
+    found = {}
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT tm_key, translation, last_access FROM translation_memory WHERE tm_key IN ({placeholders})",
+                batch,
+            ).fetchall()
+            for key, translation, last_access in rows:
+                if LLM_CACHE_TTL_SECONDS and now - last_access > LLM_CACHE_TTL_SECONDS:
+                    continue
+                found[key] = translation
+
+        if found:
+            conn.executemany(
+                "UPDATE translation_memory SET hits = hits + 1, last_access = ? WHERE tm_key = ?",
+                [(now, key) for key in found],
+            )
+    finally:
+        conn.close()
+    return found
+
+
+def save_many(items, src_lang: str, tgt_lang: str):
+    """批量写入 [(tm_key, source, translation)]"""
+    items = [(k, s, t) for k, s, t in items if t and t.strip()]
+    if not items:
+        return
+
+    now = time.time()
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        conn.executemany("""
+            INSERT OR REPLACE INTO translation_memory
+                (tm_key, src_lang, tgt_lang, source, translation, hits, created_at, last_access)
+            VALUES (?, ?, ?, ?, ?, 0, ?, ?)
+        """, [(k, src_lang, tgt_lang, normalize_sentence(s), t.strip(), now, now) for k, s, t in items])
+    finally:
+        conn.close()
+
+
+def purge_expired():
+    """删除超过 TTL 未被使用的翻译，返回删除条数"""
+    if not LLM_CACHE_TTL_SECONDS:
+        return 0
+    conn = connect_with_retry(CACHE_DB)
+    try:
+        cur = conn.execute(
+            "DELETE FROM translation_memory WHERE last_access < ?",
+            (time.time() - LLM_CACHE_TTL_SECONDS,),
+        )
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+# ================== 切分 / 回填 ==================
+def _parse_note(text: str):
+    """
+    笔记 → 小节列表，每节为行列表；每行为 (prefix, sentences)，不需要翻译的行（空行、代码块、纯符号）
+    sentences 为 None，prefix 为整行原文。
+    """
+    sections, current, in_fence = [], [], False
+    for line in text.split("\n"):
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+            current.append((line, None))
+            continue
+        if _HEADING_RE.match(line) and not in_fence and current:
+            sections.append(current)
+            current = []
+        if in_fence or not _WORD_RE.search(line):
+            current.append((line, None))
+            continue
+        prefix, body = _PREFIX_RE.match(line).groups()
+        sentences = [s.strip() for s in _SENTENCE_SPLIT_RE.split(body) if s.strip()]
+        current.append((prefix, sentences) if sentences else (line, None))
+    if current:
+        sections.append(current)
+    return sections
+
+
+def parse_numbered_output(content: str, n: int):
+    """解析模型按 [i] 编号返回的译文，缺失的编号为 None"""
+    out = [None] * n
+    for line in (content or "").split("\n"):
+        m = _NUMBERED_RE.match(line)
+        if m:
+            i = int(m.group(1)) - 1
+            if 0 <= i < n and m.group(2).strip() and out[i] is None:
+                out[i] = m.group(2).strip()
+    return out
+
+
+def _pack(section_sentences, budget):
+    """按小节顺序装箱：整节放入同一批，单节超出预算时再按句子拆开"""
+    batches, current, used = [], [], 0
+    for sentences in section_sentences:
+        for sentence in sentences:
+            tokens = estimate_tokens(sentence)
+            if current and used + tokens > budget:
+                batches.append(current)
+                current, used = [], 0
+            current.append(sentence)
+            used += tokens
+        # 小节边界：剩余预算不足一半时换新批次，尽量不把一节拆到两个请求
+        if current and used > budget / 2:
+            batches.append(current)
+            current, used = [], 0
+    if current:
+        batches.append(current)
+    return batches
+
+
+def translate_markdown(text, translate_batch, src_lang, tgt_lang, model, budget,
+                       max_workers=None, use_memory=True, on_result=None):
+    """
+    text: 合成好的 Markdown 笔记。
+    translate_batch(sentences) -> (list[译文或 None], *info)，会在工作线程中并发调用。
+    on_result(*info)：每个请求完成后在主线程回调（记录 token），info 通常为 (usage, hit)。
+    返回 (译文 Markdown, stats)，stats = {"sentences", "unique", "memory_hits", "translated", "calls", "failed_calls"}
+    """
+    sections = _parse_note(text)
+    keyed = {}
+    for section in sections:
+        for prefix, sentences in section:
+            for sentence in sentences or ():
+                keyed.setdefault(tm_key(sentence, src_lang, tgt_lang, model), sentence)
+
+    translations = load_many(keyed) if use_memory else {}
+    missing_by_section = []
+    seen = set(translations)
+    for section in sections:
+        missing = []
+        for prefix, sentences in section:
+            for sentence in sentences or ():
+                key = tm_key(sentence, src_lang, tgt_lang, model)
+                if key not in seen:
+                    seen.add(key)
+                    missing.append(sentence)
+        missing_by_section.append(missing)
+
+    batches = _pack(missing_by_section, budget)
+    results = run_ordered(translate_batch, batches, max_workers=max_workers)
+    new_items = []
+    failed_calls = 0
+    for batch, (ok, value) in zip(batches, results):
+        if not ok:
+            failed_calls += 1
+            continue
+        outputs, *info = value
+        if on_result:
+            on_result(*info)
+        for sentence, translated in zip(batch, outputs):
+            if translated:
+                key = tm_key(sentence, src_lang, tgt_lang, model)
+                translations[key] = translated
+                new_items.append((key, sentence, translated))
+    save_many(new_items, src_lang, tgt_lang)
+
+    # 回填：缺失的译文保留原句，保证结构完整
+    joiner = "" if tgt_lang == "zh" else " "
+    lines = []
+    for section in sections:
+        for prefix, sentences in section:
+            if sentences is None:
+                lines.append(prefix)
+            else:
+                parts = [translations.get(tm_key(s, src_lang, tgt_lang, model), s) for s in sentences]
+                lines.append(prefix + joiner.join(parts))
+
+    stats = {
+        "sentences": sum(len(s or ()) for section in sections for _, s in section),
+        "unique": len(keyed),
+        "memory_hits": len(keyed) - sum(len(m) for m in missing_by_section),
+        "translated": len(new_items),
+        "calls": len(batches),
+        "failed_calls": failed_calls,
+    }
+    return "\n".join(lines), stats
+
+
+# ✅ 启动时初始化并清理过期翻译
+init_translation_table()
+purge_expired()
@@ -14,9 +14,16 @@ os.makedirs(DB_DIR, exist_ok=True)
 SYSTEM_DB = os.path.join(DB_DIR, "system.db")
 USER_DB = os.path.join(DB_DIR, "user.db")
 LOG_DB = os.path.join(DB_DIR, "log.db")  # ✅ 这行是关键！
+CACHE_DB = os.path.join(DB_DIR, "cache.db")  # LLM 响应缓存等可再生数据
+
+# 后台任务的输入 / 输出文件
+JOBS_DIR = os.path.join(DB_DIR, "jobs")
+os.makedirs(JOBS_DIR, exist_ok=True)
 
 # （可选）调试时打印路径
 if __name__ == "__main__":
     print("SYSTEM_DB:", SYSTEM_DB)
     print("USER_DB:", USER_DB)
     print("LOG_DB:", LOG_DB)
+    print("CACHE_DB:", CACHE_DB)
+    print("JOBS_DIR:", JOBS_DIR)
@@ -1,15 +1,13 @@
 # pages/Export PDF.py
 # 用于让用户手动导出的模块（支持简单 Markdown）
 
-import streamlit as st
 import os
-import re
-from datetime import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, ListFlowable, ListItem
+import time
+
+import streamlit as st
 
+from modules import job_queue
+from modules.pdf_export import save_to_pdf, safe_filename, clean_filename
 from modules.utils.system_status import update_module_status   # ✅ 导入状态更新函数
 
 st.set_page_config(page_title="PDF 导出", layout="wide")
@@ -34,124 +32,67 @@ user_text = st.text_area(
 custom_filename = st.text_input("导出文件名（不需要输入 .pdf）：", "")
 
 
-def clean_text(text: str) -> str:
-    """
-    清理不需要导出的标记，例如 FILE: Document_1
-    """
-    # 去掉 FILE: Document_x 开头的行
-    text = re.sub(r"^FILE: Document_\d+\s*\n?", "", text, flags=re.MULTILINE)
-    return text
-
-
-def save_to_pdf(text, filename="exported_notes.pdf"):
-    """使用 reportlab 将文本导出为 PDF，支持简单 Markdown 格式"""
-
-    # 在导出前清理
-    text = clean_text(text)
-
-    # 输出目录
-    output_dir = "exports"
-    os.makedirs(output_dir, exist_ok=True)
-    pdf_path = os.path.join(output_dir, filename)
-
-    # 创建 PDF
-    doc = SimpleDocTemplate(
-        pdf_path,
-        pagesize=A4,
-        rightMargin=50,
-        leftMargin=50,
-        topMargin=50,
-        bottomMargin=50
-    )
+run_in_background = st.checkbox(
+    "🧵 后台生成",
+    value=False,
+    key="export_in_background",
+    help="长文档交给后台 worker 生成（需运行 scripts/job_worker.py），页面刷新不会中断"
+)
 
-    # 样式
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(
-        name="CustomTitle",
-        fontSize=16,
-        leading=20,
-        spaceAfter=15,
-        textColor=colors.HexColor("#2C3E50"),
-        alignment=1,  # 居中
-    ))
-    styles.add(ParagraphStyle(
-        name="CustomBody",
-        fontSize=11,
-        leading=16,
-        spaceAfter=8,
-    ))
-
-    story = []
-
-    # 添加标题
-    story.append(Paragraph("ExamSOS", styles["CustomTitle"]))
-    story.append(Spacer(1, 12))
-
-    # 添加时间戳
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-    story.append(Paragraph(f"Time export {timestamp}", styles["CustomBody"]))
-    story.append(Spacer(1, 20))
-
-    # 逐行写入正文（解析 Markdown）
-    bullet_items = []
-    for line in text.split("\n"):
-        line = line.strip()
-
-        # 空行
-        if not line:
-            if bullet_items:
-                story.append(ListFlowable(bullet_items, bulletType='bullet'))
-                bullet_items = []
-            story.append(Spacer(1, 12))
-            continue
-
-        # 处理 Markdown 粗体
-        line = re.sub(r"\*\*(.+?)\*\*", r"<b>\1</b>", line)
-
-        # 处理标题
-        if line.startswith("## "):
-            if bullet_items:
-                story.append(ListFlowable(bullet_items, bulletType='bullet'))
-                bullet_items = []
-            story.append(Paragraph(line[3:], styles["Heading2"]))
-        elif line.startswith("# "):
-            if bullet_items:
-                story.append(ListFlowable(bullet_items, bulletType='bullet'))
-                bullet_items = []
-            story.append(Paragraph(line[2:], styles["Heading1"]))
-
-        # 处理列表
-        elif line.startswith("- "):
-            bullet_items.append(ListItem(Paragraph(line[2:], styles["CustomBody"])))
+# ---------- 后台任务：轮询进度 ----------
+job_id = st.session_state.get("export_job_id")
+if job_id:
+    job = job_queue.get(job_id)
+    if job is None:
+        st.session_state.pop("export_job_id", None)
+    elif job["status"] == "success":
+        filename = job["meta"].get("filename") or "exported_notes.pdf"
+        result_path = job.get("result_path")
+        st.session_state.pop("export_job_id", None)
+        if result_path and os.path.exists(result_path):
+            # 读进 session：任务 id 清掉后下载按钮仍在，结果文件之后被清理也不影响
+            with open(result_path, "rb") as f:
+                st.session_state["export_result"] = {"filename": filename, "data": f.read()}
+            update_module_status("export_pdf", "active", f"PDF 生成成功（后台任务）：{filename}")
         else:
-            if bullet_items:
-                story.append(ListFlowable(bullet_items, bulletType='bullet'))
-                bullet_items = []
-            story.append(Paragraph(line, styles["CustomBody"]))
-
-    # 收尾（如果最后还有列表）
-    if bullet_items:
-        story.append(ListFlowable(bullet_items, bulletType='bullet'))
-
-    doc.build(story)
-    return pdf_path
+            st.error("❌ 生成的 PDF 已被清理，请重新生成")
+            update_module_status("export_pdf", "warning", f"后台任务 #{job_id} 的结果文件不存在：{result_path}")
+    elif job["status"] in job_queue.FINAL_STATUSES:
+        st.error(f"❌ 导出失败：{job.get('error_message') or job['status']}")
+        update_module_status("export_pdf", "error", f"PDF 后台生成失败: {job.get('error_message')}")
+        st.session_state.pop("export_job_id", None)
+    else:
+        message = job["meta"].get("message") or ("排队中..." if job["status"] == "pending" else "生成中...")
+        st.progress(job.get("progress") or 0, text=f"🧵 后台任务 #{job_id}：{message}")
+        if st.button("✖️ 取消任务", key="cancel_export_job"):
+            job_queue.cancel(job_id)
+            st.session_state.pop("export_job_id", None)
+            st.rerun()
+        time.sleep(2)
+        st.rerun()
 
 
 # 生成 PDF
 if st.button("📑 生成 PDF"):
-    if user_text.strip():
+    st.session_state.pop("export_result", None)
+    if user_text.strip() and run_in_background:
+        update_module_status("export_pdf", "working", "PDF 生成已提交后台任务")
+        st.session_state["export_job_id"] = job_queue.submit("export_pdf", {
+            "text": user_text,
+            "filename": custom_filename.strip() or None,
+        }, user_id=st.session_state.get("user_id", "guest"))
+        st.rerun()
+    elif user_text.strip():
         # === 状态汇报：模块正在工作 ===
         update_module_status("export_pdf", "working", "正在生成 PDF 文件...")
 
         try:
             # 确定文件名
             if custom_filename.strip():
-                filename = f"{custom_filename.strip()}.pdf"
+                filename = clean_filename(custom_filename)
             else:
                 # 自动用正文第一行作为文件名
-                first_line = user_text.split("\n")[0].strip()
-                safe_title = re.sub(r'[\\/*?:"<>|]', "_", first_line)  # 去掉非法字符
-                filename = f"{safe_title or 'exported_notes'}.pdf"
+                filename = safe_filename(user_text)
 
             # 执行生成 PDF
             pdf_path = save_to_pdf(user_text, filename=filename)
@@ -180,3 +121,15 @@ if st.button("📑 生成 PDF"):
         # 用户没输入内容的情况
         st.warning("⚠️ 请输入内容再生成 PDF")
         update_module_status("export_pdf", "warning", "未输入内容，无法生成 PDF")
+
+# 后台任务生成的 PDF（本次点击生成时已清掉旧结果）
+export_result = st.session_state.get("export_result")
+if export_result:
+    st.success(f"✅ PDF 已生成！文件名：{export_result['filename']}")
+    st.download_button(
+        label="⬇️ 下载 PDF",
+        data=export_result["data"],
+        file_name=export_result["filename"],
+        mime="application/pdf",
+        key="download_export_result"
+    )
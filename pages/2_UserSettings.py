@@ -29,6 +29,8 @@ user_memory = load_user_memory(USER_ID)
 default_lang = user_memory.get("default_lang", "中文")
 default_style = user_memory.get("note_style", "简洁")
 auto_save = user_memory.get("auto_save", True)
+subject_keywords = user_memory.get("subject_keywords") or {}
+share_results = user_memory.get("share_results", True)
 
 # ---------- 表单区域 ----------
 with st.form("user_settings_form"):
@@ -55,6 +57,20 @@ with st.form("user_settings_form"):
 
     auto_save_pref = st.checkbox("自动保存笔记", value=auto_save)
 
+    share_results_pref = st.checkbox(
+        "共享整篇笔记结果",
+        value=share_results,
+        help="开启后，与他人上传相同资料、相同设置时直接返回已生成的整篇笔记；关闭后你的请求既不使用也不写入整篇笔记结果。"
+             "分块抽取、翻译等中间结果的缓存按内容哈希存取（只有上传了相同内容才会命中），不受此设置影响"
+    )
+
+    keywords_text = st.text_area(
+        "自定义学科关键词（每行一个学科，格式：学科: 关键词1, 关键词2）",
+        value="\n".join(f"{s}: {', '.join(kws)}" for s, kws in subject_keywords.items()),
+        placeholder="history: dynasty, revolution, 朝代\nlaw: contract, tort, 判例",
+        help="用于自动识别资料学科，与内置关键词合并"
+    )
+
     submit = st.form_submit_button("💾 保存设置")
 
 # ---------- 提交逻辑 ----------
@@ -67,11 +83,23 @@ if submit:
         user.email = email.strip()
         user.updated_at = datetime.utcnow()
 
+        # 解析自定义学科关键词
+        new_keywords = {}
+        for line in keywords_text.splitlines():
+            if ":" not in line and "：" not in line:
+                continue
+            name, _, kws = line.replace("：", ":").partition(":")
+            kws = [k.strip() for k in kws.replace("，", ",").split(",") if k.strip()]
+            if name.strip() and kws:
+                new_keywords[name.strip()] = kws
+
         # 保存偏好
         new_memory = {
             "default_lang": lang,
             "note_style": style,
-            "auto_save": auto_save_pref
+            "auto_save": auto_save_pref,
+            "subject_keywords": new_keywords,
+            "share_results": share_results_pref
         }
         success = save_user_memory(USER_ID, new_memory)
 
@@ -186,22 +186,27 @@ try:
     conn = sqlite3.connect(LOG_DB)  # ✅ 同样使用 LOG_DB
     cursor = conn.cursor()
 
-    st.markdown("### 🔧 模型单价设置 (USD / 每 1K tokens)")
-    cursor.execute("SELECT model, price_per_1k, updated_at FROM model_prices ORDER BY model ASC")
+    st.markdown("### 🔧 模型单价设置 (USD / 每 1K tokens，输入 / 输出分开计价)")
+    cursor.execute("SELECT * FROM model_prices ORDER BY model ASC")
     rows = cursor.fetchall()
-    existing_prices = {r[0]: r[1] for r in rows}
+    price_columns = [d[0] for d in cursor.description]
 
-    col_a, col_b, col_c = st.columns(3)
+    col_a, col_b, col_c, col_d = st.columns(4)
     with col_a:
-        model_name = st.text_input("模型名", value="gpt-4o")
+        model_name = st.text_input("模型名", value="gpt-4o-mini")
+    current_prompt, current_completion = get_model_price(model_name)
     with col_b:
-        price = st.number_input("单价 (USD / 1K tokens)", value=float(existing_prices.get(model_name, 0.005)), step=0.001)
+        prompt_price = st.number_input("输入单价 (USD / 1K tokens)", value=float(current_prompt),
+                                       step=0.0001, format="%.5f")
     with col_c:
+        completion_price = st.number_input("输出单价 (USD / 1K tokens)", value=float(current_completion),
+                                           step=0.0001, format="%.5f")
+    with col_d:
         if st.button("保存单价"):
-            set_model_price(model_name, price)
-            st.success(f"已更新 {model_name} 的单价为 {price} USD / 1K tokens")
+            set_model_price(model_name, prompt_price, completion_price)
+            st.success(f"已更新 {model_name} 的单价：输入 {prompt_price} / 输出 {completion_price} USD / 1K tokens")
 
-    st.dataframe(pd.DataFrame(rows, columns=["model", "price_per_1k", "updated_at"]), use_container_width=True)
+    st.dataframe(pd.DataFrame(rows, columns=price_columns), use_container_width=True)
 
     st.markdown("---")
     st.markdown("### 📊 使用记录查询")
@@ -212,7 +217,7 @@ try:
     date_to = st.date_input("结束日期", value=datetime.utcnow().date(), key="usage_date_to")
 
     sql = """
-        SELECT id, created_at, user_id, model, prompt_tokens, completion_tokens, total_tokens, cost
+        SELECT id, created_at, user_id, model, stage, prompt_tokens, completion_tokens, total_tokens, cost
         FROM usage_records
         WHERE date(created_at) BETWEEN date(?) AND date(?)
     """
@@ -228,13 +233,16 @@ try:
     rows = cursor.execute(sql, params).fetchall()
     usage_df = pd.DataFrame(
         rows,
-        columns=["id", "created_at", "user_id", "model", "prompt_tokens", "completion_tokens", "total_tokens", "cost"]
+        columns=["id", "created_at", "user_id", "model", "stage", "prompt_tokens", "completion_tokens", "total_tokens", "cost"]
     )
 
     st.dataframe(usage_df, use_container_width=True, hide_index=True)
     if not usage_df.empty:
         st.metric("总 Token 消耗", f"{usage_df['total_tokens'].sum():,}")
         st.metric("总成本 (USD)", f"${usage_df['cost'].sum():.4f}")
+        # 按流水线阶段拆分（chunk / reduce / synthesis / mock_exam）
+        by_stage = usage_df.fillna({"stage": "-"}).groupby("stage")[["total_tokens", "cost"]].sum()
+        st.dataframe(by_stage, use_container_width=True)
 
     conn.close()
 
@@ -284,3 +292,34 @@ try:
 
 except Exception as e:
     st.error(f"无法读取模块状态表: {e}")
+
+# ---------- LLM 连接池 ----------
+st.markdown("---")
+st.subheader("🔌 LLM 连接复用")
+
+try:
+    from modules.llm_client import connection_stats, HTTP2_AVAILABLE
+
+    stats = connection_stats()
+    if not stats:
+        st.info("当前进程还没有创建 LLM 客户端。")
+    else:
+        st.caption(f"HTTP/2: {'可用' if HTTP2_AVAILABLE else '未安装 h2，使用 HTTP/1.1 长连接'}")
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    "客户端": name,
+                    "请求数": s["requests"],
+                    "新建连接": s["new_connections"],
+                    "复用率": s["reuse_rate"],
+                    "平均 TCP 握手 (ms)": s["avg_connect_ms"],
+                    "平均 TLS 握手 (ms)": s["avg_tls_ms"],
+                    "协议": ", ".join(f"{v}×{n}" for v, n in s["http_versions"].items()),
+                }
+                for name, s in stats.items()
+            ]),
+            use_container_width=True,
+            hide_index=True,
+        )
+except Exception as e:
+    st.error(f"无法读取连接统计: {e}")
@@ -1,7 +1,6 @@
 # pages/1_🔑_API_Key_Debug.py
 import os
 import streamlit as st
-from openai import OpenAI
 from dotenv import load_dotenv
 
 # ✅ 本地运行时加载 .env
@@ -34,7 +33,9 @@ def get_api_key():
 def test_openai_api(api_key: str):
     """测试 API 是否可用"""
     try:
-        client = OpenAI(api_key=api_key)
+        # 延迟导入：config 在缺少 Key 时会直接报错，而本页面正是用来排查这种情况的
+        from modules.llm_client import get_client
+        client = get_client(api_key)
         resp = client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": "hi"}],
@@ -0,0 +1,100 @@
+# scripts/batch_generate.py
+"""
+离线批量生成笔记（不需要实时返回的大批量任务，如整学期讲义预处理）
+
+每个输入文件生成一条笔记，写回指定用户的 UserNote。
+--executor openai 使用 OpenAI Batch API（24 小时窗口，价格约为同步调用的一半）；
+--executor local 在本机重放请求文件（可配合 --base-url 指向本地假服务做离线测试）。
+
+用法：
+    python scripts/batch_generate.py --input lectures/ --user-id 1 --mode detailed --executor openai
+    python scripts/batch_generate.py --input a.pdf b.pptx --user-id 1 --executor local --poll-interval 2
+"""
+
+import sys
+import os
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))  # ✅ 修正路径问题
+
+from config import OPENAI_API_KEY
+from modules.file_parser import extract_text_from_file
+from modules.llm_client import get_client, close_all
+from modules.batch_runner import generate_notes_batch, OpenAIBatchExecutor, LocalBatchExecutor
+from modules.utils.path_helper import DB_DIR
+
+SUPPORTED_EXT = (".pdf", ".docx", ".pptx", ".txt")
+
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(SUPPORTED_EXT):
+                    files.append(os.path.join(path, name))
+        elif path.lower().endswith(SUPPORTED_EXT):
+            files.append(path)
+        else:
+            print(f"⚠️ 跳过不支持的文件: {path}")
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线批量生成复习笔记")
+    parser.add_argument("--input", nargs="+", required=True, help="文件或目录")
+    parser.add_argument("--user-id", type=int, default=None, help="笔记写回的用户 ID（不填则只打印结果）")
+    parser.add_argument("--mode", default="detailed", choices=["detailed", "exam", "custom"])
+    parser.add_argument("--bilingual", action="store_true")
+    parser.add_argument("--target-lang", default="zh", choices=["zh", "en"])
+    parser.add_argument("--instruction", default=None, help="自定义要求")
+    parser.add_argument("--executor", default="openai", choices=["openai", "local"])
+    parser.add_argument("--base-url", default=None, help="OpenAI 兼容端点（默认官方）")
+    parser.add_argument("--work-dir", default=os.path.join(DB_DIR, "batches"))
+    parser.add_argument("--poll-interval", type=float, default=60)
+    args = parser.parse_args()
+
+    files = collect_files(args.input)
+    if not files:
+        print("❌ 没有可处理的文件")
+        return
+
+    documents = []
+    for path in files:
+        name = os.path.basename(path)
+        with open(path, "rb") as f:
+            text = extract_text_from_file(f, name)
+        if text and text.strip():
+            documents.append({"name": name, "text": text})
+        else:
+            print(f"⚠️ 未解析出文本: {name}")
+
+    client = get_client(OPENAI_API_KEY, base_url=args.base_url)
+    if args.executor == "openai":
+        executor = OpenAIBatchExecutor(client)
+    else:
+        executor = LocalBatchExecutor(client, args.work_dir)
+
+    print(f"🚀 提交 {len(documents)} 个文档（executor={args.executor}）")
+    results = generate_notes_batch(
+        documents,
+        executor,
+        work_dir=args.work_dir,
+        user_id=args.user_id,
+        mode=args.mode,
+        bilingual=args.bilingual,
+        target_lang=args.target_lang,
+        custom_instruction=args.instruction,
+        poll_interval=args.poll_interval,
+    )
+
+    for r in results:
+        if r["text"]:
+            print(f"✅ {r['name']} → note_id={r['note_id']} ({len(r['text'])} 字)")
+        else:
+            print(f"❌ {r['name']} 生成失败")
+    close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+# scripts/fake_llm_server.py
+"""
+本地 OpenAI 兼容的假 LLM 服务（压测 / 延迟测试用，不消耗真实 token、不依赖外网）
+
+支持：
+- POST /v1/chat/completions（普通 + SSE 流式，stream_options.include_usage）
+- 可配置的首 token 延迟分布（fixed / uniform / lognormal）和输出速度（token/s）
+- 按 TPM / RPM 的令牌桶限流，超限返回 429 + Retry-After
+- 按比例随机注入 429 / 500
+- usage 字段按本地 token 估算器计算；分块请求按 `### SEGMENT n` 格式回复，与真实模型一致
+- GET /stats 查看累计请求 / 错误 / token 数
+
+用法：
+    python scripts/fake_llm_server.py --port 8808 --latency-dist lognormal --latency-ms 400 --tpm 200000 --error-500 0.02
+    # 然后让应用指向它：
+    OPENAI_BASE_URL=http://127.0.0.1:8808/v1 OPENAI_API_KEY=sk-fake streamlit run app.py
+"""
+
+import sys
+import os
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))  # ✅ 修正路径问题
+
+from modules.chunker import estimate_tokens
+
+_SEGMENT_RE = re.compile(r"<<<SEGMENT (\d+)>>>\n(.*?)\n<<<END SEGMENT \1>>>", re.DOTALL)
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z\-]{3,}|[一-鿿]{2,6}")
+
+
+class TokenBucket:
+    """每分钟 capacity 个令牌，连续补充；capacity=0 表示不限"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, amount: float):
+        """成功返回 0，否则返回需要等待的秒数"""
+        if not self.capacity:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            amount = min(amount, self.capacity)
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+
+class FakeLLM:
+    def __init__(self, args):
+        self.args = args
+        self.tpm = TokenBucket(args.tpm)
+        self.rpm = TokenBucket(args.rpm)
+        self.stats = {"requests": 0, "streamed": 0, "rate_limited": 0, "injected_429": 0,
+                      "injected_500": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._lock = threading.Lock()
+
+    def count(self, **deltas):
+        with self._lock:
+            for k, v in deltas.items():
+                self.stats[k] += v
+
+    def first_token_delay(self) -> float:
+        a = self.args
+        mean = a.latency_ms / 1000
+        if a.latency_dist == "uniform":
+            return random.uniform(max(0.0, mean - a.jitter_ms / 1000), mean + a.jitter_ms / 1000)
+        if a.latency_dist == "lognormal":
+            # 均值为 mean、σ=latency_sigma 的对数正态（长尾，接近真实 API）
+            sigma = a.latency_sigma
+            return random.lognormvariate(math.log(max(mean, 1e-3)) - sigma ** 2 / 2, sigma)
+        return mean
+
+    def check_limits(self, prompt_tokens: int, max_tokens: int):
+        """返回 None 或 (status, message, retry_after)"""
+        if random.random() < self.args.error_500:
+            self.count(injected_500=1)
+            return 500, "Injected server error", None
+        if random.random() < self.args.error_429:
+            self.count(injected_429=1)
+            return 429, "Injected rate limit", 1.0
+        wait = max(self.rpm.take(1), self.tpm.take(prompt_tokens + max_tokens))
+        if wait:
+            self.count(rate_limited=1)
+            return 429, "Rate limit reached for tokens per min (fake server)", wait
+        return None
+
+    def compose(self, messages, max_tokens: int) -> str:
+        """生成看起来像笔记的回复：分块请求按片段回复，其余按输入长度生成要点"""
+        user_text = "\n".join(m.get("content") or "" for m in messages if m.get("role") == "user")
+        segments = _SEGMENT_RE.findall(user_text)
+        if segments:
+            per_seg = max(20, max_tokens // len(segments))
+            return "\n\n".join(
+                f"### SEGMENT {sid}\n{self._bullets(text, per_seg)}" for sid, text in segments
+            )
+        target = min(max_tokens, max(60, int(estimate_tokens(user_text) * self.args.output_ratio)))
+        return "# Key Points\n\n" + self._bullets(user_text, target)
+
+    def _bullets(self, source: str, target_tokens: int) -> str:
+        words = _WORD_RE.findall(source) or ["concept", "definition", "example"]
+        lines, tokens, i = [], 0, 0
+        while tokens < target_tokens:
+            picked = [words[(i + k) % len(words)] for k in range(6)]
+            line = f"- **{picked[0]}**: " + " ".join(picked[1:])
+            lines.append(line)
+            tokens += estimate_tokens(line)
+            i += 6
+        return "\n".join(lines)
+
+
+def make_handler(llm: FakeLLM):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # 支持 keep-alive
+
+        def log_message(self, fmt, *args):
+            if llm.args.verbose:
+                super().log_message(fmt, *args)
+
+        def _send_json(self, status: int, payload: dict, headers=None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                self._send_json(200, llm.stats)
+            elif self.path.rstrip("/") == "/v1/models":
+                self._send_json(200, {"object": "list", "data": [{"id": llm.args.model, "object": "model"}]})
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/v1/chat/completions":
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                req = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": {"message": "invalid JSON", "type": "invalid_request_error"}})
+                return
+
+            messages = req.get("messages") or []
+            model = req.get("model") or llm.args.model
+            max_tokens = int(req.get("max_tokens") or req.get("max_completion_tokens") or llm.args.default_max_tokens)
+            prompt_tokens = sum(estimate_tokens(m.get("content") or "") + 4 for m in messages) + 3
+            llm.count(requests=1)
+
+            error = llm.check_limits(prompt_tokens, max_tokens)
+            if error:
+                status, message, retry_after = error
+                headers = {}
+                if retry_after is not None:
+                    headers["retry-after"] = str(max(1, math.ceil(retry_after)))
+                    headers["retry-after-ms"] = str(int(retry_after * 1000))
+                err_type = "rate_limit_error" if status == 429 else "server_error"
+                self._send_json(status, {"error": {"message": message, "type": err_type, "code": None}}, headers)
+                return
+
+            content = llm.compose(messages, max_tokens)
+            completion_tokens = estimate_tokens(content)
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                     "total_tokens": prompt_tokens + completion_tokens}
+            llm.count(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+            time.sleep(llm.first_token_delay())
+            completion_id = f"chatcmpl-fake-{uuid.uuid4().hex[:16]}"
+            created = int(time.time())
+
+            if not req.get("stream"):
+                if llm.args.tokens_per_second:
+                    time.sleep(completion_tokens / llm.args.tokens_per_second)
+                self._send_json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+                return
+
+            llm.count(streamed=1)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def emit(payload):
+                data = f"data: {payload}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def chunk(delta, finish=None, with_usage=False):
+                obj = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                       "choices": [] if with_usage else [{"index": 0, "delta": delta, "finish_reason": finish}]}
+                if with_usage:
+                    obj["usage"] = usage
+                return json.dumps(obj, ensure_ascii=False)
+
+            try:
+                emit(chunk({"role": "assistant", "content": ""}))
+                pieces = re.findall(r"\S+\s*|\s+", content)
+                step = max(1, llm.args.stream_piece_words)
+                for i in range(0, len(pieces), step):
+                    piece = "".join(pieces[i:i + step])
+                    if llm.args.tokens_per_second:
+                        time.sleep(estimate_tokens(piece) / llm.args.tokens_per_second)
+                    emit(chunk({"content": piece}))
+                emit(chunk({}, finish="stop"))
+                if (req.get("stream_options") or {}).get("include_usage"):
+                    emit(chunk(None, with_usage=True))
+                emit("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容假 LLM 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--latency-dist", default="lognormal", choices=["fixed", "uniform", "lognormal"])
+    parser.add_argument("--latency-ms", type=float, default=300, help="首 token 平均延迟")
+    parser.add_argument("--jitter-ms", type=float, default=100, help="uniform 分布的上下浮动")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal 分布的 σ")
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="输出速度，0 表示瞬间返回")
+    parser.add_argument("--tpm", type=float, default=0, help="每分钟 token 上限（prompt + max_tokens），0 不限")
+    parser.add_argument("--rpm", type=float, default=0, help="每分钟请求上限，0 不限")
+    parser.add_argument("--error-429", type=float, default=0.0, help="随机注入 429 的比例")
+    parser.add_argument("--error-500", type=float, default=0.0, help="随机注入 500 的比例")
+    parser.add_argument("--output-ratio", type=float, default=0.3, help="非分块请求的输出 / 输入 token 比例")
+    parser.add_argument("--default-max-tokens", type=int, default=1024)
+    parser.add_argument("--stream-piece-words", type=int, default=3, help="流式每个事件包含的词数")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(FakeLLM(args)))
+    server.daemon_threads = True
+    print(f"🧪 Fake LLM server listening on http://{args.host}:{args.port}/v1 "
+          f"(latency={args.latency_dist}:{args.latency_ms}ms, tpm={args.tpm or '∞'}, "
+          f"429={args.error_429:.0%}, 500={args.error_500:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 stopped")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
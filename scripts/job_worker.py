@@ -0,0 +1,72 @@
+# scripts/job_worker.py
+"""
+后台任务 worker：与 Streamlit 进程分离运行，从 jobs 表领取解析 / 生成笔记 / 导出 PDF 任务。
+
+每个 worker 进程一次执行一个任务；任务运行期间定时心跳续租，进程崩溃后租约过期，
+任务会被其他 worker 重新领取（超过最大尝试次数则标记为 failed）。
+
+用法：
+    python scripts/job_worker.py                       # 默认 JOB_WORKER_PROCESSES 个进程，处理全部任务类型
+    python scripts/job_worker.py --processes 4 --tasks generate_notes
+"""
+
+import sys
+import os
+import argparse
+import multiprocessing
+import signal
+import socket
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))  # ✅ 修正路径问题
+# config 只在函数内 import：解析进程池以 spawn 启动时会重新 import 本脚本，子进程不应读取 config
+
+
+def _worker_main(worker_id, task_names, poll_interval, stop_event):
+    # 子进程里忽略 Ctrl+C，由主进程统一通过 stop_event 让当前任务跑完再退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from modules.job_worker import run_worker
+    from modules.llm_client import close_all
+    try:
+        run_worker(worker_id, task_names, poll_interval, stop_event)
+    finally:
+        close_all()
+
+
+def main():
+    from config import JOB_WORKER_PROCESSES
+    from modules.job_worker import HANDLERS
+
+    parser = argparse.ArgumentParser(description="运行后台任务 worker 进程")
+    parser.add_argument("--processes", type=int, default=JOB_WORKER_PROCESSES, help="worker 进程数")
+    parser.add_argument("--tasks", nargs="+", choices=sorted(HANDLERS), default=None,
+                        help="只处理这些任务类型（默认全部）")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="队列为空时的轮询间隔（秒）")
+    args = parser.parse_args()
+
+    stop_event = multiprocessing.Event()
+
+    def _stop(signum, frame):
+        print("🛑 收到退出信号，等待当前任务完成...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    host = socket.gethostname()
+    workers = []
+    for i in range(max(1, args.processes)):
+        worker_id = f"{host}:{os.getpid()}:{i}"
+        p = multiprocessing.Process(
+            target=_worker_main, args=(worker_id, args.tasks, args.poll_interval, stop_event), daemon=False
+        )
+        p.start()
+        workers.append(p)
+    print(f"🚀 已启动 {len(workers)} 个 worker（任务类型: {', '.join(args.tasks or sorted(HANDLERS))}）")
+
+    for p in workers:
+        p.join()
+    print("✅ 所有 worker 已退出")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# tests/conftest.py
+# 测试公共设置：项目根目录加入 sys.path；config / auth 在 import 时要求有 API Key 和 JWT_SECRET，测试里给假的
+# 用到数据库的测试通过 isolated_db 把 SQLite 路径指向临时目录，不碰 database/ 下的真实数据
+
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("JWT_SECRET", "test-secret")
+
+
+@pytest.fixture
+def isolated_db(tmp_path, monkeypatch):
+    """日志写入临时 system.db；返回临时目录，各测试再把被测模块的库路径指向这里"""
+    from modules import logger
+
+    monkeypatch.setattr(logger, "DB_PATH", str(tmp_path / "system.db"))
+    logger.init_log_table()
+    logger.init_model_price_table()
+    return tmp_path
+
+
+def _race(fn, n):
+    """n 个线程同时调用 fn(i)，返回各自的结果（模拟多个请求 / worker 同时竞争）"""
+    barrier = threading.Barrier(n)
+    results = [None] * n
+
+    def _run(i):
+        barrier.wait()
+        results[i] = fn(i)
+
+    threads = [threading.Thread(target=_run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+@pytest.fixture
+def race():
+    return _race
@@ -0,0 +1,121 @@
+# tests/test_batch_runner.py
+# 离线批处理：结果文件解析（非 200 一律失败）、双语走与在线相同的翻译阶段
+
+import json
+import re
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("langdetect")
+
+from modules import batch_runner, translation_memory  # noqa: E402
+from modules.batch_runner import BatchExecutor, read_batch_results  # noqa: E402
+
+DOC = (
+    "Photosynthesis converts light energy into chemical energy. "
+    "Plants store this energy as glucose in their cells. "
+    "Chlorophyll absorbs red and blue light most strongly. "
+) * 5
+
+NOTE = "# Photosynthesis\n\nPlants turn light into chemical energy. They store it as glucose."
+
+
+class ReplayExecutor(BatchExecutor):
+    """按 custom_id 的阶段名交给 respond(stage, body) 生成结果，同步完成"""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.stages = []
+        self._outputs = {}
+
+    def submit(self, input_path):
+        with open(input_path, encoding="utf-8") as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        batch_id = f"b{len(self._outputs)}"
+        self._outputs[batch_id] = requests
+        self.stages.append(requests[0]["custom_id"].split(":")[1])
+        return batch_id
+
+    def poll(self, batch_id):
+        return "completed"
+
+    def fetch_results(self, batch_id, output_path):
+        with open(output_path, "w", encoding="utf-8") as f:
+            for req in self._outputs[batch_id]:
+                stage = req["custom_id"].split(":")[1]
+                content = self.respond(stage, req["body"])
+                f.write(json.dumps({
+                    "custom_id": req["custom_id"],
+                    "response": {"status_code": 200, "body": {
+                        "choices": [{"message": {"content": content}}],
+                        "usage": {"prompt_tokens": 10, "completion_tokens": 10},
+                    }},
+                    "error": None,
+                }, ensure_ascii=False) + "\n")
+        return output_path
+
+
+def respond(stage, body):
+    prompt = body["messages"][-1]["content"]
+    if stage == "chunk":
+        return "## Photosynthesis\n- light energy → chemical energy\n- glucose storage"
+    if stage == "synthesis":
+        return NOTE
+    numbered = re.findall(r"^\[(\d+)\]", prompt, re.M)
+    return "\n".join(f"[{n}] 译文{n}" for n in numbered)
+
+
+@pytest.fixture
+def tm_db(isolated_db, monkeypatch):
+    monkeypatch.setattr(translation_memory, "CACHE_DB", str(isolated_db / "cache.db"))
+    translation_memory.init_translation_table()
+    return isolated_db
+
+
+def test_non_200_without_error_body_is_failure(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text(json.dumps({
+        "custom_id": "0:chunk:0",
+        "response": {"status_code": 500, "body": {}},
+        "error": None,
+    }) + "\n", encoding="utf-8")
+
+    result = read_batch_results(str(path))["0:chunk:0"]
+    assert result["error"] and result["content"] == ""
+
+
+def test_bilingual_batch_uses_translation_stage(tm_db, tmp_path):
+    executor = ReplayExecutor(respond)
+    outputs = batch_runner.generate_notes_batch(
+        [{"name": "bio", "text": DOC}], executor, str(tmp_path / "work"),
+        bilingual=True, target_lang="zh", poll_interval=0,
+    )
+
+    assert executor.stages == ["chunk", "synthesis", "translation"]
+    text = outputs[0]["text"]
+    assert text.startswith(NOTE)
+    assert "## 🌐 Chinese Version" in text and "译文1" in text
+
+    # 译文写入了翻译记忆：再跑一次不再提交翻译请求
+    executor = ReplayExecutor(respond)
+    batch_runner.generate_notes_batch(
+        [{"name": "bio", "text": DOC}], executor, str(tmp_path / "work2"),
+        bilingual=True, target_lang="zh", poll_interval=0,
+    )
+    assert executor.stages == ["chunk", "synthesis"]
+
+
+def test_synthesis_prompt_is_monolingual(tm_db, tmp_path):
+    bodies = []
+
+    def _respond(stage, body):
+        if stage == "synthesis":
+            bodies.append(body)
+        return respond(stage, body)
+
+    batch_runner.generate_notes_batch(
+        [{"name": "bio", "text": DOC}], ReplayExecutor(_respond), str(tmp_path / "work"),
+        bilingual=True, target_lang="zh", poll_interval=0,
+    )
+    assert "translation" not in bodies[0]["messages"][-1]["content"]
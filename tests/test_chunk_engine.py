@@ -0,0 +1,57 @@
+# tests/test_chunk_engine.py
+# 并发抽取引擎：结果按输入顺序、异常按条返回、流式输入边产出边提交
+
+import threading
+import time
+
+from modules.chunk_engine import run_ordered, run_streaming
+
+
+def test_run_ordered_keeps_input_order_and_captures_errors():
+    def fn(i):
+        time.sleep(0.01 * (5 - i))   # 后提交的先完成
+        if i == 2:
+            raise ValueError("boom")
+        return i * 10
+
+    results = run_ordered(fn, range(5), max_workers=5)
+
+    assert [ok for ok, _ in results] == [True, True, False, True, True]
+    assert [v for ok, v in results if ok] == [0, 10, 30, 40]
+    assert isinstance(results[2][1], ValueError)
+
+
+def test_run_ordered_respects_max_workers():
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    def fn(i):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+
+    run_ordered(fn, range(8), max_workers=2)
+    assert peak[0] <= 2
+    assert run_ordered(fn, []) == []
+
+
+def test_run_streaming_submits_before_items_are_exhausted():
+    first_started = threading.Event()
+
+    def items():
+        yield "a"
+        # 第二项产出前，第一项已经在工作线程里开始执行
+        assert first_started.wait(1)
+        yield "b"
+
+    def fn(item):
+        if item == "a":
+            first_started.set()
+        return item.upper()
+
+    submitted, results = run_streaming(fn, items(), max_workers=2)
+    assert submitted == ["a", "b"]
+    assert results == [(True, "A"), (True, "B")]
@@ -0,0 +1,92 @@
+# tests/test_chunker.py
+
+from modules.chunker import (
+    estimate_tokens,
+    iter_segments,
+    build_segments,
+    render_pack,
+    split_pack_output,
+)
+
+
+def _units(n, words=30):
+    return [f"Paragraph {i}. " + " ".join(f"word{i}x{j}" for j in range(words)) for i in range(n)]
+
+
+def _pack(n):
+    return [{"doc": 0, "seg": i + 1, "text": f"segment {i + 1}", "tokens": 3} for i in range(n)]
+
+
+# ================== iter_segments ==================
+def test_segments_respect_budget_and_keep_order():
+    units = _units(40)
+    budget = 200
+    segments = build_segments(0, units, budget)
+
+    assert all(seg["tokens"] <= budget for seg in segments)
+    assert [seg["seg"] for seg in segments] == list(range(1, len(segments) + 1))
+    assert "\n\n".join(seg["text"] for seg in segments) == "\n\n".join(units)
+    assert all(seg["tokens"] == estimate_tokens(seg["text"]) for seg in segments)
+
+
+def test_oversized_unit_is_split_into_pieces():
+    line = " ".join(f"word{i}" for i in range(2000))
+    segments = build_segments(3, ["short intro", line, "short outro"], 100)
+
+    assert segments[0]["text"] == "short intro"
+    assert segments[-1]["text"] == "short outro"
+    assert len(segments) > 3
+    assert all(seg["doc"] == 3 for seg in segments)
+    # 无换行的长行按估算比例切字符，单块可能略超预算
+    assert all(seg["tokens"] <= 100 * 1.25 for seg in segments)
+    # 切口处的空白会被去掉，除此之外内容完整、顺序不变
+    assert "".join(seg["text"] for seg in segments[1:-1]).replace(" ", "") == line.replace(" ", "")
+
+
+def test_iterator_input_matches_list_input():
+    units = _units(25)
+    assert list(iter_segments(1, iter(units), 150)) == build_segments(1, units, 150)
+
+
+def test_appending_units_keeps_earlier_segments():
+    """内容定义切分：追加内容只影响最后一个片段，前面已产出的片段原文不变"""
+    units = _units(30)
+    before = build_segments(0, units, 150)
+    after = build_segments(0, units + _units(5, words=10), 150)
+    assert after[:len(before) - 1] == before[:-1]
+
+
+def test_empty_input_has_no_segments():
+    assert build_segments(0, [], 100) == []
+
+
+# ================== split_pack_output ==================
+def test_single_segment_pack_returns_whole_output():
+    assert split_pack_output("  notes  \n", _pack(1)) == ["notes"]
+
+
+def test_output_is_split_by_segment_headers():
+    output = "### SEGMENT 1\nfirst notes\n\n### SEGMENT 2\nsecond notes\n\n### SEGMENT 3\nthird notes"
+    assert split_pack_output(output, _pack(3)) == ["first notes", "second notes", "third notes"]
+
+
+def test_delimiter_format_and_out_of_order_sections():
+    output = "<<<SEGMENT 2>>>\nB\n<<<END SEGMENT 2>>>\n<<<SEGMENT 1>>>\nA\n<<<END SEGMENT 1>>>"
+    assert split_pack_output(output, _pack(2)) == ["A", "B"]
+
+
+def test_repeated_and_unknown_segment_ids():
+    output = "## SEGMENT 1\nA1\n## SEGMENT 7\nignored\n## SEGMENT 1\nA2"
+    assert split_pack_output(output, _pack(2)) == ["A1\n\nA2", ""]
+
+
+def test_unformatted_output_goes_to_first_segment():
+    assert split_pack_output("just some notes", _pack(3)) == ["just some notes", "", ""]
+    assert split_pack_output(None, _pack(2)) == ["", ""]
+
+
+def test_render_pack_round_trip():
+    pack = _pack(2)
+    rendered = render_pack(pack)
+    assert "<<<SEGMENT 1>>>" in rendered and "<<<END SEGMENT 2>>>" in rendered
+    assert split_pack_output(rendered, pack) == ["segment 1", "segment 2"]
@@ -0,0 +1,53 @@
+# tests/test_dedup.py
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from modules.dedup import Deduper, dedup_units  # noqa: E402
+
+LECTURE = (
+    "Marginal cost is the change in total cost that arises when the quantity produced is "
+    "incremented by one unit. In a perfectly competitive market firms produce where price "
+    "equals marginal cost, and the supply curve is the marginal cost curve above average variable cost."
+)
+
+
+def test_exact_duplicates_are_dropped_across_documents():
+    docs = [
+        ["【第 1 页 - week1.pdf】\n" + LECTURE, "Week 1 exercises."],
+        ["【第 7 页 - all.pdf】\n" + LECTURE.upper(), "Week 2 exercises."],
+    ]
+    kept, stats = dedup_units(docs)
+
+    assert kept == [docs[0], ["Week 2 exercises."]]
+    assert stats["units"] == 4
+    assert stats["duplicates"] == 1
+    assert stats["tokens_saved"] > 0
+
+
+def test_near_duplicates_are_dropped():
+    edited = LECTURE.replace("one unit", "one  unit").replace("perfectly", "perfectly ") + " "
+    deduper = Deduper()
+    assert deduper.keep(LECTURE)
+    assert not deduper.keep(edited.replace("arises", "arise"))
+    assert deduper.stats["duplicates"] == 1
+
+
+def test_distinct_units_are_kept():
+    other = (
+        "Price elasticity of demand measures the responsiveness of the quantity demanded to a change "
+        "in price, computed as the percentage change in quantity divided by the percentage change in price."
+    )
+    kept, stats = dedup_units([[LECTURE, other]])
+    assert kept == [[LECTURE, other]]
+    assert stats["duplicates"] == 0
+
+
+def test_short_and_empty_units():
+    deduper = Deduper()
+    assert deduper.keep("Thank you")
+    assert not deduper.keep("thank   you")      # 短单元只做精确去重（规整后相同）
+    assert deduper.keep("Thank you!")
+    assert not deduper.keep("【第 2 页 - a.pdf】\n   ")
+    assert list(deduper.filter(["Questions?", "questions?"])) == ["Questions?"]
@@ -0,0 +1,123 @@
+# tests/test_extractor.py
+# 在线流程的双语翻译阶段：原文与目标语言不同时执行，相同时跳过并在结果中标记；整篇结果共享按用户设置；
+# 合成失败后重新提交从断点继续
+
+import re
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("langdetect")
+
+from modules import chunk_store, extractor, llm_cache, request_memo, run_checkpoint, translation_memory  # noqa: E402
+
+ZH_DOC = "光合作用把光能转化为化学能。植物把能量以葡萄糖的形式储存在细胞中。叶绿素主要吸收红光和蓝光。" * 5
+ZH_NOTE = "# 光合作用\n\n植物把光能转化为化学能。能量以葡萄糖的形式储存。"
+
+
+@pytest.fixture
+def pipeline(isolated_db, monkeypatch):
+    """缓存类表都指向临时 cache.db；model_router 换成按阶段返回固定输出，记录调用过的阶段"""
+    cache_db = str(isolated_db / "cache.db")
+    for module, init in (
+        (llm_cache, llm_cache.init_cache_table),
+        (chunk_store, chunk_store.init_chunk_table),
+        (run_checkpoint, run_checkpoint.init_checkpoint_table),
+        (request_memo, request_memo.init_memo_table),
+        (translation_memory, translation_memory.init_translation_table),
+    ):
+        monkeypatch.setattr(module, "CACHE_DB", cache_db)
+        init()
+    monkeypatch.setattr(extractor, "update_module_status", lambda *a, **k: None)
+    monkeypatch.setattr(extractor, "save_user_note", lambda *a, **k: 1)
+    monkeypatch.setattr(extractor, "load_user_memory", lambda user_id: {})
+
+    stages = []
+
+    def _complete(client, stage, messages, max_tokens=None, accept=None, temperature=0.0, use_cache=True):
+        stages.append(stage)
+        prompt = messages[-1]["content"]
+        if stage == "translation":
+            content = "\n".join(f"[{n}] translated {n}" for n in re.findall(r"^\[(\d+)\]", prompt, re.M))
+        else:
+            content = "## 光合作用\n- 光能 → 化学能"
+        return content, []
+
+    def _stream(client, stage, messages, max_tokens=None, accept=None, temperature=0.0, use_cache=True, result=None):
+        stages.append(stage)
+        result.update(content=ZH_NOTE, calls=[], ttft=0.0)
+        yield ZH_NOTE
+
+    monkeypatch.setattr(extractor.model_router, "complete", _complete)
+    monkeypatch.setattr(extractor.model_router, "stream", _stream)
+    return stages
+
+
+def run(**kwargs):
+    result = {}
+    kwargs = {"bilingual": True, "user_id": "u1", "use_cache": False, "share_results": False, **kwargs}
+    for _ in extractor.extract_summary_stream([ZH_DOC], result=result, **kwargs):
+        pass
+    return result
+
+
+def test_needs_translation():
+    assert extractor.needs_translation(True, "zh", "en")
+    assert not extractor.needs_translation(True, "zh", "zh")
+    assert not extractor.needs_translation(False, "zh", "en")
+
+
+def test_zh_source_with_en_target_runs_translation(pipeline):
+    result = run(target_lang="en")
+    text = result["text"]
+
+    assert "translation" in pipeline
+    assert "## 🌐 English Version" in text and "translated 1" in text
+    assert result["stats"]["translation"]["calls"] >= 1
+    assert not result["stats"]["translation_skipped"]
+
+
+def test_same_language_skip_is_reported(pipeline):
+    result = run(target_lang="zh")
+    text = result["text"]
+
+    assert "translation" not in pipeline
+    assert "Version" not in text
+    assert result["stats"]["translation_skipped"]
+
+
+@pytest.mark.parametrize("prefs, shared", [({}, True), ({"share_results": True}, True), ({"share_results": False}, False)])
+def test_share_results_defaults_to_user_preference(pipeline, monkeypatch, prefs, shared):
+    memo_calls = []
+    monkeypatch.setattr(extractor, "load_user_memory", lambda user_id: prefs)
+    monkeypatch.setattr(extractor.request_memo, "single_flight",
+                        lambda key, owner: memo_calls.append(key) or ("leader", None))
+
+    run(target_lang="zh", use_cache=True, share_results=None)
+    assert bool(memo_calls) is shared
+
+
+def test_failed_synthesis_resumes_from_checkpoint(pipeline, monkeypatch):
+    stream = extractor.model_router.stream
+
+    def _fail(*args, **kwargs):
+        raise RuntimeError("synthesis down")
+        yield
+
+    monkeypatch.setattr(extractor.model_router, "stream", _fail)
+    with pytest.raises(RuntimeError):
+        run(target_lang="zh", use_cache=True)
+    assert "chunk" in pipeline
+
+    pipeline.clear()
+    monkeypatch.setattr(extractor.model_router, "stream", stream)
+    result = run(target_lang="zh", use_cache=True)
+
+    assert result["resumed_from"] == "reduced"
+    assert pipeline == ["synthesis"]
+    assert result["text"].startswith("# 光合作用")
+
+    # 完成后再提交直接返回上次的结果
+    pipeline.clear()
+    assert run(target_lang="zh", use_cache=True)["resumed_from"] == "done"
+    assert pipeline == []
@@ -0,0 +1,89 @@
+# tests/test_job_queue.py
+# 后台任务队列：并发领取、租约过期重领、取消与过期任务清理
+
+import time
+
+import pytest
+
+from modules import job_queue
+
+
+@pytest.fixture
+def job_db(isolated_db, monkeypatch):
+    monkeypatch.setattr(job_queue, "SYSTEM_DB", str(isolated_db / "system.db"))
+    monkeypatch.setattr(job_queue, "JOBS_DIR", str(isolated_db / "jobs"))
+    (isolated_db / "jobs").mkdir()
+    job_queue.init_job_table()
+    return job_queue
+
+
+def test_each_job_is_leased_by_one_worker(job_db, race):
+    job_ids = {job_db.submit("parse_files", {"n": i}) for i in range(5)}
+    leased = race(lambda i: job_db.lease(f"worker{i}", ["parse_files"]), 8)
+    got = [job["id"] for job in leased if job]
+
+    assert sorted(got) == sorted(job_ids)
+    assert leased.count(None) == 3
+
+
+def test_expired_job_lease_moves_to_another_worker(job_db):
+    job_id = job_db.submit("parse_files", {})
+    first = job_db.lease("w1", lease_seconds=0.2)
+    assert first["id"] == job_id
+    assert job_db.lease("w2") is None
+
+    time.sleep(0.3)
+    second = job_db.lease("w2")
+    assert second["id"] == job_id and second["attempts"] == 2
+    # 原 worker 的心跳 / 提交都应失败
+    assert not job_db.heartbeat(job_id, "w1")
+    assert not job_db.complete(job_id, "w1")
+    assert job_db.complete(job_id, "w2")
+    assert job_db.get(job_id)["status"] == "success"
+
+
+def test_cancelled_job_stops_heartbeat(job_db):
+    job_id = job_db.submit("export_pdf", {"text": "x"})
+    job_db.lease("w1")
+    assert job_db.cancel(job_id)
+    assert not job_db.heartbeat(job_id, "w1")
+    assert job_db.lease("w2") is None
+
+
+def test_purge_removes_only_job_files_inside_jobs_dir(job_db, tmp_path):
+    inside = tmp_path / "jobs" / "input_1.json"
+    inside.write_text("[]")
+    outside = tmp_path / "keep.txt"
+    outside.write_text("keep")
+    job_id = job_db.submit("parse_files", {"files": [{"name": "a", "path": str(inside)},
+                                                     {"name": "b", "path": str(outside)}]})
+    job_db.lease("w1")
+    job_db.complete(job_id, "w1")
+    time.sleep(0.05)
+
+    assert job_db.purge_finished(0.01) == 1
+    assert job_db.get(job_id) is None
+    assert not inside.exists()
+    assert outside.exists()
+
+
+def test_failed_job_is_retried_after_backoff_then_fails(job_db, monkeypatch):
+    monkeypatch.setattr(job_db, "JOB_RETRY_BACKOFF_SECONDS", 0.2)
+    job_id = job_db.submit("generate_notes", {}, max_attempts=2)
+
+    job_db.lease("w1")
+    assert job_db.fail(job_id, "w1", "timeout") == "pending"
+    assert job_db.lease("w1") is None          # 退避期间不可领取
+    time.sleep(0.25)
+    assert job_db.lease("w1")["attempts"] == 2
+    assert job_db.fail(job_id, "w1", "timeout again") == "failed"
+    job = job_db.get(job_id)
+    assert job["status"] == "failed" and job["error_message"] == "timeout again"
+    assert job_db.lease("w1") is None
+
+
+def test_non_retryable_failure_fails_immediately(job_db):
+    job_id = job_db.submit("export_pdf", {})
+    job_db.lease("w1")
+    assert job_db.fail(job_id, "w1", "bad payload", retryable=False) == "failed"
+    assert job_db.fail(job_id, "w2", "not the owner") == "lost"
@@ -0,0 +1,117 @@
+# tests/test_llm_cache.py
+# LLM 响应缓存：key 规范化、命中 / 未命中、空结果不缓存、TTL 过期、按大小的 LRU 淘汰
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+
+from modules import llm_cache  # noqa: E402
+from modules.llm_cache import make_key  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "总结光合作用"}]
+
+
+@pytest.fixture
+def cache_db(isolated_db, monkeypatch):
+    monkeypatch.setattr(llm_cache, "CACHE_DB", str(isolated_db / "cache.db"))
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", True)
+    llm_cache.init_cache_table()
+    return isolated_db
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    """create_completion 按调用次数返回 "answer n"；contents 可指定各次返回的文本"""
+    calls, calls_contents = [], []
+
+    def _create(client, **kwargs):
+        calls.append(kwargs)
+        if kwargs.get("stream"):
+            return iter([
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part))], usage=None)
+                for part in ("流式", "回答")
+            ])
+        content = calls_contents.pop(0) if calls_contents else f"answer {len(calls)}"
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15),
+        )
+
+    monkeypatch.setattr(llm_cache, "create_completion", _create)
+    return SimpleNamespace(calls=calls, contents=calls_contents)
+
+
+CLIENT = SimpleNamespace(base_url="https://api.openai.com/v1/")
+
+
+def test_make_key_is_canonical_and_separates_requests():
+    key = make_key("gpt-4o-mini", MESSAGES, 100, 0.0)
+    reordered = [{"content": "总结光合作用", "role": "user"}]
+
+    assert make_key("gpt-4o-mini", reordered, 100, 0.0) == key
+    assert make_key("gpt-4o", MESSAGES, 100, 0.0) != key
+    assert make_key("gpt-4o-mini", MESSAGES, 200, 0.0) != key
+    assert make_key("gpt-4o-mini", MESSAGES, 100, 0.0, "http://localhost:8000/v1") != key
+    assert llm_cache.endpoint_of(CLIENT) is None
+
+
+def test_second_identical_call_is_a_hit(cache_db, fake_api):
+    first = llm_cache.cached_completion(CLIENT, "gpt-4o-mini", MESSAGES, max_tokens=100)
+    second = llm_cache.cached_completion(CLIENT, "gpt-4o-mini", MESSAGES, max_tokens=100)
+
+    assert first == ("answer 1", {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}, False)
+    assert second == ("answer 1", None, True)
+    assert len(fake_api.calls) == 1
+
+    # 参数不同不命中；use_cache=False 直接调用
+    llm_cache.cached_completion(CLIENT, "gpt-4o-mini", MESSAGES, max_tokens=200)
+    llm_cache.cached_completion(CLIENT, "gpt-4o-mini", MESSAGES, max_tokens=100, use_cache=False)
+    assert len(fake_api.calls) == 3
+
+
+def test_empty_content_is_not_cached(cache_db, fake_api):
+    fake_api.contents.extend(["  ", "real answer"])
+
+    assert llm_cache.cached_completion(CLIENT, "m", MESSAGES)[0] == "  "
+    assert llm_cache.cached_completion(CLIENT, "m", MESSAGES)[0] == "real answer"
+    assert llm_cache.cached_completion(CLIENT, "m", MESSAGES)[2] is True
+
+
+def test_expired_entry_is_a_miss(cache_db, monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_TTL_SECONDS", 60)
+    llm_cache.put("k", "m", "cached")
+    assert llm_cache.get("k")["content"] == "cached"
+
+    monkeypatch.setattr(llm_cache.time, "time", lambda: 10 ** 12)
+    assert llm_cache.get("k") is None
+
+
+def test_evict_drops_least_recently_used_until_under_limit(cache_db, monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_TTL_SECONDS", 0)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_MAX_MB", 1)
+    big = "x" * (400 * 1024)
+    for key in ("old", "mid", "new"):
+        llm_cache.put(key, "m", big)
+
+    # 写入时间太接近，直接指定访问顺序：mid 最久未用，old 刚被读取过
+    conn = llm_cache.connect_with_retry(llm_cache.CACHE_DB)
+    for i, key in enumerate(("mid", "new", "old")):
+        conn.execute("UPDATE llm_cache SET last_access = ? WHERE cache_key = ?", (i, key))
+    conn.close()
+
+    assert llm_cache.evict() == 1
+    assert llm_cache.get("mid") is None
+    assert llm_cache.get("old") and llm_cache.get("new")
+
+
+def test_stream_result_is_cached_after_completion(cache_db, fake_api):
+    result = {}
+    assert "".join(llm_cache.stream_completion(CLIENT, "m", MESSAGES, result=result)) == "流式回答"
+    assert result["hit"] is False and result["content"] == "流式回答"
+
+    replay = {}
+    assert list(llm_cache.stream_completion(CLIENT, "m", MESSAGES, result=replay)) == ["流式回答"]
+    assert replay["hit"] is True
+    assert len(fake_api.calls) == 1
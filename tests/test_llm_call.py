@@ -0,0 +1,134 @@
+# tests/test_llm_call.py
+# LLM 调用层：AIMD 并发增减、熔断器状态转换、限流重试、流式响应占槽到读完为止
+
+import pytest
+
+pytest.importorskip("openai")
+
+from modules import llm_call  # noqa: E402
+from modules.llm_call import AIMDLimiter, CircuitBreaker, CircuitOpenError  # noqa: E402
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FakeClient:
+    """chat.completions.create 依次返回 / 抛出 responses 里的内容"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+        self.chat = self
+        self.completions = self
+
+    def create(self, **kwargs):
+        self.calls += 1
+        resp = self.responses.pop(0)
+        if isinstance(resp, Exception):
+            raise resp
+        return resp
+
+
+@pytest.fixture
+def quiet(isolated_db, monkeypatch):
+    """状态上报写临时库以外的 system.db，测试里不需要"""
+    monkeypatch.setattr(llm_call, "update_module_status", lambda *a, **k: None)
+    monkeypatch.setattr(llm_call.time, "sleep", lambda s: None)
+
+
+@pytest.fixture
+def fresh_limiter(monkeypatch):
+    lim = AIMDLimiter(4)
+    monkeypatch.setattr(llm_call, "limiter", lim)
+    return lim
+
+
+def test_aimd_halves_on_throttle_and_grows_additively():
+    lim = AIMDLimiter(8)
+    lim.on_throttle()
+    assert lim.limit == 4
+    lim.on_throttle()
+    lim.on_throttle()
+    lim.on_throttle()
+    assert lim.limit == 1   # 不低于 min_limit
+    for _ in range(3):
+        lim.on_success()
+    assert 2 < lim.limit < 3   # 1 → 2 → 2.5 → 2.9
+    for _ in range(100):
+        lim.on_success()
+    assert lim.limit == 8   # 不超过上限
+
+
+def test_breaker_opens_after_threshold_then_half_open_probe(quiet, monkeypatch):
+    monkeypatch.setattr(llm_call, "BREAKER_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(llm_call, "BREAKER_COOLDOWN_SECONDS", 60)
+    breaker = CircuitBreaker("m")
+
+    breaker.before_call()
+    breaker.on_failure()
+    assert breaker.state == "closed"
+    breaker.before_call()
+    breaker.on_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # 冷却结束：只放行一个试探请求
+    breaker.opened_at -= 61
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # 试探失败立即重新打开；再次试探成功则关闭
+    breaker.on_failure()
+    assert breaker.state == "open"
+    breaker.opened_at -= 61
+    breaker.before_call()
+    breaker.on_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_rate_limit_retries_without_tripping_breaker(quiet, fresh_limiter, monkeypatch):
+    monkeypatch.setattr(llm_call, "_breakers", {})
+    client = FakeClient([StatusError(429), StatusError(429), "ok"])
+
+    assert llm_call.create_completion(client, model="m-429") == "ok"
+    assert client.calls == 3
+    assert llm_call.get_breaker("m-429").state == "closed"
+    assert fresh_limiter.limit < 4 and fresh_limiter.in_flight == 0
+
+
+def test_bad_request_is_not_retried(quiet, fresh_limiter, monkeypatch):
+    monkeypatch.setattr(llm_call, "_breakers", {})
+    client = FakeClient([StatusError(400), "ok"])
+
+    with pytest.raises(StatusError):
+        llm_call.create_completion(client, model="m-400")
+    assert client.calls == 1
+    assert llm_call.get_breaker("m-400").failures == 0
+    assert fresh_limiter.in_flight == 0
+
+
+def test_stream_holds_slot_until_exhausted(quiet, fresh_limiter, monkeypatch):
+    monkeypatch.setattr(llm_call, "_breakers", {})
+    client = FakeClient([iter(["a", "b"])])
+
+    stream = llm_call.create_completion(client, model="m-stream", stream=True)
+    assert next(stream) == "a"
+    assert fresh_limiter.in_flight == 1
+    assert list(stream) == ["b"]
+    assert fresh_limiter.in_flight == 0
+
+
+def test_stream_releases_slot_when_closed_early(quiet, fresh_limiter, monkeypatch):
+    monkeypatch.setattr(llm_call, "_breakers", {})
+    client = FakeClient([iter(["a", "b", "c"])])
+
+    stream = llm_call.create_completion(client, model="m-stream", stream=True)
+    next(stream)
+    stream.close()
+    assert fresh_limiter.in_flight == 0
@@ -0,0 +1,70 @@
+# tests/test_llm_client.py
+# 客户端注册表：同一 (provider, api_key, base_url) 复用同一个客户端；连接复用统计
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("httpx")
+
+from modules import llm_client  # noqa: E402
+from modules.llm_client import ConnectionStats, get_client  # noqa: E402
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(llm_client, "_clients", {})
+    monkeypatch.setattr(llm_client, "OPENAI_BASE_URL", None)
+    return llm_client._clients
+
+
+def test_same_key_returns_same_client(registry):
+    client = get_client("sk-aaaa")
+
+    assert get_client("sk-aaaa") is client
+    assert get_client("sk-bbbb") is not client
+    assert get_client("sk-aaaa", base_url="http://localhost:8000/v1") is not client
+    assert len(registry) == 3
+
+
+def test_concurrent_first_use_builds_one_client(registry, race):
+    clients = race(lambda i: get_client("sk-race"), 8)
+    assert all(c is clients[0] for c in clients)
+    assert len(registry) == 1
+
+
+def test_unknown_provider_is_rejected(registry):
+    with pytest.raises(ValueError):
+        get_client("sk-aaaa", provider="other")
+
+
+def test_stats_are_keyed_without_the_full_api_key(registry):
+    get_client("sk-secret-1234")
+    (key,) = llm_client.connection_stats()
+    assert key == "openai:default:1234"
+
+
+def test_connection_stats_count_reuse():
+    stats = ConnectionStats()
+
+    def exchange(new_connection):
+        request = SimpleNamespace(extensions={})
+        stats._on_request(request)
+        trace = request.extensions["trace"]
+        if new_connection:
+            trace("connection.connect_tcp.started", {})
+            trace("connection.connect_tcp.complete", {})
+            trace("connection.start_tls.started", {})
+            trace("connection.start_tls.complete", {})
+        stats._on_response(SimpleNamespace(request=request, http_version="HTTP/1.1"))
+
+    exchange(True)
+    exchange(False)
+    exchange(False)
+    snapshot = stats.snapshot()
+
+    assert snapshot["requests"] == 3
+    assert snapshot["new_connections"] == 1 and snapshot["reused"] == 2
+    assert snapshot["reuse_rate"] == round(2 / 3, 3)
+    assert snapshot["http_versions"] == {"HTTP/1.1": 3}
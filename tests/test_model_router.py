@@ -0,0 +1,136 @@
+# tests/test_model_router.py
+# 按阶段的模型级联：流式阶段的首段输出时机、升级条件（输出未通过 / 模型错误 vs 限流 / 熔断）
+
+import pytest
+
+pytest.importorskip("openai")
+
+from modules import model_router  # noqa: E402
+from modules.llm_call import CircuitOpenError  # noqa: E402
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture
+def routes(monkeypatch):
+    """清空 MODEL_ROUTES（使用默认路由），返回可修改的路由表"""
+    monkeypatch.setattr(model_router, "MODEL_ROUTES", {})
+    return model_router.MODEL_ROUTES
+
+
+def fake_stream(outputs, events):
+    """model → 输出文本或要抛出的异常；逐字产出，产出结束时在 events 里记录 ("done", model)"""
+    def _stream(client, model, messages, max_tokens=None, temperature=None, use_cache=True, result=None):
+        output = outputs[model]
+        if isinstance(output, Exception):
+            raise output
+        for ch in output:
+            events.append(("piece", model))
+            yield ch
+        events.append(("done", model))
+        result.update(content=output, usage={"total_tokens": len(output)}, hit=False, ttft=0.0)
+    return _stream
+
+
+def fake_complete(outputs):
+    def _complete(client, model, messages, max_tokens=None, temperature=None, use_cache=True):
+        output = outputs[model]
+        if isinstance(output, Exception):
+            raise output
+        return output, {"total_tokens": len(output)}, False
+    return _complete
+
+
+# ================== 路由 ==================
+def test_streamed_stages_default_to_a_single_model(routes):
+    assert model_router.models_for("synthesis") == [model_router.DEFAULT_MODEL]
+    assert model_router.models_for("edit") == [model_router.DEFAULT_MODEL]
+    assert model_router.models_for("chunk") == [model_router.DEFAULT_MODEL, model_router.ESCALATION_MODEL]
+    routes["synthesis"] = ["a", "b", "a"]
+    assert model_router.models_for("synthesis") == ["a", "b"]
+
+
+# ================== stream ==================
+def test_first_piece_arrives_before_completion_finishes(routes, monkeypatch):
+    events = []
+    monkeypatch.setattr(model_router, "stream_completion",
+                        fake_stream({model_router.DEFAULT_MODEL: "streamed notes"}, events))
+    result = {}
+    pieces = model_router.stream(None, "synthesis", [], accept=lambda out: len(out) > 5, result=result)
+
+    first = next(pieces)
+    assert first == "s"
+    assert ("done", model_router.DEFAULT_MODEL) not in events
+    assert first + "".join(pieces) == "streamed notes"
+    assert result["content"] == "streamed notes" and result["ttft"] is not None
+
+
+def test_configured_fallback_hides_rejected_output(routes, monkeypatch):
+    routes["synthesis"] = ["small", "large"]
+    monkeypatch.setattr(model_router, "stream_completion", fake_stream({"small": "bad", "large": "good notes"}, []))
+    result = {}
+    assert list(model_router.stream(None, "synthesis", [], accept=lambda out: out != "bad", result=result)) == \
+        ["g", "o", "o", "d", " ", "n", "o", "t", "e", "s"]
+    assert [(c["model"], c["accepted"]) for c in result["calls"]] == [("small", False), ("large", True)]
+
+
+def test_stream_escalates_on_model_error_only(routes, monkeypatch):
+    routes["edit"] = ["small", "large"]
+    monkeypatch.setattr(model_router, "stream_completion",
+                        fake_stream({"small": StatusError(400), "large": "fixed"}, []))
+    result = {}
+    assert "".join(model_router.stream(None, "edit", [], result=result)) == "fixed"
+    assert [c["model"] for c in result["calls"]] == ["small", "large"]
+
+    for err in (StatusError(429), StatusError(503), CircuitOpenError("open")):
+        monkeypatch.setattr(model_router, "stream_completion", fake_stream({"small": err, "large": "fixed"}, []))
+        with pytest.raises(type(err)):
+            list(model_router.stream(None, "edit", []))
+
+
+# ================== complete ==================
+def test_complete_escalates_on_rejection_and_model_error(routes, monkeypatch):
+    routes["chunk"] = ["small", "large"]
+    monkeypatch.setattr(model_router, "cached_completion", fake_complete({"small": "", "large": "notes"}))
+    content, calls = model_router.complete(None, "chunk", [], accept=bool)
+    assert content == "notes" and [c["accepted"] for c in calls] == [False, True]
+
+    monkeypatch.setattr(model_router, "cached_completion", fake_complete({"small": StatusError(404), "large": "notes"}))
+    assert model_router.complete(None, "chunk", [])[0] == "notes"
+
+
+def test_complete_does_not_escalate_under_pressure(routes, monkeypatch):
+    routes["chunk"] = ["small", "large"]
+    for err in (StatusError(429), StatusError(500), StatusError(401), CircuitOpenError("open")):
+        monkeypatch.setattr(model_router, "cached_completion", fake_complete({"small": err, "large": "notes"}))
+        with pytest.raises(type(err)):
+            model_router.complete(None, "chunk", [])
+
+
+
+def test_route_stats_separate_models(routes, isolated_db):
+    stats = model_router.RouteStats()
+    stats.add("chunk", [
+        {"model": "gpt-4o-mini", "usage": {"prompt_tokens": 1000, "completion_tokens": 0, "total_tokens": 1000},
+         "hit": False, "seconds": 1.0, "accepted": False},
+        {"model": "gpt-4o", "usage": {"prompt_tokens": 1000, "completion_tokens": 0, "total_tokens": 1000},
+         "hit": False, "seconds": 2.0, "accepted": True},
+    ])
+    summary = stats.summary()
+    assert summary["chunk:gpt-4o-mini"]["rejected"] == 1
+    assert summary["chunk:gpt-4o"]["calls"] == 1
+    assert summary["chunk:gpt-4o-mini"]["cost"] < summary["chunk:gpt-4o"]["cost"]
+
+
+def test_prices_split_prompt_and_completion(isolated_db):
+    from modules.logger import calculate_cost, get_model_price, set_model_price
+
+    assert get_model_price("gpt-4o-mini") == (0.00015, 0.0006)
+    assert get_model_price("gpt-4o-mini-2024-07-18") == (0.00015, 0.0006)
+    assert calculate_cost("gpt-4o", 2000, prompt_tokens=1000, completion_tokens=1000) == round(0.0025 + 0.01, 6)
+    set_model_price("gpt-4o-mini", 0.001, 0.002)
+    assert get_model_price("gpt-4o-mini") == (0.001, 0.002)
@@ -0,0 +1,100 @@
+# tests/test_normalizer.py
+
+from modules.normalizer import normalize_units, normalize_stream
+
+
+TOPICS = ["supply", "demand", "elasticity", "tariffs", "inflation", "monopoly", "welfare", "taxation"]
+
+
+def _body(n):
+    topic = TOPICS[n % len(TOPICS)]
+    return f"This page covers {topic}.\nKey idea: {topic} shapes market outcomes.\nExample on {topic} follows."
+
+
+def _page(n, body, header="Intro to Economics — Week 3", footer=None):
+    lines = [f"【第 {n} 页 - lecture.pdf】", header, body]
+    if footer is not None:
+        lines.append(footer)
+    return "\n".join(lines)
+
+
+def test_repeated_header_is_removed():
+    units = [_page(i, _body(i)) for i in range(1, 6)]
+    cleaned, stats = normalize_units(units)
+
+    assert cleaned == [_body(i) for i in range(1, 6)]
+    assert stats["headers_removed"] == 5
+
+
+def test_explicit_page_numbers_are_removed():
+    footers = ["Page 1 of 4", "- 2 -", "第 3 页 共 4 页", "p. 4"]
+    units = [_page(i + 1, _body(i), header=TOPICS[i].title(), footer=f) for i, f in enumerate(footers)]
+    cleaned, stats = normalize_units(units)
+
+    assert stats["page_numbers_removed"] == 4
+    assert cleaned == [f"{TOPICS[i].title()}\n{_body(i)}" for i in range(4)]
+
+
+def test_bare_page_numbers_on_most_pages_are_removed():
+    units = [_page(i, _body(i), header=TOPICS[i].title(), footer=str(i + 10)) for i in range(1, 6)]
+    cleaned, stats = normalize_units(units)
+
+    assert stats["page_numbers_removed"] == 5
+    assert cleaned == [f"{TOPICS[i].title()}\n{_body(i)}" for i in range(1, 6)]
+
+
+def test_roman_page_numbers_on_most_pages_are_removed():
+    numerals = ["i", "ii", "iii", "iv", "v"]
+    units = [_page(i + 1, _body(i), header=TOPICS[i].title(), footer=r) for i, r in enumerate(numerals)]
+    cleaned, stats = normalize_units(units)
+
+    assert stats["page_numbers_removed"] == 5
+    assert cleaned[3] == f"{TOPICS[3].title()}\n{_body(3)}"
+
+
+def test_lone_numerals_and_years_are_kept():
+    """只出现在个别页边缘的 "I" / "V" / "2024" 是正文（列表序号、年份），不能当作页码删掉"""
+    units = [
+        _page(1, "Chapter overview.", header="Part", footer="I"),
+        _page(2, "Roman numeral five:", header="Numbers", footer="V"),
+        _page(3, "Published in", header="History", footer="2024"),
+        _page(4, "The answer is", header="Quiz", footer="2"),
+        _page(5, "Closing remarks.", header="Summary"),
+    ]
+    cleaned, stats = normalize_units(units)
+
+    assert stats["page_numbers_removed"] == 0
+    assert cleaned[0].endswith("\nI")
+    assert cleaned[1].endswith("\nV")
+    assert cleaned[2].endswith("\n2024")
+    assert cleaned[3].endswith("\n2")
+
+
+def test_bare_numbers_out_of_page_order_are_kept():
+    """每页都有单独的数字，但不随页序递增（如每页的题号都是 1），不是页码"""
+    units = [_page(i, _body(i), header=TOPICS[i].title(), footer="1") for i in range(1, 6)]
+    cleaned, stats = normalize_units(units)
+
+    assert stats["page_numbers_removed"] == 0
+    assert all(unit.endswith("\n1") for unit in cleaned)
+
+
+def test_unpaged_text_keeps_numbers_and_repeated_lines():
+    units = ["Summary", "3", "Summary", "Details here.", "Summary"]
+    cleaned, stats = normalize_units(units)
+
+    assert cleaned == units
+    assert stats["headers_removed"] == stats["page_numbers_removed"] == 0
+
+
+def test_hyphen_breaks_and_whitespace_are_normalized():
+    cleaned, _ = normalize_units(["【第 1 页 - a.pdf】\nThe equi-\nlibrium   price\n\n\n\nis stable."])
+    assert cleaned == ["The equilibrium price\n\nis stable."]
+
+
+def test_stream_matches_batch_for_short_documents():
+    units = [_page(i, _body(i), footer=str(i)) for i in range(1, 8)]
+    batch, batch_stats = normalize_units(units)
+    stream_stats = {key: 0 for key in batch_stats}
+    assert list(normalize_stream(iter(units), stream_stats)) == batch
+    assert stream_stats == batch_stats
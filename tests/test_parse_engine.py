@@ -0,0 +1,80 @@
+# tests/test_parse_engine.py
+# 解析引擎：按上传顺序 / 页码顺序产出、大 PDF 按页区间拆分、失败文件占位、进程池崩溃退回当前进程
+# 进程池换成线程池：只验证拆分与拼回的逻辑，不在测试里启动子进程
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from modules import file_parser, parse_engine  # noqa: E402
+
+
+def make_pdf(pages, tag):
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"{tag} page {i + 1}")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+FILES = [
+    ("big.pdf", make_pdf(5, "big")),
+    ("notes.txt", "plain text notes".encode("utf-8")),
+    ("broken.pdf", b"not a pdf"),
+    ("small.pdf", make_pdf(1, "small")),
+]
+
+
+@pytest.fixture
+def thread_pool(isolated_db, monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(parse_engine, "PARSE_WORKERS", 2)
+    monkeypatch.setattr(parse_engine, "_get_pool", lambda: pool)
+    yield pool
+    pool.shutdown()
+
+
+def test_inline_parse_matches_single_file_parser(isolated_db, monkeypatch):
+    monkeypatch.setattr(parse_engine, "PARSE_WORKERS", 1)
+    texts, stats = parse_engine.parse_files(FILES)
+
+    assert texts == [file_parser.extract_text_from_file(data, name) for name, data in FILES]
+    assert stats["mode"] == "inline" and stats["tasks"] == len(FILES)
+    assert texts[2] == "❌ 文件解析失败: broken.pdf"
+
+
+def test_split_pdf_is_reassembled_in_page_order(thread_pool):
+    result = {}
+    units = list(parse_engine.iter_parse(FILES, pages_per_task=2, result=result))
+
+    assert [u["doc"] for u in units] == [1] * 5 + [2, 3, 4]
+    assert [u["index"] for u in units if u["doc"] == 1] == [1, 2, 3, 4, 5]
+    assert units[5]["kind"] == "text" and units[6]["kind"] == "error"
+    assert result["stats"]["mode"] == "process"
+    assert result["stats"]["tasks"] == 3 + 3   # big.pdf 拆成 3 段
+
+    texts, _ = parse_engine.parse_files(FILES, pages_per_task=2)
+    assert texts[0] == file_parser.extract_text_from_file(FILES[0][1], "big.pdf")
+
+
+def test_broken_pool_falls_back_to_inline(isolated_db, monkeypatch):
+    class BrokenPool:
+        def submit(self, fn, *args):
+            future = Future()
+            future.set_exception(BrokenProcessPool("worker died"))
+            return future
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            pass
+
+    monkeypatch.setattr(parse_engine, "PARSE_WORKERS", 2)
+    monkeypatch.setattr(parse_engine, "_get_pool", lambda: BrokenPool())
+    result = {}
+    units = list(parse_engine.iter_parse(FILES, pages_per_task=2, result=result))
+
+    assert [u["doc"] for u in units] == [1] * 5 + [2, 3, 4]
+    assert result["stats"]["mode"] == "inline"
@@ -0,0 +1,68 @@
+# tests/test_reducer.py
+# 多级合并：批次不超预算、按层递归、压缩失败保留原文、到达最大层数后截断并记录 over_budget
+
+from modules.chunker import estimate_tokens
+from modules.reducer import hierarchical_reduce, needs_reduce, plan_reduce_batches, truncate_to_budget
+
+
+def blocks(n, paragraphs=6):
+    """n 个文件块，每块若干段，每段约 40 tokens"""
+    return [
+        f"## FILE: f{i}\n\n" + "\n\n".join(f"定义{i}-{p}：" + "光合作用把光能转化为化学能。" * 3 for p in range(paragraphs))
+        for i in range(n)
+    ]
+
+
+def test_plan_batches_stay_within_budget_and_keep_order():
+    source = blocks(5)
+    batches = plan_reduce_batches(source, 300)
+
+    assert len(batches) > 1
+    assert all(estimate_tokens("\n\n".join(b)) <= 300 * 1.25 for b in batches)
+    flattened = "\n\n".join(piece for batch in batches for piece in batch)
+    positions = [flattened.index(f"## FILE: f{i}") for i in range(5)]
+    assert positions == sorted(positions)
+
+
+def test_reduce_recurses_until_under_budget():
+    levels = []
+
+    def halve(text, level):
+        levels.append(level)
+        return text[: len(text) // 2], {"total_tokens": 1}, False
+
+    usages = []
+    reduced, stats = hierarchical_reduce(blocks(6), halve, 400, max_depth=6, on_result=lambda usage, hit: usages.append(usage))
+
+    assert not needs_reduce(reduced, 400)
+    assert stats["depth"] >= 2 and stats["depth"] == len(stats["fanout"])
+    assert stats["fanout"][0] > stats["fanout"][-1]
+    assert stats["failed"] == 0 and stats["over_budget"] is None
+    assert len(usages) == len(levels) == sum(stats["fanout"])
+
+
+def test_small_input_is_not_reduced():
+    source = blocks(1, paragraphs=1)
+    reduced, stats = hierarchical_reduce(source, lambda text, level: 1 / 0, 1000)
+    assert reduced == source and stats["depth"] == 0
+
+
+def test_failed_batches_keep_source_and_over_budget_is_truncated(isolated_db):
+    def fail(text, level):
+        raise RuntimeError("model down")
+
+    source = blocks(4)
+    reduced, stats = hierarchical_reduce(source, fail, 300, max_depth=2)
+
+    assert stats["depth"] == 2
+    assert stats["failed"] == sum(stats["fanout"])
+    assert stats["over_budget"] > 300
+    assert sum(estimate_tokens(b) for b in reduced) <= 300 * 1.25
+    assert all(b.startswith("## FILE:") for b in reduced)
+
+
+def test_truncate_is_deterministic_and_proportional():
+    source = blocks(3, paragraphs=2) + blocks(1, paragraphs=12)
+    first = truncate_to_budget(source, 400)
+    assert first == truncate_to_budget(source, 400)
+    assert estimate_tokens(first[-1]) < estimate_tokens(source[-1])
@@ -0,0 +1,64 @@
+# tests/test_request_memo.py
+# 请求级复用的占位 / 租约：并发领取、租约过期接管、失去占位后的写入
+
+import time
+
+import pytest
+
+from modules import request_memo
+
+
+@pytest.fixture
+def memo_db(isolated_db, monkeypatch):
+    monkeypatch.setattr(request_memo, "CACHE_DB", str(isolated_db / "cache.db"))
+    request_memo.init_memo_table()
+    return request_memo
+
+
+def test_only_one_concurrent_acquire_wins(memo_db, race):
+    won = race(lambda i: memo_db.acquire("key", f"owner{i}"), 8)
+    assert won.count(True) == 1
+
+
+def test_expired_lease_is_taken_over(memo_db, monkeypatch):
+    monkeypatch.setattr(memo_db, "REQUEST_MEMO_LEASE_SECONDS", 0.2)
+    assert memo_db.acquire("key", "a")
+    assert not memo_db.acquire("key", "b")
+    time.sleep(0.3)
+    assert memo_db.acquire("key", "b")
+    assert not memo_db.renew("key", "a")
+    assert memo_db.renew("key", "b")
+
+
+def test_store_after_lease_lost(memo_db, monkeypatch):
+    monkeypatch.setattr(memo_db, "REQUEST_MEMO_LEASE_SECONDS", 0.2)
+    assert memo_db.acquire("key", "a")
+    time.sleep(0.3)
+    assert memo_db.acquire("key", "b")
+
+    # 原领头的结果仍写入（还没有完成的结果），接管者随后写入时保留先到的结果
+    assert memo_db.store("key", "a", "text a") == "adopted"
+    assert memo_db.store("key", "b", "text b") == "skipped"
+    assert memo_db.get("key")["text"] == "text a"
+
+
+def test_single_flight_waiters_get_the_leader_result(memo_db, race):
+    def _request(i):
+        flight, memo = memo_db.single_flight("key", f"owner{i}", wait_seconds=5)
+        if flight == "leader":
+            time.sleep(0.2)
+            assert memo_db.store("key", f"owner{i}", "shared notes", {"run_id": "r1"}) == "stored"
+            return flight, None
+        return flight, memo["text"]
+
+    results = race(_request, 4)
+    outcomes = [flight for flight, _ in results]
+    assert outcomes.count("leader") == 1
+    assert outcomes.count("hit") == 3
+    assert {text for flight, text in results if flight == "hit"} == {"shared notes"}
+
+
+def test_released_key_can_be_acquired_again(memo_db):
+    assert memo_db.acquire("key", "a")
+    memo_db.release("key", "a")
+    assert memo_db.acquire("key", "b")
@@ -0,0 +1,50 @@
+# tests/test_run_checkpoint.py
+# 断点记录：run_id 只取决于资料和设置、阶段覆盖保存、TTL 过期、未知阶段报错
+
+import pytest
+
+from modules import run_checkpoint
+from modules.run_checkpoint import file_source_ids, make_run_id
+
+
+@pytest.fixture
+def checkpoint_db(isolated_db, monkeypatch):
+    monkeypatch.setattr(run_checkpoint, "CACHE_DB", str(isolated_db / "cache.db"))
+    run_checkpoint.init_checkpoint_table()
+    return isolated_db
+
+
+def test_run_id_depends_on_texts_and_settings():
+    run_id = make_run_id(["a", "b"], "detailed", False)
+
+    assert make_run_id(["a", "b"], "detailed", False) == run_id
+    assert make_run_id(["a", "b"], "exam", False) != run_id
+    assert make_run_id(["ab"], "detailed", False) != run_id   # 文件边界也算在内
+    assert file_source_ids([("x.pdf", b"1")]) == file_source_ids([("renamed.pdf", b"1")])
+
+
+def test_later_stage_overwrites_earlier(checkpoint_db):
+    run_checkpoint.save("run_1", "chunked", {"file_blocks": ["块"]}, user_id=7)
+    assert run_checkpoint.load("run_1") == {"stage": "chunked", "payload": {"file_blocks": ["块"]}}
+
+    run_checkpoint.save("run_1", "reduced", {"reduced_blocks": ["合并"]}, user_id=7)
+    assert run_checkpoint.load("run_1")["stage"] == "reduced"
+    assert run_checkpoint.load("run_2") is None
+
+    run_checkpoint.discard("run_1")
+    assert run_checkpoint.load("run_1") is None
+
+
+def test_unknown_stage_is_rejected(checkpoint_db):
+    with pytest.raises(ValueError):
+        run_checkpoint.save("run_1", "parsed", {})
+
+
+def test_expired_checkpoint_is_ignored_and_purged(checkpoint_db, monkeypatch):
+    monkeypatch.setattr(run_checkpoint, "RUN_CHECKPOINT_TTL_SECONDS", 60)
+    run_checkpoint.save("run_1", "chunked", {})
+    real_time = run_checkpoint.time.time
+
+    monkeypatch.setattr(run_checkpoint.time, "time", lambda: real_time() + 120)
+    assert run_checkpoint.load("run_1") is None
+    assert run_checkpoint.purge_expired() == 1
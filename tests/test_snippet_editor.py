@@ -0,0 +1,35 @@
+# tests/test_snippet_editor.py
+
+import pytest
+
+pytest.importorskip("langdetect")
+pytest.importorskip("openai")
+
+from modules.snippet_editor import parse_batch_output  # noqa: E402
+
+
+def test_results_are_matched_by_index():
+    content = (
+        "<<<RESULT 2>>>\nsecond edit\n<<<END RESULT 2>>>\n"
+        "<<<RESULT 1>>>\nfirst edit\nwith two lines\n<<<END RESULT 1>>>"
+    )
+    assert parse_batch_output(content, 2) == ["first edit\nwith two lines", "second edit"]
+
+
+def test_missing_empty_and_out_of_range_results():
+    content = (
+        "<<<RESULT 1>>>   \n<<<END RESULT 1>>>\n"
+        "<<<RESULT 3>>>\nthird\n<<<END RESULT 3>>>\n"
+        "<<<RESULT 9>>>\nextra\n<<<END RESULT 9>>>"
+    )
+    assert parse_batch_output(content, 3) == [None, None, "third"]
+
+
+def test_mismatched_end_marker_is_not_accepted():
+    content = "<<<RESULT 1>>>\nfirst\n<<<END RESULT 2>>>"
+    assert parse_batch_output(content, 2) == [None, None]
+
+
+def test_empty_or_unformatted_output():
+    assert parse_batch_output(None, 2) == [None, None]
+    assert parse_batch_output("I rewrote both snippets.", 1) == [None]